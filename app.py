@@ -3,9 +3,9 @@ import sys
 from datetime import timedelta
 from flask import Flask, render_template, redirect, url_for, jsonify, request
 from flask_cors import CORS
-from flask_socketio import join_room
+from flask_socketio import join_room, leave_room
 from extensions import jwt, bcrypt, socketio, init_mongodb
-from models import User, Service
+from models import Service
 
 
 def create_app():
@@ -26,6 +26,8 @@ def create_app():
     CORS(app)
     init_mongodb()  # Initialize MongoDB connection
     jwt.init_app(app)
+    from services.auth_tokens import token_revoked
+    jwt.token_in_blocklist_loader(token_revoked)
     bcrypt.init_app(app)
     # SocketIO configuration for production
     redis_url = os.getenv('REDIS_URL')
@@ -35,33 +37,6 @@ def create_app():
     else:
         socketio.init_app(app, async_mode='threading', cors_allowed_origins="*")
 
-    # WebSocket event handlers
-    @socketio.on('join_provider_room')
-    def on_join_provider_room(data):
-        from flask_jwt_extended import decode_token
-        try:
-            token = data.get('token')
-            if token:
-                decoded_token = decode_token(token)
-                user_id = decoded_token.get('sub', {}).get('id') or decoded_token.get('sub')
-                join_room(f'provider_{user_id}')
-                print(f'Provider {user_id} joined their room')
-        except Exception as e:
-            print(f'Error joining provider room: {e}')
-
-    @socketio.on('join_user_room')
-    def on_join_user_room(data):
-        from flask_jwt_extended import decode_token
-        try:
-            token = data.get('token')
-            if token:
-                decoded_token = decode_token(token)
-                user_id = decoded_token.get('sub', {}).get('id') or decoded_token.get('sub')
-                join_room(f'user_{user_id}')
-                print(f'User {user_id} joined their room')
-        except Exception as e:
-            print(f'Error joining user room: {e}')
-
     # Register blueprints
     from routes.auth import auth_bp
     from routes.booking import booking_bp
@@ -204,145 +179,190 @@ def create_app():
 
     # Socket events
     @socketio.on('connect')
-    def on_connect():
-        print('Client connected')
+    def on_connect(auth=None):
+        from services.socket_auth import authenticate_connection
+        # Verified once here; room joins are authorized against the cached identity
+        identity = authenticate_connection(auth)
+        print(f"Client connected ({identity['user_id'] if identity else 'anonymous'})")
     
     @socketio.on('disconnect')
     def on_disconnect():
+        from services.typing_service import typing_tracker
+        typing_tracker.drop_sender(request.sid)
         print('Client disconnected')
     
     @socketio.on('join')
     def on_join(data):
+        from services.socket_auth import socket_identity, can_join
         try:
             room = data.get('room')
-            if room:
+            if room and can_join(socket_identity(data), room, booking_id=data.get('booking_id')):
                 join_room(room)
                 print(f'Client joined room: {room}')
+            elif room:
+                print(f'Client not allowed to join room: {room}')
         except Exception as e:
             print(f'Error in join event: {e}')
     
     @socketio.on('join_provider_room')
-    def on_join_provider_room(data):
+    def on_join_provider_room(data=None):
+        """Join the provider's rooms (by user id and by provider profile id) and all_providers"""
+        from services.socket_auth import socket_identity
         try:
-            provider_id = data.get('provider_id')
-            print(f'=== PROVIDER JOINING ROOM ===')
-            print(f'Provider ID received: {provider_id}')
-            print(f'Data received: {data}')
-            if provider_id:
-                room_name = f"provider_{provider_id}"
-                join_room(room_name)
-                join_room('all_providers')
-                print(f'Provider {provider_id} joined rooms: {room_name}, all_providers')
-            else:
-                print('No provider_id provided')
+            identity = socket_identity(data)
+            if not identity or not identity.get('provider_id'):
+                print('join_provider_room rejected: not an authenticated provider')
+                return
+            join_room(f"provider_{identity['user_id']}")
+            join_room(f"provider_{identity['provider_id']}")
+            join_room('all_providers')
+            print(f"Provider {identity['user_id']} joined their rooms")
         except Exception as e:
             print(f'Error in join_provider_room event: {e}')
     
+    @socketio.on('join_user_room')
+    def on_join_user_room(data=None):
+        from services.socket_auth import socket_identity
+        try:
+            identity = socket_identity(data)
+            if identity:
+                join_room(f"user_{identity['user_id']}")
+                print(f"User {identity['user_id']} joined their room")
+        except Exception as e:
+            print(f'Error joining user room: {e}')
+    
     @socketio.on('join_booking_room')
     def on_join_booking_room(data):
+        from services.socket_auth import socket_identity, can_join
         try:
             booking_id = data.get('booking_id')
-            if booking_id:
+            if booking_id and can_join(socket_identity(data), f"booking_{booking_id}"):
                 join_room(f"booking_{booking_id}")
                 print(f'Client joined booking room: {booking_id}')
         except Exception as e:
             print(f'Error in join_booking_room event: {e}')
-    
+
+    @socketio.on('track_provider')
+    def on_track_provider(data):
+        """Follow the live position of the provider assigned to the customer's active booking_id"""
+        from services.location_broadcast_service import track_room
+        from services.socket_auth import socket_identity, can_join
+        try:
+            provider_id = data.get('provider_id')
+            booking_id = data.get('booking_id')
+            identity = socket_identity(data)
+            if booking_id and can_join(identity, f"booking_{booking_id}"):
+                join_room(f"booking_{booking_id}")
+            if provider_id and can_join(identity, track_room(provider_id), booking_id=booking_id):
+                join_room(track_room(provider_id))
+                print(f'Client tracking provider: {provider_id}')
+            elif provider_id:
+                print(f'Client not allowed to track provider: {provider_id}')
+        except Exception as e:
+            print(f'Error in track_provider event: {e}')
+
+    @socketio.on('untrack_provider')
+    def on_untrack_provider(data):
+        from services.location_broadcast_service import track_room
+        try:
+            provider_id = data.get('provider_id')
+            if provider_id:
+                leave_room(track_room(provider_id))
+        except Exception as e:
+            print(f'Error in untrack_provider event: {e}')
+
+    @socketio.on('subscribe_area')
+    def on_subscribe_area(data):
+        """Receive positions of providers inside a map viewport (south, west, north, east)"""
+        from services.location_broadcast_service import subscribe_area
+        try:
+            cells = subscribe_area(data.get('south'), data.get('west'), data.get('north'), data.get('east'))
+            if cells is None:
+                return {'ok': False, 'error': 'Viewport invalid or too large, zoom in'}
+            return {'ok': True, 'cells': cells}
+        except Exception as e:
+            print(f'Error in subscribe_area event: {e}')
+            return {'ok': False, 'error': 'Invalid viewport'}
+
+    @socketio.on('unsubscribe_area')
+    def on_unsubscribe_area(data=None):
+        from services.location_broadcast_service import unsubscribe_area
+        try:
+            unsubscribe_area()
+        except Exception as e:
+            print(f'Error in unsubscribe_area event: {e}')
+
+    @socketio.on('provider_location_ping')
+    def on_provider_location_ping(data):
+        """GPS ping over the socket; same coalesced ingestion path as the HTTP tracking endpoint"""
+        from datetime import datetime
+        from services.location_ingest_service import location_ingestor
+        from services.provider_index import tracked_provider
+        from services.location_broadcast_service import broadcast_location
+        from services.socket_auth import socket_identity
+        try:
+            identity = socket_identity(data)
+            if not identity:
+                return {'ok': False, 'error': 'Not authenticated'}
+            user_id = identity['user_id']
+            entry = tracked_provider(user_id)
+            if not entry:
+                return {'ok': False, 'error': 'Provider not found'}
+            lat, lon = location_ingestor.ingest(user_id, data.get('lat'), data.get('lon'))
+            broadcast_location('provider_location_update', {
+                'provider_id': user_id,
+                'name': entry.get('name'),
+                'lat': lat,
+                'lon': lon,
+                'timestamp': datetime.utcnow().isoformat()
+            }, user_id, lat, lon)
+            return {'ok': True}
+        except Exception as e:
+            print(f'Error in provider_location_ping event: {e}')
+            return {'ok': False, 'error': 'Invalid ping'}
+
     # Chat events
     @socketio.on('chat_message')
     def handle_chat_message(data):
         try:
-            from models import ChatMessage, Booking, User
             from bson import ObjectId
+            from services.chat_service import post_message
+            from services.socket_auth import socket_identity
             
+            # The sender is the authenticated socket, not the sender_id in the payload
+            identity = socket_identity(data)
             booking_id = data.get('booking_id')
-            sender_id = data.get('sender_id')
-            sender_type = data.get('sender_type')
-            message_type = data.get('type')
-            content = data.get('content', '')
-            
-            # Get booking and user
-            booking = Booking.objects(id=ObjectId(booking_id)).first()
-            user = User.objects(id=ObjectId(sender_id)).first()
-            
-            if not booking or not user:
+            if not identity or not booking_id or not ObjectId.is_valid(booking_id):
                 return
+            sender_id = identity['user_id']
             
-            # Create message
-            message = ChatMessage(
-                booking=booking,
-                sender=user,
-                sender_type=sender_type,
-                message_type=message_type,
-                content=content,
-                booking_id=booking_id,
-                status='sent'
-            )
-            
-            # Set names
-            if sender_type == 'user':
-                message.customer_name = user.name
-                if booking.provider:
-                    message.provider_name = booking.provider.user.name
-                    message.provider_id = str(booking.provider.id)
-            else:
-                message.provider_name = user.name
-                message.provider_id = str(booking.provider.id) if booking.provider else None
-                message.customer_name = booking.user.name
-            
-            message.save()
-            
-            # Emit to booking room
-            socketio.emit('new_message', {
-                'id': str(message.id),
-                'booking_id': booking_id,
-                'sender_type': sender_type,
-                'sender_name': message.customer_name if sender_type == 'user' else message.provider_name,
-                'type': message_type,
-                'content': content,
-                'timestamp': message.created_at.isoformat()
-            }, room=f"booking_{booking_id}")
-            
-            # Emit to provider room if message is from user
-            if sender_type == 'user' and booking.provider:
-                socketio.emit('new_message', {
-                    'id': str(message.id),
-                    'booking_id': booking_id,
-                    'sender_type': sender_type,
-                    'sender_name': message.customer_name,
-                    'type': message_type,
-                    'content': content,
-                    'timestamp': message.created_at.isoformat()
-                }, room=f"provider_{booking.provider.id}")
+            # Delivered to the booking (and provider) rooms now, persisted by the write-behind flush
+            post_message(booking_id, sender_id, data.get('content', ''), data.get('type'))
             
         except Exception as e:
             print(f'Error in chat_message event: {e}')
     
     @socketio.on('typing_start')
     def handle_typing_start(data):
+        from flask import request as socket_request
+        from services.typing_service import typing_tracker
         try:
             booking_id = data.get('booking_id')
-            sender_type = data.get('sender_type')
-            sender_name = data.get('sender_name')
-            
-            socketio.emit('user_typing', {
-                'booking_id': booking_id,
-                'sender_type': sender_type,
-                'sender_name': sender_name
-            }, room=f"booking_{booking_id}")
+            if booking_id:
+                # Debounced: only the idle -> typing transition reaches the room
+                typing_tracker.start_typing(booking_id, socket_request.sid,
+                                            data.get('sender_type'), data.get('sender_name'))
         except Exception as e:
             print(f'Error in typing_start event: {e}')
     
     @socketio.on('typing_stop')
     def handle_typing_stop(data):
+        from flask import request as socket_request
+        from services.typing_service import typing_tracker
         try:
             booking_id = data.get('booking_id')
-            sender_type = data.get('sender_type')
-            
-            socketio.emit('user_stopped_typing', {
-                'booking_id': booking_id,
-                'sender_type': sender_type
-            }, room=f"booking_{booking_id}")
+            if booking_id:
+                typing_tracker.stop_typing(booking_id, socket_request.sid)
         except Exception as e:
             print(f'Error in typing_stop event: {e}')
 
@@ -369,6 +389,43 @@ def create_app():
                     s.save()
         except Exception as e:
             print(f"Error seeding services: {e}")
+        # Backfill GeoJSON locations for users saved before the 2dsphere index existed
+        try:
+            from services.provider_location_service import backfill_user_locations
+            backfilled = backfill_user_locations()
+            if backfilled:
+                print(f"Backfilled GeoJSON location for {backfilled} users")
+        except Exception as e:
+            print(f"Error backfilling user locations: {e}")
+        try:
+            from services.request_feed_service import backfill_request_locations
+            backfilled = backfill_request_locations()
+            if backfilled:
+                print(f"Backfilled GeoJSON location for {backfilled} service requests")
+        except Exception as e:
+            print(f"Error backfilling service request locations: {e}")
+        try:
+            from services.provider_location_service import backfill_locations
+            from models import Shop
+            backfilled = backfill_locations(Shop._get_collection(), 'location_lat', 'location_lon')
+            if backfilled:
+                print(f"Backfilled GeoJSON location for {backfilled} shops")
+        except Exception as e:
+            print(f"Error backfilling shop locations: {e}")
+        try:
+            from services.provider_stats_service import backfill_completed_jobs
+            backfilled = backfill_completed_jobs()
+            if backfilled:
+                print(f"Backfilled completed jobs for {backfilled} providers")
+        except Exception as e:
+            print(f"Error backfilling completed jobs: {e}")
+        try:
+            from services.booking_history_service import backfill_booking_service_names
+            backfilled = backfill_booking_service_names()
+            if backfilled:
+                print(f"Backfilled service name for {backfilled} bookings")
+        except Exception as e:
+            print(f"Error backfilling booking service names: {e}")
 
     return app
 
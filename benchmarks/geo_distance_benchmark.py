@@ -0,0 +1,47 @@
+"""Compare the scalar haversine loop with the vectorized kernels in services.geo.
+
+Run from the repository root: python benchmarks/geo_distance_benchmark.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.geo import haversine_km, distances_from, pairwise_distances, as_coords  # noqa: E402
+
+
+def random_points(n, seed=42):
+    rng = random.Random(seed)
+    lats = [28.4 + rng.random() * 0.6 for _ in range(n)]
+    lons = [76.9 + rng.random() * 0.6 for _ in range(n)]
+    return lats, lons
+
+
+def best_of(stmt, number, repeat=5):
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def bench_one_to_n(n):
+    lats, lons = random_points(n)
+    lat_arr, lon_arr = as_coords(lats), as_coords(lons)
+    scalar = best_of(lambda: [haversine_km(28.6139, 77.2090, a, b) for a, b in zip(lats, lons)], 3)
+    vector = best_of(lambda: distances_from(28.6139, 77.2090, lat_arr, lon_arr), 20)
+    print(f"1 x {n:>7,}: scalar {scalar * 1e3:9.2f} ms   numpy {vector * 1e3:8.3f} ms   speedup {scalar / vector:6.1f}x")
+
+
+def bench_pairwise(n, m):
+    lats1, lons1 = random_points(n, seed=1)
+    lats2, lons2 = random_points(m, seed=2)
+    pairs = [(a, b, c, d) for a, b in zip(lats1, lons1) for c, d in zip(lats2, lons2)]
+    scalar = best_of(lambda: [haversine_km(a, b, c, d) for a, b, c, d in pairs], 1, repeat=3)
+    vector = best_of(lambda: pairwise_distances(lats1, lons1, lats2, lons2), 5)
+    print(f"{n} x {m:>5}: scalar {scalar * 1e3:9.2f} ms   numpy {vector * 1e3:8.3f} ms   speedup {scalar / vector:6.1f}x")
+
+
+if __name__ == '__main__':
+    for n in (1_000, 10_000, 100_000):
+        bench_one_to_n(n)
+    for n, m in ((100, 100), (200, 1_000)):
+        bench_pairwise(n, m)
@@ -0,0 +1,94 @@
+"""Count outbound location frames for a global emit vs room-scoped emits.
+
+Connects Socket.IO test clients to an in-process server: most are map viewers
+subscribed to a small viewport, the rest track a single provider. Every provider
+then sends one position update, first broadcast to everyone (the old behaviour)
+and then through broadcast_location. Run from the repository root:
+
+    python benchmarks/location_broadcast_load_test.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_socketio import join_room  # noqa: E402
+
+from extensions import socketio  # noqa: E402
+from services.location_broadcast_service import (  # noqa: E402
+    AREA_CELL_DEG, broadcast_location, subscribe_area, track_room
+)
+
+PROVIDERS = 300
+CLIENTS = 600
+TRACKER_SHARE = 0.3
+CITY = (12.85, 77.45, 13.15, 77.75)  # south, west, north, east
+VIEWPORT_CELLS = 2
+
+
+def create_app():
+    app = Flask(__name__)
+    socketio.init_app(app, async_mode='threading')
+
+    @socketio.on('track_provider')
+    def on_track_provider(data):
+        join_room(track_room(data['provider_id']))
+
+    @socketio.on('subscribe_area')
+    def on_subscribe_area(data):
+        return {'cells': subscribe_area(data['south'], data['west'], data['north'], data['east'])}
+
+    return app
+
+
+def drain(clients):
+    return sum(len(client.get_received()) for client in clients)
+
+
+def main():
+    rng = random.Random(7)
+    app = create_app()
+    south, west, north, east = CITY
+    providers = [(f'p{i}', rng.uniform(south, north), rng.uniform(west, east)) for i in range(PROVIDERS)]
+
+    clients = []
+    for n in range(CLIENTS):
+        client = socketio.test_client(app)
+        if n < CLIENTS * TRACKER_SHARE:
+            client.emit('track_provider', {'provider_id': rng.choice(providers)[0]})
+        else:
+            lat, lon = rng.uniform(south, north), rng.uniform(west, east)
+            span = VIEWPORT_CELLS * AREA_CELL_DEG / 2
+            client.emit('subscribe_area', {'south': lat - span, 'west': lon - span,
+                                           'north': lat + span, 'east': lon + span}, callback=True)
+        clients.append(client)
+    drain(clients)
+
+    start = time.perf_counter()
+    for user_id, lat, lon in providers:
+        socketio.emit('provider_location_update', {'provider_id': user_id, 'lat': lat, 'lon': lon})
+    global_ms = (time.perf_counter() - start) * 1000
+    global_frames = drain(clients)
+
+    start = time.perf_counter()
+    for user_id, lat, lon in providers:
+        broadcast_location('provider_location_update', {'provider_id': user_id, 'lat': lat, 'lon': lon},
+                           user_id, lat, lon)
+    scoped_ms = (time.perf_counter() - start) * 1000
+    scoped_frames = drain(clients)
+
+    for client in clients:
+        client.disconnect()
+
+    print(f"{PROVIDERS} providers x {CLIENTS} clients "
+          f"({int(CLIENTS * TRACKER_SHARE)} trackers, the rest viewing ~{VIEWPORT_CELLS}x{VIEWPORT_CELLS} cells)")
+    print(f"  global emit:  {global_frames:8d} frames  {global_ms:8.1f} ms")
+    print(f"  room-scoped:  {scoped_frames:8d} frames  {scoped_ms:8.1f} ms")
+    print(f"  {global_frames / max(scoped_frames, 1):.1f}x fewer outbound frames")
+
+
+if __name__ == '__main__':
+    main()
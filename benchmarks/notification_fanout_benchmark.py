@@ -0,0 +1,108 @@
+"""Measure new-request fan-out to 5k providers, inline versus background dispatch.
+
+Run from the repository root: python benchmarks/notification_fanout_benchmark.py
+
+Notification writes are only measured when MONGODB_URI is set; they go to a
+scratch database that is dropped afterwards.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+from flask import Flask  # noqa: E402
+
+from extensions import socketio  # noqa: E402
+from services.geo import haversine_km  # noqa: E402
+from services.provider_index import provider_index  # noqa: E402
+from services import request_dispatch_service as dispatch  # noqa: E402
+
+PROVIDERS = 5000
+CENTER = (28.6139, 77.2090)
+
+
+def populate_index(n, seed=7):
+    rng = random.Random(seed)
+    providers = []
+    for i in range(n):
+        lat = CENTER[0] + (rng.random() - 0.5) * 0.5
+        lon = CENTER[1] + (rng.random() - 0.5) * 0.5
+        attrs = {'provider_id': ObjectId(), 'name': f'Provider {i}', 'rating': rng.uniform(3, 5),
+                 'skills': ['Electrician'], 'availability': rng.random() < 0.8}
+        provider_index.upsert(ObjectId(), lat, lon, **attrs)
+        providers.append(dict(attrs, lat=lat, lon=lon))
+    # Mark the snapshot as loaded so the benchmark never reconciles against MongoDB
+    provider_index.ready = True
+    provider_index._last_reconciled = time.time() + 3600
+    return providers
+
+
+def legacy_selection(providers, lat, lon):
+    """The old per-provider loop, which computed each distance twice."""
+    selected = []
+    for p in providers:
+        if p['availability'] and haversine_km(lat, lon, p['lat'], p['lon']) <= dispatch.NOTIFY_RADIUS_KM:
+            selected.append(dict(p, distance_km=haversine_km(lat, lon, p['lat'], p['lon'])))
+    return selected
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    app = Flask(__name__)
+    socketio.init_app(app, async_mode='threading')
+    providers = populate_index(PROVIDERS)
+    job = {'request_id': ObjectId(), 'service_category': 'electrician', 'title': 'Electrician Service Request',
+           'description': 'Fan stopped working', 'urgency': 'normal', 'location': 'Connaught Place',
+           'lat': CENTER[0], 'lon': CENTER[1]}
+
+    legacy_t, legacy_sel = timed(lambda: legacy_selection(providers, job['lat'], job['lon']))
+    select_t, recipients = timed(lambda: dispatch.select_recipients(job['lat'], job['lon']))
+    build_t, _ = timed(lambda: [n.to_mongo() for n in dispatch.build_notifications(job, recipients)])
+    emit_t, _ = timed(lambda: dispatch.emit_notifications(job, recipients), repeat=3)
+
+    print(f"{PROVIDERS} providers, {len(recipients)} available within {dispatch.NOTIFY_RADIUS_KM} km")
+    print(f"  recipient selection   legacy loop {legacy_t * 1000:8.2f} ms   grid index {select_t * 1000:8.2f} ms")
+    print(f"  build notifications   {build_t * 1000:8.2f} ms")
+    print(f"  emit ({dispatch.EMIT_BATCH_SIZE}/batch)      {emit_t * 1000:8.2f} ms")
+    assert len(legacy_sel) == len(recipients)
+
+    write_t = 0.0
+    if os.getenv('MONGODB_URI'):
+        from mongoengine import connect, disconnect
+        from models import ProviderNotification
+        disconnect()
+        client = connect(host=os.getenv('MONGODB_URI'), db='HofixFanoutBenchmark')
+        try:
+            notifications = dispatch.build_notifications(job, recipients)
+            start = time.perf_counter()
+            for notification in notifications[:500]:
+                notification.save()
+            per_save_t = (time.perf_counter() - start) / 500 * len(recipients)
+            write_t, _ = timed(lambda: dispatch.write_notifications(job, recipients), repeat=1)
+            print(f"  write notifications   save() each (extrapolated) {per_save_t * 1000:8.2f} ms"
+                  f"   insert_many {write_t * 1000:8.2f} ms")
+            ProviderNotification.drop_collection()
+        finally:
+            client.drop_database('HofixFanoutBenchmark')
+    else:
+        print("  write notifications   skipped (MONGODB_URI not set)")
+
+    inline_t = select_t + (write_t or build_t) + emit_t
+    dispatch_t, _ = timed(lambda: socketio.start_background_task(lambda: None), repeat=20)
+    print(f"  request path          inline fan-out {inline_t * 1000:8.2f} ms   background dispatch {dispatch_t * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Measure BM25 product search latency on a synthetic 100k-product catalog.
+
+Times search_shops, the call behind /api/shop/search, and the top-200 search().
+
+Run from the repository root: python benchmarks/product_search_benchmark.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+
+from services.product_search import ProductSearchIndex  # noqa: E402
+
+PRODUCTS = 100_000
+SHOPS = 2_000
+
+ITEMS = ['pipe', 'wire', 'cable', 'switch', 'socket', 'tap', 'fan', 'bulb', 'hammer', 'screw', 'nail',
+         'paint', 'brush', 'cement', 'lock', 'hinge', 'valve', 'tank', 'geyser', 'drill', 'plug', 'tape']
+MATERIALS = ['pvc', 'copper', 'brass', 'steel', 'iron', 'cpvc', 'aluminium', 'plastic', 'wooden']
+SIZES = ['1 inch', '2 inch', '4 mm', '6 mm', '10 m', '90 m', '1 kg', '5 litre', '20 litre']
+BRANDS = ['havells', 'anchor', 'finolex', 'supreme', 'asian', 'jaquar', 'polycab', 'crompton', 'bajaj']
+CATEGORIES = ['pipes', 'wires', 'electrical', 'plumbing', 'tools', 'paint', 'hardware', 'sanitary']
+QUERIES = ['pvc pipe', 'copper wire 90 m', 'ceiling fans', 'पाइप', 'taar', 'hathoda', 'brass taps',
+           'havells switch socket', 'cement 20 kg', 'led bulbs', 'नल की टोंटी', 'steel hinge screws',
+           'asian paint 5 litre', 'drill', 'polycab cables', 'geyser valve']
+
+
+def synthetic_catalog(n, seed=11):
+    rng = random.Random(seed)
+    shops = [ObjectId() for _ in range(SHOPS)]
+    for _ in range(n):
+        item = rng.choice(ITEMS)
+        name = f"{rng.choice(BRANDS).title()} {rng.choice(MATERIALS).upper()} {item.title()}s {rng.choice(SIZES)}"
+        description = ' '.join(rng.choice(ITEMS + MATERIALS + BRANDS) for _ in range(rng.randint(5, 25)))
+        yield {'_id': ObjectId(), 'shop': rng.choice(shops), 'name': name, 'description': description,
+               'category': rng.choice(CATEGORIES), 'is_available': rng.random() < 0.9}
+
+
+def main():
+    index = ProductSearchIndex()
+    start = time.perf_counter()
+    index.load(synthetic_catalog(PRODUCTS))
+    print(f"Indexed {PRODUCTS} products in {time.perf_counter() - start:.1f} s")
+
+    # search_shops is what /api/shop/search calls; search(limit=200) is the plain top-N ranking
+    paths = [
+        ('search_shops (shop search route)', lambda q: index.search_shops(q).count, 'products'),
+        ('search (top 200)', lambda q: len(index.search(q)), 'results'),
+    ]
+    for title, run, unit in paths:
+        timings = {}
+        for query in QUERIES:
+            samples = []
+            for _ in range(5):
+                start = time.perf_counter()
+                hits = run(query)
+                samples.append((time.perf_counter() - start) * 1000)
+            timings[query] = (statistics.median(samples), hits)
+
+        print(title)
+        for query, (ms, hits) in timings.items():
+            print(f"  {query:28s} {ms:7.2f} ms  ({hits} {unit})")
+        all_ms = sorted(ms for ms, _ in timings.values())
+        print(f"median {statistics.median(all_ms):.2f} ms, worst {all_ms[-1]:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Measure reverse-geocoding latency on a synthetic 100k-place gazetteer, cold and cached.
+
+Run from the repository root: python benchmarks/reverse_geocoder_benchmark.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.reverse_geocoder import ReverseGeocoder  # noqa: E402
+
+PLACES = 100_000
+LOOKUPS = 2_000
+INDIA = (8.0, 68.0, 35.0, 97.0)  # south, west, north, east
+
+
+def main():
+    rng = random.Random(3)
+    south, west, north, east = INDIA
+    places = [(f"Place {i}", f"Region {i % 36}", rng.uniform(south, north), rng.uniform(west, east))
+              for i in range(PLACES)]
+    start = time.perf_counter()
+    geocoder = ReverseGeocoder(places)
+    print(f"Indexed {PLACES} places in {time.perf_counter() - start:.2f} s")
+
+    points = [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(LOOKUPS)]
+    for label in ('cold (KD-tree)', 'cached (LRU)'):
+        samples = []
+        for lat, lon in points:
+            t0 = time.perf_counter()
+            geocoder.reverse(lat, lon)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        print(f"  {label:15s} median {statistics.median(samples):7.1f} us, "
+              f"p99 {sorted(samples)[int(len(samples) * 0.99)]:7.1f} us")
+
+
+if __name__ == '__main__':
+    main()
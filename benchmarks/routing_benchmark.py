@@ -0,0 +1,72 @@
+"""Measure A* route computation on a synthetic city grid and the memoized repeat cost.
+
+Run from the repository root: python benchmarks/routing_benchmark.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from services.routing import GraphRouter, RoadGraph, RouteEngine  # noqa: E402
+
+SIDE = 250  # SIDE x SIDE intersections, ~100 m apart
+ORIGIN = (28.50, 77.05)
+STEP_DEG = 0.0009
+QUERIES = 30
+
+
+def synthetic_city(side, seed=5):
+    """Grid streets with a faster arterial every 10 blocks and a few closed segments."""
+    rng = random.Random(seed)
+    rows, cols = np.divmod(np.arange(side * side), side)
+    lats = ORIGIN[0] + rows * STEP_DEG + np.array([rng.uniform(-1e-4, 1e-4) for _ in range(side * side)])
+    lons = ORIGIN[1] + cols * STEP_DEG + np.array([rng.uniform(-1e-4, 1e-4) for _ in range(side * side)])
+    src, dst, speed = [], [], []
+    for r in range(side):
+        for c in range(side):
+            node = r * side + c
+            for dr, dc in ((0, 1), (1, 0)):
+                rr, cc = r + dr, c + dc
+                if rr >= side or cc >= side or rng.random() < 0.03:
+                    continue
+                kmh = 50.0 if (dr == 0 and r % 10 == 0) or (dc == 0 and c % 10 == 0) else 20.0
+                other = rr * side + cc
+                src += [node, other]
+                dst += [other, node]
+                speed += [kmh, kmh]
+    return RoadGraph.from_edges(lats, lons, src, dst, speed)
+
+
+def main():
+    start = time.perf_counter()
+    graph = synthetic_city(SIDE)
+    print(f"Built {len(graph.lats)} nodes / {len(graph.indices)} edges in {time.perf_counter() - start:.1f} s")
+
+    engine = RouteEngine(GraphRouter(graph))
+    rng = random.Random(1)
+    span = SIDE * STEP_DEG
+    trips = [((ORIGIN[0] + rng.uniform(0, span), ORIGIN[1] + rng.uniform(0, span)),
+              (ORIGIN[0] + rng.uniform(0, span), ORIGIN[1] + rng.uniform(0, span))) for _ in range(QUERIES)]
+
+    cold, warm = [], []
+    for origin, destination in trips:
+        t0 = time.perf_counter()
+        route = engine.route(*origin, *destination)
+        cold.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        engine.route(origin[0] + 1e-5, origin[1], *destination)
+        warm.append((time.perf_counter() - t0) * 1000)
+
+    print(f"A* (cold):     median {statistics.median(cold):8.2f} ms, worst {max(cold):8.2f} ms")
+    print(f"memoized poll: median {statistics.median(warm):8.4f} ms, worst {max(warm):8.4f} ms")
+    print(f"last route: {route['distance_km']:.1f} km, {route['duration_minutes']} min, {len(route['points'])} points")
+    print(f"cache hits {engine.hits}, misses {engine.misses}")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,6 +24,8 @@ class User(Document):
     # Optional geolocation and human-readable address
     latitude = fields.FloatField()
     longitude = fields.FloatField()
+    # GeoJSON mirror of latitude/longitude, kept in sync by clean() for $geoNear queries
+    location = fields.PointField()
     address = fields.StringField(max_length=255)
     avatar_path = fields.StringField(max_length=255)
     credits = fields.FloatField(default=0.0)
@@ -53,12 +55,27 @@ class User(Document):
 
     # Reference to provider profile
     provider_profile = fields.ReferenceField('Provider')
+
+    # Bumped when the role changes; tokens carrying an older 'ver' claim are rejected
+    token_version = fields.IntField(default=0)
     
     meta = {
         'collection': 'users',
-        'indexes': ['email', 'phone', 'role', 'google_id', 'firebase_uid', 'referral_code']
+        'indexes': ['email', 'phone', 'role', 'google_id', 'firebase_uid', 'referral_code', '(location']
     }
 
+    def clean(self):
+        """Keep the GeoJSON location in sync with the latitude/longitude floats."""
+        try:
+            lat = float(self.latitude) if self.latitude is not None else None
+            lon = float(self.longitude) if self.longitude is not None else None
+        except (TypeError, ValueError):
+            lat = lon = None
+        if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            self.location = None
+        else:
+            self.location = [lon, lat]
+
 
 class Service(Document):
     name = fields.StringField(max_length=100, required=True)
@@ -80,6 +97,9 @@ class Provider(Document):
     # Deposit/Recharge balance for commission deduction (minimum ₹500 required)
     deposit_balance = fields.FloatField(default=0.0)
     
+    # Denormalized count of completed bookings, maintained on completion
+    completed_jobs = fields.IntField(default=0)
+    
     # Verification fields
     verification_status = fields.StringField(max_length=20, default='pending', 
                                            choices=['pending', 'verified', 'rejected'])
@@ -146,12 +166,30 @@ class Booking(Document):
     
     # Booking type
     booking_type = fields.StringField(max_length=20, default='hourly', choices=['hourly', 'daily'])
+
+    # Last modification, maintained by clean() for ?since= delta sync
+    updated_at = fields.DateTimeField()
     
     meta = {
         'collection': 'bookings',
-        'indexes': ['user', 'provider', 'service', 'status', 'created_at']
+        'indexes': [
+            'user', 'provider', 'service', 'status', 'created_at',
+            # Booking history pages (newest first) and delta sync per user / provider
+            ('user', '-created_at', '-id'),
+            ('provider', '-created_at', '-id'),
+            ('user', 'updated_at', 'id'),
+            ('provider', 'updated_at', 'id'),
+            # Open bookings matching a provider's skills (provider is null while unassigned)
+            ('provider', 'status', 'service_name', '-created_at', '-id'),
+            # Delta sync of bookings in a provider's skills, including ones no longer open
+            ('service_name', 'updated_at', 'id')
+        ]
     }
 
+    def clean(self):
+        """Stamp every save, so dashboards can fetch only bookings changed since their last sync."""
+        self.updated_at = datetime.utcnow()
+
 
 class Payment(Document):
     booking = fields.ReferenceField('Booking')  # Optional, for service bookings
@@ -214,7 +252,8 @@ class ProviderDepositTransaction(Document):
 
     meta = {
         'collection': 'provider_deposit_transactions',
-        'indexes': ['provider', '-created_at', 'source', 'booking', 'external_reference']
+        'indexes': ['provider', '-created_at', 'source', 'booking', 'external_reference',
+                    ('provider', '-created_at')]
     }
 
 
@@ -264,6 +303,8 @@ class ServiceRequest(Document):
     location_lat = fields.FloatField(required=True)
     location_lon = fields.FloatField(required=True)
     location_address = fields.StringField(max_length=255, required=True)
+    # GeoJSON mirror of location_lat/location_lon for the provider request feed
+    location = fields.PointField()
     
     # Request details
     urgency = fields.StringField(max_length=20, default='normal', 
@@ -286,9 +327,21 @@ class ServiceRequest(Document):
     
     meta = {
         'collection': 'service_requests',
-        'indexes': ['user', 'service_category', 'status', 'created_at', 'location_lat', 'location_lon']
+        'indexes': ['user', 'service_category', 'status', 'created_at', 'location_lat', 'location_lon', '(location']
     }
 
+    def clean(self):
+        """Keep the GeoJSON location in sync with location_lat/location_lon."""
+        try:
+            lat = float(self.location_lat) if self.location_lat is not None else None
+            lon = float(self.location_lon) if self.location_lon is not None else None
+        except (TypeError, ValueError):
+            lat = lon = None
+        if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            self.location = None
+        else:
+            self.location = [lon, lat]
+
 
 class ProviderQuote(Document):
     """Model for provider quotes on service requests"""
@@ -346,6 +399,23 @@ class ProviderNotification(Document):
     }
 
 
+class ChatMessage(Document):
+    """Chat message exchanged between the customer and the provider of a booking"""
+    booking_id = fields.ObjectIdField(required=True)
+    sender_id = fields.ObjectIdField(required=True)
+    sender_type = fields.StringField(max_length=20, required=True, choices=['user', 'provider'])
+    sender_name = fields.StringField(max_length=100)
+    message_type = fields.StringField(max_length=20, default='text')
+    content = fields.StringField()
+    status = fields.StringField(max_length=20, default='sent')
+    created_at = fields.DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        'collection': 'chat_messages',
+        'indexes': [('booking_id', 'created_at', '_id')]
+    }
+
+
 class Feedback(Document):
     user = fields.ReferenceField('User', required=True)
     name = fields.StringField(max_length=100, required=True)
@@ -390,6 +460,8 @@ class Shop(Document):
     address = fields.StringField(max_length=255, required=True)
     location_lat = fields.FloatField(required=True)
     location_lon = fields.FloatField(required=True)
+    # GeoJSON mirror of location_lat/location_lon for distance-ordered browse and search
+    location = fields.PointField()
     contact_phone = fields.StringField(max_length=30, required=True)
     contact_email = fields.EmailField()
     image_path = fields.StringField(max_length=255)  # Shop logo/image
@@ -427,9 +499,22 @@ class Shop(Document):
     
     meta = {
         'collection': 'shops',
-        'indexes': ['owner', 'category', 'is_active', 'location_lat', 'location_lon', 'verification_status']
+        'indexes': ['owner', 'category', 'is_active', 'location_lat', 'location_lon', 'verification_status',
+                    '(location']
     }
 
+    def clean(self):
+        """Keep the GeoJSON location in sync with location_lat/location_lon."""
+        try:
+            lat = float(self.location_lat) if self.location_lat is not None else None
+            lon = float(self.location_lon) if self.location_lon is not None else None
+        except (TypeError, ValueError):
+            lat = lon = None
+        if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+            self.location = None
+        else:
+            self.location = [lon, lat]
+
 
 class Product(Document):
     """Product model for items available in shops"""
@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity, decode_token
 from werkzeug.utils import secure_filename
 from models import Feedback, User, Booking, Provider, ShopAd, Payment, Shop, ReferralRequest
 from services.wallet_service import record_transaction, WalletError, resolve_user
+from services.current_user import load_user
+from services.auth_tokens import require_role
 from datetime import datetime
 from bson import ObjectId
 import os
@@ -22,12 +24,7 @@ def get_user_from_token():
                 if user_id:
                     user_id_str = str(user_id)
                     print(f"DEBUG get_user_from_token: Looking up user with id={user_id_str}")
-                    # Try with ObjectId first (most reliable for MongoDB)
-                    try:
-                        user = User.objects(id=ObjectId(user_id_str)).first()
-                    except:
-                        # Fallback to string if ObjectId conversion fails
-                        user = User.objects(id=user_id_str).first()
+                    user = load_user(user_id_str)
                     print(f"DEBUG get_user_from_token: User found={user is not None}, role={user.role if user else None}")
                     if user and user.role == 'admin':
                         return user_id_str, user
@@ -42,10 +39,7 @@ def get_user_from_token():
         user_id = get_jwt_identity()
         if user_id:
             user_id_str = str(user_id)
-            try:
-                user = User.objects(id=ObjectId(user_id_str)).first()
-            except:
-                user = User.objects(id=user_id_str).first()
+            user = load_user(user_id_str)
             if user and user.role == 'admin':
                 return user_id_str, user
         
@@ -58,10 +52,7 @@ def get_user_from_token():
                 user_id = decoded.get('sub')
                 if user_id:
                     user_id_str = str(user_id)
-                    try:
-                        user = User.objects(id=ObjectId(user_id_str)).first()
-                    except:
-                        user = User.objects(id=user_id_str).first()
+                    user = load_user(user_id_str)
                     if user and user.role == 'admin':
                         return user_id_str, user
             except Exception:
@@ -177,16 +168,10 @@ def admin_feedback():
         return redirect(url_for('auth.login'))
 
 @admin_bp.route('/api/admin/feedback/<feedback_id>/approve', methods=['POST'])
-@jwt_required()
+@require_role('admin')
 def approve_feedback(feedback_id):
     """Approve feedback for display"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         feedback = Feedback.objects(id=feedback_id).first()
         if not feedback:
             return jsonify({'error': 'Feedback not found'}), 404
@@ -201,16 +186,10 @@ def approve_feedback(feedback_id):
         return jsonify({'error': 'Failed to approve feedback'}), 500
 
 @admin_bp.route('/api/admin/feedback/<feedback_id>/feature', methods=['POST'])
-@jwt_required()
+@require_role('admin')
 def feature_feedback(feedback_id):
     """Feature feedback on homepage"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         feedback = Feedback.objects(id=feedback_id).first()
         if not feedback:
             return jsonify({'error': 'Feedback not found'}), 404
@@ -226,16 +205,10 @@ def feature_feedback(feedback_id):
         return jsonify({'error': 'Failed to feature feedback'}), 500
 
 @admin_bp.route('/api/admin/feedback/<feedback_id>/delete', methods=['DELETE'])
-@jwt_required()
+@require_role('admin')
 def delete_feedback(feedback_id):
     """Delete feedback"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         feedback = Feedback.objects(id=feedback_id).first()
         if not feedback:
             return jsonify({'error': 'Feedback not found'}), 404
@@ -545,13 +518,8 @@ def admin_services_page():
 
 
 @admin_bp.post('/api/admin/shops')
-@jwt_required()
+@require_role('admin')
 def create_shop():
-    current_user_id = get_jwt_identity()
-    user = User.objects(id=current_user_id).first()
-    if not user or user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-
     name = request.form.get('name')
     category = request.form.get('category')
     address = request.form.get('address')
@@ -579,13 +547,8 @@ def create_shop():
 
 
 @admin_bp.post('/api/admin/shops/<shop_id>')
-@jwt_required()
+@require_role('admin')
 def update_shop(shop_id):
-    current_user_id = get_jwt_identity()
-    user = User.objects(id=current_user_id).first()
-    if not user or user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
-
     shop = ShopAd.objects(id=shop_id).first()
     if not shop:
         return jsonify({'error': 'Not found'}), 404
@@ -613,12 +576,8 @@ def update_shop(shop_id):
 
 
 @admin_bp.delete('/api/admin/shops/<shop_id>')
-@jwt_required()
+@require_role('admin')
 def delete_shop(shop_id):
-    current_user_id = get_jwt_identity()
-    user = User.objects(id=current_user_id).first()
-    if not user or user.role != 'admin':
-        return jsonify({'error': 'Unauthorized'}), 403
     shop = ShopAd.objects(id=shop_id).first()
     if not shop:
         return jsonify({'error': 'Not found'}), 404
@@ -703,16 +662,10 @@ def admin_bookings_page():
 
 
 @admin_bp.post('/api/admin/bookings/<booking_id>/status')
-@jwt_required()
+@require_role('admin')
 def update_booking_status(booking_id):
     """Update booking status"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         data = request.get_json() or {}
         new_status = data.get('status')
         
@@ -734,16 +687,10 @@ def update_booking_status(booking_id):
 
 
 @admin_bp.get('/api/admin/bookings/<booking_id>')
-@jwt_required()
+@require_role('admin')
 def get_booking_details(booking_id):
     """Get booking details"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         booking = Booking.objects(id=booking_id).first()
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
@@ -851,16 +798,10 @@ def admin_providers_page():
 
 
 @admin_bp.post('/api/admin/providers/<provider_id>/availability')
-@jwt_required()
+@require_role('admin')
 def update_provider_availability(provider_id):
     """Update provider availability"""
     try:
-        current_user_id = get_jwt_identity()
-        user = User.objects(id=current_user_id).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
         data = request.get_json() or {}
         availability = data.get('availability')
         
@@ -957,16 +898,12 @@ def admin_users_page():
 
 
 @admin_bp.post('/api/admin/users/<user_id>/role')
-@jwt_required()
+@require_role('admin')
 def update_user_role(user_id):
     """Update user role"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.objects(id=current_user_id).first()
-        
-        if not current_user or current_user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
+
         # Prevent changing own role
         if str(current_user_id) == str(user_id):
             return jsonify({'error': 'Cannot change your own role'}), 400
@@ -981,7 +918,10 @@ def update_user_role(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        user.role = new_role
+        if user.role != new_role:
+            user.role = new_role
+            # Tokens carry the role as a claim; bumping the version revokes the old ones
+            user.token_version = (user.token_version or 0) + 1
         user.save()
         
         # If changing to provider, create provider profile if doesn't exist
@@ -1007,16 +947,12 @@ def update_user_role(user_id):
 
 
 @admin_bp.delete('/api/admin/users/<user_id>')
-@jwt_required()
+@require_role('admin')
 def delete_user(user_id):
     """Delete user"""
     try:
         current_user_id = get_jwt_identity()
-        current_user = User.objects(id=current_user_id).first()
-        
-        if not current_user or current_user.role != 'admin':
-            return jsonify({'error': 'Unauthorized'}), 403
-        
+
         # Prevent deleting self
         if str(current_user_id) == str(user_id):
             return jsonify({'error': 'Cannot delete your own account'}), 400
@@ -1337,7 +1273,7 @@ def admin_wallet_bonus():
 
         # Find user
         try:
-            user = User.objects(id=ObjectId(user_id)).first()
+            user = load_user(user_id)
         except Exception:
             try:
                 user = User.objects(id=str(user_id)).first()
@@ -1,10 +1,11 @@
 from flask import Blueprint, request, jsonify, render_template, make_response, redirect, url_for
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, set_access_cookies, unset_jwt_cookies
+from flask_jwt_extended import jwt_required, get_jwt_identity, set_access_cookies, unset_jwt_cookies
 from werkzeug.utils import secure_filename
 import os
 from extensions import bcrypt
 from models import User, Provider
-from bson import ObjectId
+from services.current_user import load_user
+from services.auth_tokens import issue_access_token
 import uuid
 
 auth_bp = Blueprint('auth', __name__)
@@ -233,11 +234,7 @@ def google_auth_callback():
             user.save()
         
         # Create JWT token
-        token = create_access_token(identity=str(user.id), additional_claims={
-            'role': user.role, 
-            'name': user.name, 
-            'email': user.email
-        })
+        token = issue_access_token(user)
         
         # Set JWT cookie and redirect based on role
         if user.role == 'admin':
@@ -302,7 +299,7 @@ def signup():
         user.provider_profile = provider
         user.save()
 
-    token = create_access_token(identity=str(user.id), additional_claims={'role': user.role, 'name': user.name, 'email': user.email})
+    token = issue_access_token(user)
     response = make_response(jsonify({'access_token': token}))
     set_access_cookies(response, token)
     return response
@@ -321,7 +318,7 @@ def login():
     if not user or not bcrypt.check_password_hash(user.password_hash, password):
         return jsonify({'message': 'Invalid credentials'}), 401
 
-    token = create_access_token(identity=str(user.id), additional_claims={'role': user.role, 'name': user.name, 'email': user.email})
+    token = issue_access_token(user)
     response = make_response(jsonify({'access_token': token}))
     set_access_cookies(response, token)
     return response
@@ -384,7 +381,7 @@ def get_current_user():
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -429,7 +426,7 @@ def get_user_profile_api():
             user_id = str(ident)
 
         try:
-            user = User.objects(id=ObjectId(user_id)).first()
+            user = load_user(user_id)
         except Exception:
             user = User.objects(id=user_id).first()
 
@@ -573,21 +570,26 @@ def update_location():
         user.longitude = float(longitude)
     if address:
         user.address = address
+    elif latitude is not None and longitude is not None:
+        from services.reverse_geocoder import reverse_geocode
+        user.address = reverse_geocode(user.latitude, user.longitude) or user.address
     
     user.save()
     
     # If user is a provider, also update provider location
     if user.provider_profile:
+        from services.provider_index import index_user_location
+        index_user_location(user)
         try:
-            from extensions import socketio
-            socketio.emit('provider_location', {
+            from services.location_broadcast_service import broadcast_location
+            broadcast_location('provider_location', {
                 'user_id': str(user.id),
                 'name': user.name,
                 'lat': user.latitude,
                 'lon': user.longitude,
                 'address': user.address,
                 'rating': user.rating
-            })
+            }, user.id, user.latitude, user.longitude)
         except Exception:
             pass
     
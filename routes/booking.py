@@ -4,6 +4,15 @@ from extensions import socketio
 from models import Booking, Service, Provider, Payment, User
 from datetime import datetime
 from bson import ObjectId
+from services.provider_stats_service import record_job_completed
+from services.chat_service import participant_cache, post_message, message_history
+from services.pagination import decode_cursor, key_cursor, page_size, parse_key
+from services.current_user import load_user
+from services.booking_serializer import serialize_booking, serialize_bookings
+from services.booking_history_service import (
+    history_page, merged_history_page, changed_since, sync_token, open_bookings_query,
+    skill_bookings_query, split_open_changes
+)
 import math
 
 booking_bp = Blueprint('booking', __name__)
@@ -12,6 +21,7 @@ booking_bp = Blueprint('booking', __name__)
 @booking_bp.get('/bookings/user')
 @jwt_required()
 def get_user_bookings():
+    """The user's bookings, newest first: ?limit=&cursor= pages the history, ?since= returns only changes"""
     try:
         ident = get_jwt_identity()
         # Handle different JWT identity formats
@@ -23,15 +33,20 @@ def get_user_bookings():
             user_id = str(ident)
         
         try:
-            user = User.objects(id=ObjectId(user_id)).first()
+            user = load_user(user_id)
         except Exception:
             user = User.objects(id=user_id).first()
         
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
-        bookings = Booking.objects(user=user).order_by('-created_at')
-        return jsonify([serialize_booking(b) for b in bookings])
+        try:
+            limit, after, since = _history_args()
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        
+        bookings, next_key, token = _history(Booking.objects(user=user), limit, after, since)
+        return _history_response(serialize_bookings(bookings), next_key, token)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -41,35 +56,87 @@ def get_user_bookings():
 @booking_bp.get('/bookings/provider')
 @jwt_required()
 def get_provider_bookings():
+    """Bookings assigned to the provider plus open ones matching their skills, merged into one paged feed.
+
+    With ?since= the delta also lists bookings that are no longer open as {id, removed: true}.
+    """
     ident = get_jwt_identity()
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-    user = User.objects(id=ObjectId(user_id)).first()
+    user = load_user(user_id)
     if not user or not user.provider_profile:
         return jsonify({'message': 'Not a provider'}), 403
     
-    # Get bookings assigned to this provider AND general bookings they can handle
-    provider = user.provider_profile
-    provider_bookings = Booking.objects(provider=provider).order_by('-created_at')
+    try:
+        limit, after, since = _history_args()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
-    # Also get unassigned bookings that match provider skills
+    # Bookings assigned to this provider AND open bookings matching their skills,
+    # read as two indexed streams in the same (created_at, _id) order
+    provider = user.provider_profile
+    streams = [Booking.objects(provider=provider)]
     if provider.skills:
-        # Get all unassigned bookings first
-        unassigned_bookings = Booking.objects(provider__exists=False).order_by('-created_at')
-        
-        # Filter by matching services
-        matching_bookings = []
-        for booking in unassigned_bookings:
-            # Check both service.name and service_name for matching
-            service_name = booking.service_name or (booking.service.name if booking.service else None)
-            if service_name and service_name in provider.skills:
-                matching_bookings.append(booking)
-        
-        # Combine and deduplicate
-        all_bookings = list(provider_bookings) + [b for b in matching_bookings if b not in provider_bookings]
-    else:
-        all_bookings = list(provider_bookings)
+        streams.append(open_bookings_query(provider.skills))
+    
+    if since is not None:
+        # Delta sync: changes to the provider's own bookings, plus changes to any booking
+        # in their skills so open ones that were taken or cancelled come back as
+        # {id, removed} entries; resume from the earliest token
+        bookings, token = changed_since(streams[0], since, limit)
+        tokens, removed = [token], []
+        if provider.skills:
+            changed, token = changed_since(skill_bookings_query(provider.skills), since, limit)
+            still_open, closed_ids = split_open_changes(changed, provider.id)
+            bookings += still_open
+            removed = [{'id': booking_id, 'removed': True} for booking_id in closed_ids]
+            tokens.append(token)
+        return _history_response(serialize_bookings(bookings) + removed, None, min(tokens))
     
-    return jsonify([serialize_booking(b) for b in all_bookings])
+    token = sync_token()
+    bookings, next_key = merged_history_page(streams, limit, after)
+    return _history_response(serialize_bookings(bookings), next_key, token)
+
+
+def _history_args():
+    """(limit, after, since) from ?limit=, ?cursor= and ?since= (epoch ms); ValueError if malformed.
+
+    Without ?limit= or ?cursor= the limit is None and the full history is returned,
+    as for clients written before paging that treat the array as complete.
+    """
+    limit = None
+    if request.args.get('limit') or request.args.get('cursor'):
+        limit = page_size(request.args.get('limit'), default=50, maximum=200)
+    after = None
+    if request.args.get('cursor'):
+        after = parse_key(decode_cursor(request.args.get('cursor')))
+        if not after:
+            raise ValueError('Invalid cursor')
+    since = None
+    if request.args.get('since'):
+        try:
+            since = int(request.args.get('since'))
+        except ValueError:
+            raise ValueError('Invalid since')
+    return limit, after, since
+
+
+def _history(queryset, limit, after=None, since=None):
+    """(bookings, next page key, sync token) for a history page or a delta since the last sync."""
+    if since is not None:
+        bookings, token = changed_since(queryset, since, limit)
+        return bookings, None, token
+    token = sync_token()
+    bookings, next_key = history_page(queryset, limit, after)
+    return bookings, next_key, token
+
+
+def _history_response(payload, next_key, token):
+    """JSON array body (as before pagination); continuation and sync token travel in headers."""
+    response = jsonify(payload)
+    response.headers['X-Sync-Token'] = str(token)
+    if next_key:
+        response.headers['X-Next-Cursor'] = key_cursor(next_key)
+    return response
 
 
 @booking_bp.post('/bookings/create')
@@ -82,7 +149,7 @@ def create_booking():
     
     # Get user
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-    user = User.objects(id=ObjectId(user_id)).first()
+    user = load_user(user_id)
     if not user:
         return jsonify({'message': 'User not found'}), 404
     
@@ -281,7 +348,7 @@ def mock_payment():
 def accept_booking():
     ident = get_jwt_identity()
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-    user = User.objects(id=ObjectId(user_id)).first()
+    user = load_user(user_id)
     
     if not user or not user.provider_profile:
         return jsonify({'message': 'Not a provider'}), 403
@@ -391,32 +458,6 @@ def _broadcast_status(booking: Booking):
     socketio.emit('booking_status', payload, to=f"booking_{booking.id}")
 
 
-def serialize_booking(b: Booking):
-    return {
-        'id': str(b.id),
-        'user_id': str(b.user.id) if b.user else None,
-        'provider_id': str(b.provider.id) if b.provider else b.provider_id,
-        'provider_name': b.provider_name or (b.provider.user.name if b.provider and b.provider.user else None),
-        'service_id': str(b.service.id) if b.service else None,
-        'service_name': b.service_name or (b.service.name if b.service else 'Unknown Service'),
-        'status': b.status,
-        'scheduled_time': b.scheduled_time.isoformat() if b.scheduled_time else None,
-        'price': b.price,
-        'location_lat': b.location_lat,
-        'location_lon': b.location_lon,
-        'notes': b.notes,
-        'rating': b.rating,
-        'review': b.review,
-        'completion_notes': b.completion_notes,
-        'completion_images': b.completion_images or [],
-        'completed_at': b.completed_at.isoformat() if b.completed_at else None,
-        'created_at': b.created_at.isoformat() if b.created_at else None,
-        'has_payment': b.has_payment or (b.payment is not None),
-        'payment_status': b.payment_status or (b.payment.status if b.payment else 'Pending'),
-        'booking_type': b.booking_type or 'hourly',
-    }
-
-
 @booking_bp.post('/bookings/<booking_id>/rate')
 @jwt_required()
 def rate_booking(booking_id):
@@ -525,6 +566,8 @@ def update_booking_status(booking_id):
         old_status = booking.status
         booking.status = new_status
         booking.save()
+        if new_status == 'Completed':
+            record_job_completed(booking.provider, old_status)
         
         # Emit status change to user
         user_room = f"user_{booking.user.id}"
@@ -592,7 +635,7 @@ def get_booking_navigation(booking_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user or not user.provider_profile:
             return jsonify({'error': 'Not authorized'}), 403
@@ -673,49 +716,56 @@ def send_chat_message():
     try:
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        data = request.get_json()
+        data = request.get_json() or {}
         booking_id = data.get('booking_id')
-        sender_type = data.get('sender_type')
         message_type = data.get('type', 'text')
         content = data.get('content')
         
-        if not booking_id or not sender_type or not content:
+        if not booking_id or not content:
             return jsonify({'error': 'Missing required fields'}), 400
-        
-        booking = Booking.objects(id=ObjectId(booking_id)).first()
-        if not booking:
+        if not ObjectId.is_valid(booking_id):
             return jsonify({'error': 'Booking not found'}), 404
         
-        # Create a simple message response (we'll use Socket.IO to handle the actual persistence)
-        message_data = {
-            'booking_id': booking_id,
-            'sender_id': user_id,
-            'sender_type': sender_type,
-            'type': message_type,
-            'content': content,
-            'timestamp': datetime.utcnow().isoformat(),
-            'status': 'sent'
-        }
-        
-        # Emit via Socket.IO
-        socketio.emit('new_message', {
-            'id': f'msg_{int(datetime.utcnow().timestamp() * 1000)}',
-            'booking_id': booking_id,
-            'sender_type': sender_type,
-            'sender_name': user.name,
-            'type': message_type,
-            'content': content,
-            'timestamp': datetime.utcnow().isoformat()
-        }, room=f'booking_{booking_id}')
+        # Delivered over Socket.IO now; persisted by the next write-behind flush
+        message = post_message(booking_id, user_id, content, message_type)
+        if not message:
+            return jsonify({'error': 'Booking not found'}), 404
         
-        return jsonify(message_data)
+        return jsonify(message)
         
     except Exception as e:
         print(f"Error sending chat message: {e}")
         return jsonify({'error': 'Failed to send message'}), 500
 
+
+@booking_bp.get('/api/chat/<booking_id>/messages')
+@jwt_required()
+def get_chat_messages(booking_id):
+    """Chat history of a booking, newest page first; pass next_cursor back as ?cursor= for older messages"""
+    try:
+        ident = get_jwt_identity()
+        user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
+        
+        if not ObjectId.is_valid(booking_id):
+            return jsonify({'error': 'Booking not found'}), 404
+        participants = participant_cache.get(booking_id)
+        if not participants:
+            return jsonify({'error': 'Booking not found'}), 404
+        if user_id not in (participants['customer_id'], participants['provider_user_id']):
+            return jsonify({'error': 'Unauthorized'}), 403
+        
+        limit = page_size(request.args.get('limit'), default=50, maximum=200)
+        after = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            after = parse_key(decode_cursor(cursor))
+            if not after:
+                return jsonify({'error': 'Invalid cursor'}), 400
+        
+        messages, next_key = message_history(booking_id, limit, before=after)
+        return jsonify({'messages': messages, 'next_cursor': key_cursor(next_key)})
+        
+    except Exception as e:
+        print(f"Error getting chat messages: {e}")
+        return jsonify({'error': 'Failed to get messages'}), 500
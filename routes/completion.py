@@ -1,13 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import socketio
-from models import Booking, ServiceCompletion, Payment, User, Provider
+from models import Booking, ServiceCompletion, Payment, Provider
 from bson import ObjectId
 from datetime import datetime
 import os
 import uuid
 import razorpay
 from werkzeug.utils import secure_filename
+from services.provider_stats_service import record_job_completed
+from services.current_user import load_user
 
 completion_bp = Blueprint('completion', __name__)
 
@@ -37,7 +39,7 @@ def upload_service_completion():
     print(f"Request files: {list(request.files.keys())}")  # Debug logging
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user or user.role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
         
@@ -122,8 +124,10 @@ def upload_service_completion():
         booking.completion_notes = completion_notes
         booking.completion_images = uploaded_images
         booking.completed_at = datetime.utcnow()
+        old_status = booking.status
         booking.status = 'Completed'
         booking.save()
+        record_job_completed(provider, old_status)
         
         # If payment method is Cash, deduct commission from provider's deposit
         if booking.payment and booking.payment.method == 'Cash':
@@ -189,7 +193,7 @@ def get_service_completion(booking_id):
             return jsonify({'message': 'Booking not found'}), 404
         
         # Check if user has access to this booking
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
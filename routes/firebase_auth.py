@@ -4,11 +4,12 @@ Handles Google OAuth and Phone OTP authentication via Firebase
 """
 
 from flask import Blueprint, request, jsonify, session
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import firebase_admin
 from firebase_admin import credentials, auth
 import os
 from models import User
+from services.auth_tokens import issue_access_token
 import json
 
 firebase_auth_bp = Blueprint('firebase_auth', __name__)
@@ -106,7 +107,7 @@ def verify_firebase_token():
             print(f"Updated existing user: {name} ({email or phone})")
         
         # Create JWT token for our app
-        access_token = create_access_token(identity=str(user.id))
+        access_token = issue_access_token(user)
         
         return jsonify({
             'success': True,
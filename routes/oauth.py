@@ -1,5 +1,4 @@
 from flask import Blueprint, request, jsonify, redirect, url_for, session, current_app
-from flask_jwt_extended import create_access_token
 from google.oauth2 import id_token
 from google.auth.transport import requests
 import os
@@ -8,6 +7,7 @@ import qrcode
 import io
 import base64
 from models import User
+from services.auth_tokens import issue_access_token
 from datetime import datetime, timedelta
 import random
 import string
@@ -50,7 +50,7 @@ def google_auth():
         
         if user:
             # User exists, log them in
-            access_token = create_access_token(identity=str(user.id))
+            access_token = issue_access_token(user)
             return jsonify({
                 'message': 'Login successful',
                 'access_token': access_token,
@@ -74,7 +74,7 @@ def google_auth():
             )
             user.save()
             
-            access_token = create_access_token(identity=str(user.id))
+            access_token = issue_access_token(user)
             return jsonify({
                 'message': 'Account created and logged in successfully',
                 'access_token': access_token,
@@ -165,7 +165,7 @@ def verify_otp():
         
         if user:
             # User exists, log them in
-            access_token = create_access_token(identity=str(user.id))
+            access_token = issue_access_token(user)
             return jsonify({
                 'message': 'Login successful',
                 'access_token': access_token,
@@ -192,7 +192,7 @@ def verify_otp():
             )
             user.save()
             
-            access_token = create_access_token(identity=str(user.id))
+            access_token = issue_access_token(user)
             return jsonify({
                 'message': 'Account created and logged in successfully',
                 'access_token': access_token,
@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import Booking, Payment, User, Order
+from models import Booking, Payment, Order
 from bson import ObjectId
 from datetime import datetime
 import razorpay
@@ -10,6 +10,7 @@ import hmac
 import hashlib
 from services.wallet_service import record_transaction, WalletError
 from services.provider_deposit_service import deduct_commission, ProviderDepositError
+from services.current_user import load_user
 
 payment_bp = Blueprint('payment', __name__)
 
@@ -83,7 +84,7 @@ def create_razorpay_order():
         # Get user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -142,7 +143,7 @@ def verify_razorpay_payment():
         # Get user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -212,7 +213,7 @@ def pay_booking_with_wallet():
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
@@ -337,7 +338,7 @@ def mark_cash_payment():
     try:
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user or user.role != 'provider':
             return jsonify({'error': 'Only providers can mark cash payments'}), 403
@@ -442,7 +443,7 @@ def create_razorpay_order_shop():
         # Get user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -526,7 +527,7 @@ def verify_razorpay_payment_shop():
         # Get user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
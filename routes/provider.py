@@ -3,13 +3,22 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from extensions import socketio
 from models import User, Provider, Booking, ProviderDepositTransaction
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime
 from services.provider_deposit_service import (
     resolve_provider, record_deposit_transaction, deduct_commission,
-    check_minimum_balance, get_deposit_summary, ProviderDepositError
+    check_minimum_balance, get_deposit_summary, deposit_etag, ProviderDepositError
 )
-import math
-import random
+from services.provider_location_service import find_nearby_providers
+from services.provider_index import provider_index, index_provider, tracked_provider
+from services.skill_index import skill_index
+from services.location_ingest_service import location_ingestor
+from services.location_broadcast_service import broadcast_location
+from services.tracking_store import tracking_store, simulated_position, SIMULATION_ENABLED
+from services.provider_stats_service import count_jobs_by_provider
+from services.geo import haversine_km
+from services.routing import route_engine, waypoints as route_waypoints
+from services.reverse_geocoder import reverse_geocode
+from services.current_user import load_user
 import json
 import os
 import razorpay
@@ -28,7 +37,7 @@ def set_my_availability():
     try:
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user or not user.provider_profile:
             return jsonify({'error': 'Provider profile not found'}), 404
         data = request.get_json() or {}
@@ -37,24 +46,13 @@ def set_my_availability():
         provider = user.provider_profile
         provider.availability = bool(data.get('availability'))
         provider.save()
+        index_provider(user, provider)
         return jsonify({'message': 'Availability updated', 'availability': provider.availability})
     except Exception as e:
         return jsonify({'error': 'Failed to update availability'}), 500
 
 
 
-def calculate_distance_haversine(lat1, lon1, lat2, lon2):
-    """Calculate distance between two coordinates using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    dLat = math.radians(lat2 - lat1)
-    dLon = math.radians(lon2 - lon1)
-    a = (math.sin(dLat/2) * math.sin(dLat/2) +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dLon/2) * math.sin(dLon/2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    return R * c
-
-
 @provider_bp.get('/providers/nearby')
 @jwt_required(optional=True)
 def providers_nearby():
@@ -74,115 +72,53 @@ def providers_nearby():
     # Get optional service filter
     service_type = request.args.get('service_type', '').lower()
     print(f"Searching for providers near {lat}, {lon} within {radius_km}km with service: {service_type}")
-    
-    # Get all provider users
-    users = User.objects(role='provider')
-    print(f"Found {users.count()} provider users")
+
+    # Resolve the service filter to provider IDs through the skill index first, so
+    # the distance query only ever sees providers that offer the service
+    provider_ids = skill_index.providers_for(service_type) if service_type else None
+    if provider_ids is not None and not provider_ids:
+        print("No providers offer the requested service")
+        return jsonify([])
+
+    # Answer from the in-process grid index; fall back to a single $geoNear
+    # aggregation (radius filter, distance and sort on the server) until it is loaded
+    if provider_index.ensure_fresh():
+        candidates = provider_index.within_radius(lat, lon, radius_km, limit=50, provider_ids=provider_ids)
+    else:
+        query = None
+        if provider_ids is not None:
+            query = {'provider_profile': {'$in': [ObjectId(pid) for pid in provider_ids]}}
+        candidates = find_nearby_providers(lat, lon, radius_km, limit=50, query=query)
+    # One $group over bookings for the whole page instead of a count per provider
+    jobs_counts = count_jobs_by_provider([c['provider_id'] for c in candidates])
     results = []
-    
-    for u in users:
-        print(f"Checking provider user: {u.name} (ID: {u.id})")
-        
-        # Check if provider has location set
-        if u.latitude is None or u.longitude is None:
-            print(f"  Provider {u.name} has no location set, skipping")
-            continue
-            
-        provider_lat = u.latitude
-        provider_lon = u.longitude
-        
-        # Calculate accurate distance using Haversine formula
-        dist = calculate_distance_haversine(lat, lon, provider_lat, provider_lon)
-        print(f"  Distance: {dist:.2f}km")
-        
-        # Filter by radius
-        if dist > radius_km:
-            print(f"  Provider {u.name} is {dist:.2f}km away, outside {radius_km}km range")
-            continue
-            
-        provider = u.provider_profile
-        print(f"  Provider profile: {provider}")
-        if not provider:
-            print(f"  No provider profile found for {u.name}")
-            continue
-            
-        skills = provider.skills if provider.skills else []
-        print(f"  Skills: {skills}")
-        
-        # Filter by service type if provided
-        if service_type:
-            print(f"  Filtering by service type: {service_type}")
-            # Check if provider has the requested service - improved matching
-            service_match = False
-            
-            # Exact match
-            if service_type in [skill.lower() for skill in skills]:
-                service_match = True
-            
-            # Partial match (e.g., "electrician" matches "Electrical")
-            if not service_match:
-                for skill in skills:
-                    if (service_type in skill.lower() or 
-                        skill.lower() in service_type or
-                        service_type.replace(' ', '') in skill.lower().replace(' ', '') or
-                        skill.lower().replace(' ', '') in service_type.replace(' ', '')):
-                        service_match = True
-                        break
-            
-            # Category-based matching
-            if not service_match and service_type:
-                service_categories = {
-                    'electrician': ['electrical', 'electric', 'wiring', 'power'],
-                    'plumber': ['plumbing', 'water', 'pipe', 'drain'],
-                    'carpenter': ['carpentry', 'wood', 'furniture', 'cabinet'],
-                    'cleaner': ['cleaning', 'housekeeping', 'maid'],
-                    'painter': ['painting', 'paint', 'wall', 'decor'],
-                    'ac': ['air conditioning', 'cooling', 'refrigerator', 'hvac']
-                }
-                
-                for category, keywords in service_categories.items():
-                    if category in service_type:
-                        for keyword in keywords:
-                            if any(keyword in skill.lower() for skill in skills):
-                                service_match = True
-                                break
-                        if service_match:
-                            break
-            
-            if not service_match:
-                print(f"  Service mismatch for {u.name}")
-                continue
-            else:
-                print(f"  Service match found for {u.name}")
-        
+
+    for candidate in candidates:
+        skills = candidate['skills']
+
         # Calculate hourly rate based on skills and experience
         base_rate = 300  # Base rate in INR
         skill_multiplier = len(skills) * 50
         hourly_rate = base_rate + skill_multiplier
-        
-        # Get jobs count from bookings
-        from models import Booking
-        jobs_count = Booking.objects(provider=provider).count()
-        
+
         results.append({
-            'id': str(provider.id),
-            'name': u.name,
+            'id': str(candidate['provider_id']),
+            'name': candidate['name'],
             'skills': skills,
-            'rating': u.rating or 5.0,
+            'rating': candidate['rating'] or 5.0,
             'hourly_rate': hourly_rate,
             'price': hourly_rate,  # For backward compatibility
-            'lat': provider_lat,
-            'lon': provider_lon,
-            'jobs_count': jobs_count,
-            'distance_km': round(dist, 2),
-            'avatar': u.avatar_path,
-            'availability': provider.availability,
+            'lat': candidate['lat'],
+            'lon': candidate['lon'],
+            'jobs_count': jobs_counts.get(candidate['provider_id'], 0),
+            'completed_jobs': candidate.get('completed_jobs') or 0,
+            'distance_km': round(candidate['distance_km'], 2),
+            'avatar': candidate['avatar'],
+            'availability': candidate['availability'],
         })
-    
-    # Sort by distance first, then by rating
-    results.sort(key=lambda x: (x['distance_km'], -x['rating']))
+
     print(f"Returning {len(results)} providers")
-    return jsonify(results[:50])
+    return jsonify(results)
 
 
 @provider_bp.get('/nearby')
@@ -200,31 +136,32 @@ def update_provider_location():
     ident = get_jwt_identity()
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user:
+        provider = tracked_provider(user_id, providers_only=False)
+        if not provider:
             return jsonify({'message': 'User not found'}), 404
         
         data = request.get_json() or {}
-        user.latitude = data.get('lat')
-        user.longitude = data.get('lon')
         # Optional human-readable address
-        if 'address' in data:
-            user.address = data.get('address')
-        user.save()
-        # Broadcast provider location update to clients
+        address = data.get('address') if 'address' in data else None
         try:
-            room = f"provider_{user.id}"
-            socketio.emit('provider_location', {
-                'user_id': str(user.id),
-                'name': user.name,
-                'lat': user.latitude,
-                'lon': user.longitude,
-                'address': user.address,
-                'rating': user.rating
-            })
+            lat, lon = location_ingestor.ingest(user_id, data.get('lat'), data.get('lon'), address=address)
+        except ValueError:
+            return jsonify({'message': 'Valid lat and lon are required'}), 400
+        if address is None:
+            address = provider.get('address')
+        # Broadcast to clients tracking this provider or viewing its area
+        try:
+            broadcast_location('provider_location', {
+                'user_id': user_id,
+                'name': provider.get('name'),
+                'lat': lat,
+                'lon': lon,
+                'address': address,
+                'rating': provider.get('rating')
+            }, user_id, lat, lon)
         except Exception:
             pass
-        return jsonify({'message': 'Location updated', 'address': user.address})
+        return jsonify({'message': 'Location updated', 'address': address})
     except Exception as e:
         return jsonify({'message': 'Invalid user ID'}), 400
 
@@ -236,7 +173,7 @@ def add_provider_service():
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user or user.role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
         
@@ -254,6 +191,8 @@ def add_provider_service():
         if service_name not in provider.skills:
             provider.skills.append(service_name)
             provider.save()
+            provider_index.update(user.id, skills=list(provider.skills))
+            skill_index.set_skills(provider.id, provider.skills)
             
             # Broadcast provider update
             try:
@@ -279,7 +218,7 @@ def remove_provider_service():
     user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user or user.role != 'provider':
             return jsonify({'message': 'Provider not found'}), 404
         
@@ -297,6 +236,8 @@ def remove_provider_service():
         if service_name in provider.skills:
             provider.skills.remove(service_name)
             provider.save()
+            provider_index.update(user.id, skills=list(provider.skills))
+            skill_index.set_skills(provider.id, provider.skills)
             
             # Broadcast provider update
             try:
@@ -369,7 +310,7 @@ def get_provider_location_data(provider_id):
         provider_lon = provider_user.longitude if provider_user.longitude else 77.2090
         
         # Calculate distance and ETA
-        distance_km = calculate_distance_haversine(user_lat, user_lon, provider_lat, provider_lon)
+        distance_km = haversine_km(user_lat, user_lon, provider_lat, provider_lon)
         eta_minutes = max(5, int((distance_km / 30) * 60))  # 30 km/h average
         
         # Determine status
@@ -577,8 +518,8 @@ def update_provider_tracking_location():
     user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
     
     try:
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user or user.role != 'provider':
+        provider = tracked_provider(user_id)
+        if not provider:
             return jsonify({'message': 'Provider not found'}), 404
         
         data = request.get_json() or {}
@@ -588,21 +529,21 @@ def update_provider_tracking_location():
         if latitude is None or longitude is None:
             return jsonify({'message': 'Latitude and longitude are required'}), 400
         
-        # Update user location
-        user.latitude = float(latitude)
-        user.longitude = float(longitude)
-        user.save()
+        # Queue the position; it is written with the next coalesced bulk flush
+        try:
+            latitude, longitude = location_ingestor.ingest(user_id, latitude, longitude)
+        except ValueError:
+            return jsonify({'message': 'Invalid latitude or longitude'}), 400
         
-        # Broadcast location update to clients tracking this provider
+        # Broadcast location update to clients tracking this provider or viewing its area
         try:
-            from datetime import datetime
-            socketio.emit('provider_location_update', {
-                'provider_id': str(user.id),
-                'name': user.name,
+            broadcast_location('provider_location_update', {
+                'provider_id': user_id,
+                'name': provider.get('name'),
                 'lat': latitude,
                 'lon': longitude,
                 'timestamp': datetime.utcnow().isoformat()
-            })
+            }, user_id, latitude, longitude)
         except Exception:
             pass
         
@@ -616,42 +557,64 @@ def update_provider_tracking_location():
         return jsonify({'message': 'Invalid request'}), 400
 
 
+@provider_bp.get('/api/provider/location-ingest/metrics')
+@jwt_required()
+def get_location_ingest_metrics():
+    """Queue depth, write lag and throughput of the location ingestion stage"""
+    return jsonify(location_ingestor.metrics())
+
+
 @provider_bp.get('/providers/<provider_id>/location')
 @jwt_required()
 def get_provider_location(provider_id):
     """Get current location and ETA for a specific provider"""
     try:
-        provider_user = User.objects(id=ObjectId(provider_id)).first()
-        if not provider_user or provider_user.role != 'provider':
-            return jsonify({'message': 'Provider not found'}), 404
+        # Live position from the in-process index, falling back to the stored profile
+        position = provider_index.get(provider_id)
+        if not position:
+            provider_user = User.objects(id=ObjectId(provider_id)).first()
+            if not provider_user or provider_user.role != 'provider':
+                return jsonify({'message': 'Provider not found'}), 404
+            position = {
+                'name': provider_user.name,
+                'lat': provider_user.latitude,
+                'lon': provider_user.longitude,
+                'address': provider_user.address
+            }
+            # A ping may be queued but not flushed yet
+            pending = location_ingestor.pending_position(provider_id)
+            if pending:
+                position.update(lat=pending['latitude'], lon=pending['longitude'],
+                                address=pending.get('address', position['address']))
         
         # Get current user location (for ETA calculation)
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
-        current_user = User.objects(id=ObjectId(user_id)).first()
+        current_user = load_user(user_id)
         
         if not current_user:
             return jsonify({'message': 'User not found'}), 404
         
         # Calculate ETA (simple distance-based calculation)
-        if (provider_user.latitude and provider_user.longitude and 
+        if (position['lat'] and position['lon'] and 
             current_user.latitude and current_user.longitude):
             
             # Calculate distance in km
-            lat_diff = provider_user.latitude - current_user.latitude
-            lon_diff = provider_user.longitude - current_user.longitude
-            distance_km = math.sqrt(lat_diff**2 + lon_diff**2) * 111
+            distance_km = haversine_km(
+                current_user.latitude, current_user.longitude,
+                position['lat'], position['lon']
+            )
             
             # Estimate ETA (assuming average speed of 25 km/h in city traffic)
             eta_minutes = max(5, int((distance_km / 25) * 60))
             
             return jsonify({
-                'provider_id': str(provider_user.id),
-                'provider_name': provider_user.name,
+                'provider_id': provider_id,
+                'provider_name': position['name'],
                 'location': {
-                    'lat': provider_user.latitude,
-                    'lon': provider_user.longitude,
-                    'address': provider_user.address
+                    'lat': position['lat'],
+                    'lon': position['lon'],
+                    'address': position['address']
                 },
                 'distance_km': round(distance_km, 2),
                 'eta_minutes': eta_minutes,
@@ -667,62 +630,50 @@ def get_provider_location(provider_id):
 
 @provider_bp.get('/providers/<provider_id>/track')
 def get_provider_tracking(provider_id):
-    """Get real-time tracking information for a provider"""
+    """Get real-time tracking information for a provider (read-only, briefly cacheable)"""
     try:
         # No authentication required for tracking
-        
-        # Get provider user first, then their provider profile
-        provider_user = User.objects(id=ObjectId(provider_id)).first()
-        if not provider_user or provider_user.role != 'provider':
+        if not ObjectId.is_valid(provider_id):
             return jsonify({'message': 'Provider not found'}), 404
-        
-        provider = provider_user.provider_profile
-        if not provider:
+        provider_user = User.objects(id=ObjectId(provider_id)) \
+            .only('name', 'phone', 'rating', 'role', 'provider_profile', 'latitude', 'longitude', 'address') \
+            .as_pymongo().first()
+        if not provider_user or provider_user.get('role') != 'provider':
+            return jsonify({'message': 'Provider not found'}), 404
+        if not provider_user.get('provider_profile'):
             return jsonify({'message': 'Provider profile not found'}), 404
         
         # Get user's current location (from request or default)
         user_lat = float(request.args.get('user_lat', 28.6139))
         user_lon = float(request.args.get('user_lon', 77.2090))
         
-        # Get provider's current location
-        provider_lat = provider_user.latitude if provider_user.latitude else 28.6139
-        provider_lon = provider_user.longitude if provider_user.longitude else 77.2090
-        
-        # Add some realistic movement simulation
-        if not hasattr(provider, 'last_update') or not provider.last_update:
-            provider.last_update = datetime.utcnow()
-            provider.current_lat = provider_lat
-            provider.current_lon = provider_lon
-            provider.save()
+        # Get current booking if provided
+        booking_id = request.args.get('booking_id')
+        booking = None
+        if booking_id and ObjectId.is_valid(booking_id):
+            booking = Booking.objects(id=ObjectId(booking_id)) \
+                .only('service_name', 'scheduled_time', 'price', 'created_at').first()
+        
+        # Live position from recent pings; otherwise the last saved location, or the
+        # demo simulation when it is switched on (TRACKING_SIMULATION=1)
+        live = tracking_store.get(provider_id)
+        saved_lat = provider_user.get('latitude') or 28.6139
+        saved_lon = provider_user.get('longitude') or 77.2090
+        if live:
+            current_lat, current_lon, last_update = live['lat'], live['lon'], live['updated_at']
+        elif SIMULATION_ENABLED:
+            last_update = datetime.utcnow()
+            current_lat, current_lon = simulated_position(saved_lat, saved_lon, user_lat, user_lon,
+                                                          booking.created_at if booking else None, last_update)
         else:
-            # Simulate movement towards user
-            time_diff = (datetime.utcnow() - provider.last_update).total_seconds()
-            if time_diff > 30:  # Update every 30 seconds
-                # Move provider slightly towards user
-                lat_diff = user_lat - provider.current_lat
-                lon_diff = user_lon - provider.current_lon
-                
-                # Move 10% of the distance towards user
-                provider.current_lat += lat_diff * 0.1
-                provider.current_lon += lon_diff * 0.1
-                provider.last_update = datetime.utcnow()
-                provider.save()
+            current_lat, current_lon, last_update = saved_lat, saved_lon, None
         
         # Calculate distance and ETA
-        distance_km = calculate_distance(
-            user_lat, user_lon, 
-            provider.current_lat, provider.current_lon
-        )
+        distance_km = haversine_km(user_lat, user_lon, current_lat, current_lon)
         
         # Estimate ETA based on distance (assuming 30 km/h average speed)
         eta_minutes = max(5, int((distance_km / 30) * 60))
         
-        # Get current booking if provided
-        booking_id = request.args.get('booking_id')
-        booking = None
-        if booking_id:
-            booking = Booking.objects(id=ObjectId(booking_id)).first()
-        
         # Determine provider status
         if distance_km < 0.5:
             status = "Arrived"
@@ -731,36 +682,41 @@ def get_provider_tracking(provider_id):
         else:
             status = "On the way"
         
-        # Get provider's current address (reverse geocoding simulation)
-        current_address = get_address_from_coords(provider.current_lat, provider.current_lon)
+        entry = provider_index.get(provider_id)
+        current_address = (entry or {}).get('address') or provider_user.get('address') \
+            or reverse_geocode(current_lat, current_lon)
         
         tracking_data = {
             'provider': {
-                'id': str(provider.id),
-                'name': provider_user.name,
-                'phone': provider_user.phone,
-                'rating': provider_user.rating
+                'id': str(provider_user['provider_profile']),
+                'name': provider_user.get('name'),
+                'phone': provider_user.get('phone'),
+                'rating': provider_user.get('rating')
             },
             'location': {
-                'lat': provider.current_lat,
-                'lon': provider.current_lon,
-                'address': current_address
+                'lat': current_lat,
+                'lon': current_lon,
+                'address': current_address,
+                'live': bool(live)
             },
             'distance': {
                 'km': round(distance_km, 2),
                 'eta_minutes': eta_minutes
             },
             'status': status,
-            'last_updated': provider.last_update.isoformat(),
+            'last_updated': last_update.isoformat() if last_update else None,
             'booking': {
-                'id': str(booking.id) if booking else None,
-                'service_name': booking.service_name if booking else None,
-                'scheduled_time': booking.scheduled_time.isoformat() if booking and booking.scheduled_time else None,
-                'price': booking.price if booking else None
+                'id': str(booking.id),
+                'service_name': booking.service_name,
+                'scheduled_time': booking.scheduled_time.isoformat() if booking.scheduled_time else None,
+                'price': booking.price
             } if booking else None
         }
         
-        return jsonify(tracking_data)
+        response = jsonify(tracking_data)
+        response.headers['Cache-Control'] = 'private, max-age=5'
+        response.add_etag()
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"Error tracking provider: {e}")
@@ -776,37 +732,36 @@ def get_provider_route(provider_id):
         user_lon = float(request.args.get('user_lon', 77.2090))
         
         # Get provider user first, then their provider profile
-        provider_user = User.objects(id=ObjectId(provider_id)).first()
-        if not provider_user or provider_user.role != 'provider':
+        if not ObjectId.is_valid(provider_id):
             return jsonify({'message': 'Provider not found'}), 404
-        
-        provider = provider_user.provider_profile
-        if not provider:
+        provider_user = User.objects(id=ObjectId(provider_id)) \
+            .only('role', 'provider_profile', 'latitude', 'longitude').as_pymongo().first()
+        if not provider_user or provider_user.get('role') != 'provider':
+            return jsonify({'message': 'Provider not found'}), 404
+        if not provider_user.get('provider_profile'):
             return jsonify({'message': 'Provider profile not found'}), 404
         
-        # Get provider location
-        provider_lat = provider.current_lat if hasattr(provider, 'current_lat') else provider_user.latitude
-        provider_lon = provider.current_lon if hasattr(provider, 'current_lon') else provider_user.longitude
+        # Get provider location: live position if pinging, else the saved one
+        live = tracking_store.get(provider_id)
+        provider_lat = live['lat'] if live else provider_user.get('latitude')
+        provider_lon = live['lon'] if live else provider_user.get('longitude')
         
         if not provider_lat or not provider_lon:
             return jsonify({'message': 'Provider location not available'}), 404
         
-        # Generate route waypoints (simplified)
-        route_points = generate_route_waypoints(
-            provider_lat, provider_lon,
-            user_lat, user_lon
-        )
-        
-        # Calculate route statistics
-        total_distance = calculate_route_distance(route_points)
-        estimated_duration = max(5, int((total_distance / 30) * 60))  # 30 km/h average
+        # Memoized per (origin cell, destination cell, time bucket), so polls are cache lookups
+        route = route_engine.route(provider_lat, provider_lon, user_lat, user_lon)
+        total_distance = route['distance_km']
+        estimated_duration = route['duration_minutes']
         
         route_data = {
-            'provider_id': str(provider.id),
-            'waypoints': route_points,
+            'provider_id': str(provider_user['provider_profile']),
+            'waypoints': route_waypoints(route['points'], estimated_duration),
+            'path': [{'lat': lat, 'lon': lon} for lat, lon in route['points']],
             'total_distance_km': round(total_distance, 2),
             'estimated_duration_minutes': estimated_duration,
-            'traffic_conditions': get_traffic_conditions(),
+            'traffic_conditions': route['traffic'],
+            'router': route['router'],
             'route_summary': {
                 'start_address': get_address_from_coords(provider_lat, provider_lon),
                 'end_address': get_address_from_coords(user_lat, user_lon),
@@ -822,100 +777,9 @@ def get_provider_route(provider_id):
         return jsonify({'message': 'Failed to get route'}), 500
 
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in kilometers"""
-    R = 6371  # Earth's radius in kilometers
-    
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(dlat/2) * math.sin(dlat/2) + 
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * 
-         math.sin(dlon/2) * math.sin(dlon/2))
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance
-
-
 def get_address_from_coords(lat, lon):
-    """Get address from coordinates (simplified)"""
-    # In a real app, you'd use a geocoding service like Google Maps API
-    addresses = [
-        "Sector 18, Noida",
-        "Connaught Place, New Delhi",
-        "Karol Bagh, New Delhi",
-        "Lajpat Nagar, New Delhi",
-        "Rajouri Garden, New Delhi"
-    ]
-    
-    # Return a random address for simulation
-    return random.choice(addresses)
-
-
-def generate_route_waypoints(start_lat, start_lon, end_lat, end_lon):
-    """Generate route waypoints between two points"""
-    # Simplified route generation - in real app, use routing service
-    waypoints = []
-    
-    # Add start point
-    waypoints.append({
-        'lat': start_lat,
-        'lon': start_lon,
-        'timestamp': datetime.utcnow().isoformat(),
-        'status': 'start'
-    })
-    
-    # Generate intermediate waypoints
-    num_points = 5
-    for i in range(1, num_points):
-        progress = i / num_points
-        lat = start_lat + (end_lat - start_lat) * progress
-        lon = start_lon + (end_lon - start_lon) * progress
-        
-        # Add some realistic variation
-        lat += random.uniform(-0.001, 0.001)
-        lon += random.uniform(-0.001, 0.001)
-        
-        waypoints.append({
-            'lat': lat,
-            'lon': lon,
-            'timestamp': (datetime.utcnow() + timedelta(minutes=i*2)).isoformat(),
-            'status': 'in_transit'
-        })
-    
-    # Add end point
-    waypoints.append({
-        'lat': end_lat,
-        'lon': end_lon,
-        'timestamp': (datetime.utcnow() + timedelta(minutes=10)).isoformat(),
-        'status': 'destination'
-    })
-    
-    return waypoints
-
-
-def calculate_route_distance(waypoints):
-    """Calculate total distance of route"""
-    total_distance = 0
-    for i in range(len(waypoints) - 1):
-        distance = calculate_distance(
-            waypoints[i]['lat'], waypoints[i]['lon'],
-            waypoints[i+1]['lat'], waypoints[i+1]['lon']
-        )
-        total_distance += distance
-    return total_distance
-
-
-def get_traffic_conditions():
-    """Get current traffic conditions (simplified)"""
-    conditions = ['Light', 'Moderate', 'Heavy', 'Severe']
-    return {
-        'level': random.choice(conditions),
-        'delay_minutes': random.randint(0, 15),
-        'description': f"Traffic is {random.choice(['light', 'moderate', 'heavy']).lower()}"
-    }
+    """Get address from coordinates (offline gazetteer lookup)"""
+    return reverse_geocode(lat, lon)
 
 
 @provider_bp.get('/api/provider/current-location')
@@ -926,7 +790,7 @@ def get_current_provider_location():
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident.get('id') or ident)
         
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user or user.role != 'provider':
             return jsonify({'error': 'Provider not found'}), 404
         
@@ -953,8 +817,17 @@ def get_provider_deposit():
         if not provider:
             return jsonify({'error': 'Provider not found'}), 404
         
-        summary = get_deposit_summary(provider)
-        return jsonify(summary)
+        # Dashboards get pushed deposit_updated events; this is the fallback, so answer
+        # unchanged summaries with 304 before loading any transactions
+        etag = deposit_etag(provider)
+        if request.if_none_match.contains(etag):
+            response = jsonify()
+            response.status_code = 304
+        else:
+            response = jsonify(get_deposit_summary(provider))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except ProviderDepositError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify, url_for, render_template
-from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 from models import Service, User, Booking
+from services.auth_tokens import require_role
 from bson import ObjectId
 import os
 
@@ -91,17 +91,8 @@ def public_stats():
 
 
 @service_bp.post('/services')
-@jwt_required()
+@require_role('admin')
 def create_service():
-    ident = get_jwt_identity()
-    user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-    try:
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user or user.role != 'admin':
-            return jsonify({'message': 'Admin only'}), 403
-    except Exception:
-        return jsonify({'message': 'Invalid user ID'}), 400
-
     # multipart form support
     name = request.form.get('name')
     category = request.form.get('category')
@@ -175,17 +166,8 @@ def service_view(service_id):
 
 
 @service_bp.get('/admin/stats')
-@jwt_required()
+@require_role('admin')
 def admin_stats():
-    ident = get_jwt_identity()
-    user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-    try:
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user or user.role != 'admin':
-            return jsonify({'message': 'Admin only'}), 403
-    except Exception:
-        return jsonify({'message': 'Invalid user ID'}), 400
-    
     total_users = User.objects.count()
     total_bookings = Booking.objects.count()
     revenue = sum([b.price or 0 for b in Booking.objects()])
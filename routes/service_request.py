@@ -6,8 +6,12 @@ import os
 import uuid
 from bson import ObjectId
 
-from models import User, Provider, ServiceRequest, ProviderQuote, ProviderNotification, Booking
+from models import ServiceRequest, ProviderQuote, ProviderNotification, Booking
 from extensions import socketio
+from services.request_dispatch_service import dispatch_new_request
+from services.request_feed_service import open_requests_near, open_requests_unlocated, quotes_by_request
+from services.pagination import decode_cursor, page_size, parse_key, key_cursor
+from services.current_user import load_user, load_provider
 
 service_request_bp = Blueprint('service_request', __name__)
 
@@ -86,7 +90,7 @@ def create_service_request():
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -164,8 +168,8 @@ def create_service_request():
         
         service_request.save()
         
-        # Notify nearby providers
-        notify_nearby_providers(service_request)
+        # Notify nearby providers in the background
+        dispatch_new_request(service_request)
         
         return jsonify({
             'success': True,
@@ -177,95 +181,6 @@ def create_service_request():
         print(f"Error creating service request: {e}")
         return jsonify({'error': 'Failed to create service request'}), 500
 
-def notify_nearby_providers(service_request):
-    """Notify nearby providers about the new service request"""
-    try:
-        # Find providers within 15km radius
-        providers = Provider.objects(availability=True)
-        nearby_providers = []
-        
-        print(f"Found {providers.count()} available providers")
-        
-        for provider in providers:
-            if provider.user.latitude and provider.user.longitude:
-                # Calculate distance using Haversine formula
-                distance = calculate_distance_haversine(
-                    service_request.location_lat, service_request.location_lon,
-                    provider.user.latitude, provider.user.longitude
-                )
-                
-                print(f"Provider {provider.user.name} is {distance:.2f}km away")
-                
-                if distance <= 15:  # 15km radius
-                    nearby_providers.append(provider)
-            else:
-                print(f"Provider {provider.user.name} has no location set")
-        
-        # If no nearby providers found, notify all available providers
-        if not nearby_providers:
-            print("No nearby providers found, notifying all available providers")
-            nearby_providers = list(providers)
-        
-        # Create notifications for nearby providers
-        for provider in nearby_providers:
-            try:
-                notification = ProviderNotification(
-                    provider=provider,
-                    service_request=service_request,
-                    notification_type='new_request',
-                    title=f"New {service_request.service_category.title()} Request",
-                    message=f"New service request near you: {service_request.description[:100]}...",
-                    is_sent=True
-                )
-                notification.save()
-                
-                # Emit real-time notification via WebSocket
-                # Use provider.user.id for room to match client-side room joining
-                provider_user_id = str(provider.user.id)
-                provider_room = f'provider_{provider_user_id}'
-                
-                socketio.emit('new_service_request', {
-                    'request_id': str(service_request.id),
-                    'service_category': service_request.service_category,
-                    'title': service_request.title,
-                    'description': service_request.description,
-                    'urgency': service_request.urgency,
-                    'location': service_request.location_address,
-                    'distance': calculate_distance_haversine(
-                        service_request.location_lat, service_request.location_lon,
-                        provider.user.latitude or 0, provider.user.longitude or 0
-                    ) if provider.user.latitude and provider.user.longitude else 0
-                }, room=provider_room)
-                
-                print(f"Emitting to room: {provider_room} for provider user: {provider.user.name}")
-                
-                print(f"Notified provider {provider.user.name}")
-            except Exception as e:
-                print(f"Error notifying provider {provider.user.name}: {e}")
-        
-        print(f"Notified {len(nearby_providers)} providers about new service request")
-        
-    except Exception as e:
-        print(f"Error notifying providers: {e}")
-
-def calculate_distance_haversine(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    import math
-    
-    # Convert latitude and longitude from degrees to radians
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    # Haversine formula
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    # Radius of earth in kilometers
-    r = 6371
-    
-    return c * r
-
 @service_request_bp.get('/api/service-requests/<request_id>')
 @jwt_required()
 def get_service_request(request_id):
@@ -281,7 +196,7 @@ def get_service_request(request_id):
             return jsonify({'error': 'Service request not found'}), 404
         
         # Check if user owns this request or is a provider
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -338,7 +253,7 @@ def get_user_service_requests():
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -370,7 +285,7 @@ def select_quote(request_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -516,7 +431,7 @@ def get_provider_notifications():
         
         print(f"Getting notifications for user ID: {user_id}")
         
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             print(f"User not found: {user_id}")
@@ -534,7 +449,7 @@ def get_provider_notifications():
                 'notifications': []
             }), 403
         
-        provider = Provider.objects(user=user).first()
+        provider = load_provider(user)
         if not provider:
             print(f"Provider profile not found for user: {user_id}")
             return jsonify({
@@ -595,7 +510,7 @@ def get_provider_service_requests():
         
         print(f"Provider service requests - User ID: {user_id}")
         
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         print(f"User found: {user.name if user else 'None'}")
         print(f"User role: {user.role if user else 'None'}")
@@ -606,7 +521,7 @@ def get_provider_service_requests():
         if user.role != 'provider':
             return jsonify({'error': 'Access denied', 'details': 'Only providers can access this endpoint'}), 403
         
-        provider = Provider.objects(user=user).first()
+        provider = load_provider(user)
         print(f"Provider profile found: {provider is not None}")
         
         if not provider:
@@ -627,34 +542,27 @@ def get_provider_service_requests():
         print(f"Provider skills: {provider.skills}")
         print(f"Provider location: {provider.user.latitude}, {provider.user.longitude}")
         
-        # Get open service requests (exclude quote_selected, in_progress, completed, cancelled)
-        service_requests = ServiceRequest.objects(status__in=['open', 'quotes_received'])
-        print(f"Total open service requests: {service_requests.count()}")
+        # Cursor pagination over (distance, _id)
+        limit = page_size(request.args.get('limit'))
+        after = None
+        if request.args.get('cursor'):
+            after = parse_key(decode_cursor(request.args.get('cursor')))
+            if after is None:
+                return jsonify({'error': 'Invalid cursor'}), 400
         
-        nearby_requests = []
+        # Open requests (exclude quote_selected, in_progress, completed, cancelled) within 50km,
+        # filtered and sorted by the 2dsphere index on request location
+        if user.latitude is not None and user.longitude is not None:
+            page, next_key = open_requests_near(user.latitude, user.longitude, limit, after)
+        else:
+            page, next_key = open_requests_unlocated(limit, after)
         
-        for req in service_requests:
-            print(f"Checking request: {req.title} at {req.location_address}")
-            
-            distance = 0
-            if provider.user.latitude and provider.user.longitude and req.location_lat and req.location_lon:
-                distance = calculate_distance_haversine(
-                    req.location_lat, req.location_lon,
-                    provider.user.latitude, provider.user.longitude
-                )
-                
-                print(f"Distance: {distance:.2f}km")
-                
-                # Only show requests within 50km (increased range)
-                if distance > 50:
-                    print(f"Request too far: {distance:.2f}km")
-                    continue
-            else:
-                print(f"Provider or request has no location set, showing all requests")
-            
-            # Check if provider already quoted
-            existing_quote = ProviderQuote.objects(service_request=req, provider=provider).first()
-            
+        # All of this provider's quotes for the page in one query
+        quote_statuses = quotes_by_request(provider, [req.id for req, _ in page])
+        
+        nearby_requests = []
+        for req, distance in page:
+            quote_status = quote_statuses.get(req.id)
             nearby_requests.append({
                 'id': str(req.id),
                 'title': req.title,
@@ -669,19 +577,16 @@ def get_provider_service_requests():
                 'preferred_time_slot': req.preferred_time_slot or '',
                 'created_at': to_iso(req.created_at),
                 'quote_deadline': to_iso(req.quote_deadline),
-                'has_quoted': existing_quote is not None,
-                'quote_status': existing_quote.status if existing_quote else None
+                'has_quoted': req.id in quote_statuses,
+                'quote_status': quote_status
             })
-            print(f"Added request to nearby list: {req.title}")
-        
-        # Sort by distance
-        nearby_requests.sort(key=lambda x: x['distance'])
         
         print(f"Returning {len(nearby_requests)} nearby requests")
         return jsonify({
             'success': True,
             'service_requests': nearby_requests,
-            'total': len(nearby_requests)
+            'total': len(nearby_requests),
+            'next_cursor': key_cursor(next_key)
         })
         
     except Exception as e:
@@ -704,7 +609,7 @@ def submit_quote(request_id):
         
         print(f"Submit quote - User ID: {user_id}, Request ID: {request_id}")
         
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found', 'details': 'Could not find user'}), 404
@@ -712,7 +617,7 @@ def submit_quote(request_id):
         if user.role != 'provider':
             return jsonify({'error': 'Access denied', 'details': 'Only providers can submit quotes'}), 403
         
-        provider = Provider.objects(user=user).first()
+        provider = load_provider(user)
         if not provider:
             return jsonify({'error': 'Provider profile not found', 'details': 'No provider profile found'}), 404
         
@@ -844,7 +749,7 @@ def cancel_service_request(request_id):
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -928,12 +833,12 @@ def cancel_provider_quote(request_id):
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user or user.role != 'provider':
             return jsonify({'error': 'Provider not found'}), 404
         
-        provider = Provider.objects(user=user).first()
+        provider = load_provider(user)
         if not provider:
             return jsonify({'error': 'Provider profile not found'}), 404
         
@@ -997,7 +902,7 @@ def get_user_service_requests_dashboard():
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -1033,7 +938,7 @@ def check_provider_auth():
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident.get('id', ident))
         
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({
@@ -1042,7 +947,7 @@ def check_provider_auth():
                 'user_id': user_id
             })
         
-        provider = Provider.objects(user=user).first()
+        provider = load_provider(user)
         
         return jsonify({
             'authenticated': True,
@@ -1080,7 +985,7 @@ def create_test_service_requests():
         # Get current user
         ident = get_jwt_identity()
         user_id = str(ident) if isinstance(ident, str) else str(ident['id'])
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -1171,8 +1076,8 @@ def create_test_service_requests():
                 service_request.save()
                 created_count += 1
                 
-                # Notify nearby providers
-                notify_nearby_providers(service_request)
+                # Notify nearby providers in the background
+                dispatch_new_request(service_request)
         
         return jsonify({
             'success': True,
@@ -1,129 +1,104 @@
 from flask import Blueprint, request, jsonify, url_for, render_template
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from models import Shop, Product, Cart, Order, User, DeliveryPartner, Payment
+from models import Shop, Product, Cart, Order, DeliveryPartner, Payment
 from bson import ObjectId
 from datetime import datetime
 import os
-import math
 from mongoengine.queryset.visitor import Q
+from services.geo import haversine_km, distances_from, single_linkage_clusters
+from services.product_search import product_search, index_product, fallback_search, ShopMatches
+from services.pagination import decode_cursor, page_size, parse_key, key_cursor, geo_near_page, geo_near_documents
+from services.reverse_geocoder import reverse_geocode
+from services.current_user import load_user
+from services.auth_tokens import require_role
 
 shop_bp = Blueprint('shop', __name__)
 
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two coordinates using Haversine formula"""
-    R = 6371  # Earth radius in km
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
+# Products listed per shop in a search results page
+PRODUCTS_PER_SHOP = 20
 
 
 def group_shops_by_proximity(shops_data, user_lat, user_lon, max_radius_km=1.0):
     """
-    Group shops by proximity. Shops within max_radius_km (default 1km) of each other are grouped together.
-    Returns list of shop clusters, each containing shops within the radius.
+    Group shops by proximity. Shops chained together by hops of at most max_radius_km
+    (default 1km) form one cluster, independent of the order the shops are given in.
+    Returns list of shop clusters with deterministic ids (cluster_<smallest shop id>).
     """
     if not shops_data or len(shops_data) == 0:
         return []
     
     clusters = []
-    processed_shops = set()
+    located = [s for s in shops_data if s.get('shop_lat') is not None and s.get('shop_lon') is not None]
+    labels, centroids = single_linkage_clusters(
+        [s['shop_lat'] for s in located], [s['shop_lon'] for s in located], max_radius_km
+    )
     
-    for shop_data in shops_data:
-        shop_id = shop_data['shop_id']
-        if shop_id in processed_shops:
-            continue
-        
-        shop_lat = shop_data.get('shop_lat')
-        shop_lon = shop_data.get('shop_lon')
-        
-        if shop_lat is None or shop_lon is None:
-            # Shop without coordinates - create separate cluster
-            clusters.append({
-                'shops': [shop_data],
-                'cluster_id': f"cluster_{shop_id}",
-                'is_within_radius': False,
-                'delivery_charge': 50.0  # Default delivery charge
-            })
-            processed_shops.add(shop_id)
-            continue
-        
-        # Start new cluster with this shop
+    members = {}
+    for shop_data, label in zip(located, labels):
+        members.setdefault(label, []).append(shop_data)
+    
+    for label, shops in members.items():
+        shops = sorted(shops, key=lambda s: str(s['shop_id']))
+        avg_lat, avg_lon = centroids[label]
         cluster = {
-            'shops': [shop_data],
-            'shop_ids': [shop_id],
-            'cluster_id': f"cluster_{shop_id}",
+            'shops': shops,
+            'shop_ids': [s['shop_id'] for s in shops],
+            'cluster_id': f"cluster_{shops[0]['shop_id']}",
             'is_within_radius': True,
-            'avg_lat': shop_lat,
-            'avg_lon': shop_lon
+            'avg_lat': avg_lat,
+            'avg_lon': avg_lon
         }
-        processed_shops.add(shop_id)
         
-        # Find other shops within radius
-        for other_shop in shops_data:
-            other_shop_id = other_shop['shop_id']
-            if other_shop_id in processed_shops:
-                continue
-            
-            other_shop_lat = other_shop.get('shop_lat')
-            other_shop_lon = other_shop.get('shop_lon')
-            
-            if other_shop_lat is None or other_shop_lon is None:
-                continue
-            
-            # Check if shop is within radius of any shop in this cluster
-            within_radius = False
-            for cluster_shop in cluster['shops']:
-                cluster_lat = cluster_shop.get('shop_lat')
-                cluster_lon = cluster_shop.get('shop_lon')
-                if cluster_lat and cluster_lon:
-                    distance = calculate_distance(
-                        cluster_lat, cluster_lon,
-                        other_shop_lat, other_shop_lon
-                    )
-                    if distance <= max_radius_km:
-                        within_radius = True
-                        break
-            
-            if within_radius:
-                cluster['shops'].append(other_shop)
-                cluster['shop_ids'].append(other_shop_id)
-                # Update average coordinates
-                cluster['avg_lat'] = sum(s.get('shop_lat', 0) for s in cluster['shops']) / len(cluster['shops'])
-                cluster['avg_lon'] = sum(s.get('shop_lon', 0) for s in cluster['shops']) / len(cluster['shops'])
-                processed_shops.add(other_shop_id)
-        
-        # Calculate delivery charge for this cluster
-        if user_lat and user_lon and cluster['shops']:
-            first_shop = cluster['shops'][0]
-            shop_lat = first_shop.get('shop_lat')
-            shop_lon = first_shop.get('shop_lon')
-            if shop_lat and shop_lon:
-                distance_to_user = calculate_distance(user_lat, user_lon, shop_lat, shop_lon)
-                # Base delivery charge: ₹30 for first km, ₹10 per additional km
-                if distance_to_user <= 1:
-                    cluster['delivery_charge'] = 30.0
-                else:
-                    cluster['delivery_charge'] = 30.0 + ((distance_to_user - 1) * 10)
-            else:
-                cluster['delivery_charge'] = 50.0  # Default
+        # Calculate delivery charge for this cluster from its first shop
+        if user_lat and user_lon and shops[0].get('shop_lat') and shops[0].get('shop_lon'):
+            cluster['delivery_charge'] = calculate_delivery_charge(
+                shops[0]['shop_lat'], shops[0]['shop_lon'], user_lat, user_lon
+            )
         else:
             cluster['delivery_charge'] = 50.0  # Default
-        
         clusters.append(cluster)
     
+    for shop_data in shops_data:
+        if shop_data.get('shop_lat') is None or shop_data.get('shop_lon') is None:
+            # Shop without coordinates - create separate cluster
+            clusters.append({
+                'shops': [shop_data],
+                'cluster_id': f"cluster_{shop_data['shop_id']}",
+                'is_within_radius': False,
+                'delivery_charge': 50.0  # Default delivery charge
+            })
+    
+    clusters.sort(key=lambda c: c['cluster_id'])
     return clusters
 
 
+def count_available_products(shop_ids):
+    """Return {shop_id: available product count} for the given shops in one $group aggregation."""
+    if not shop_ids:
+        return {}
+    pipeline = [
+        {'$match': {'shop': {'$in': list(shop_ids)}, 'is_available': True}},
+        {'$group': {'_id': '$shop', 'count': {'$sum': 1}}}
+    ]
+    return {row['_id']: row['count'] for row in Product._get_collection().aggregate(pipeline)}
+
+
+def verified_shops_query():
+    """Raw query for shops that are active, located and verified (new flag or legacy boolean)."""
+    return {
+        'is_active': True,
+        'location': {'$ne': None},
+        '$or': [{'verification_status': 'verified'}, {'is_verified': True}]
+    }
+
+
 def calculate_delivery_charge(shop_lat, shop_lon, user_lat, user_lon):
     """Calculate delivery charge based on distance from shop to user"""
     if not all([shop_lat, shop_lon, user_lat, user_lon]):
         return 50.0  # Default delivery charge
     
-    distance = calculate_distance(user_lat, user_lon, shop_lat, shop_lon)
+    distance = haversine_km(user_lat, user_lon, shop_lat, shop_lon)
     
     # Base delivery charge: ₹30 for first km, ₹10 per additional km
     if distance <= 1:
@@ -140,7 +115,7 @@ def register_shop():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -231,7 +206,7 @@ def get_my_shop():
             return jsonify({'message': 'Invalid user identity'}), 400
         
         try:
-            user = User.objects(id=ObjectId(user_id)).first()
+            user = load_user(user_id)
         except Exception as e:
             print(f"Error querying user: {e}")
             return jsonify({'message': 'Invalid user ID format'}), 400
@@ -276,7 +251,7 @@ def update_shop():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -367,7 +342,7 @@ def add_product():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -414,6 +389,7 @@ def add_product():
                 product.image_path = os.path.join('images', 'products', filename).replace('\\', '/')
         
         product.save()
+        index_product(product)
         return jsonify({
             'message': 'Product added successfully',
             'product_id': str(product.id)
@@ -430,7 +406,7 @@ def get_shop_products():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -463,7 +439,7 @@ def update_product(product_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -491,6 +467,7 @@ def update_product(product_id):
         
         product.updated_at = datetime.utcnow()
         product.save()
+        index_product(product)
         return jsonify({'message': 'Product updated successfully'})
     except Exception as e:
         print(f"Error updating product: {e}")
@@ -504,7 +481,7 @@ def delete_product(product_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -517,6 +494,7 @@ def delete_product(product_id):
             return jsonify({'message': 'Product not found'}), 404
         
         product.delete()
+        product_search.remove(product.id)
         return jsonify({'message': 'Product deleted successfully'})
     except Exception as e:
         print(f"Error deleting product: {e}")
@@ -532,78 +510,58 @@ def browse_shops_by_category():
         user_lat = request.args.get('lat', type=float)
         user_lon = request.args.get('lon', type=float)
         
+        # Cursor pagination: (distance, id) with a location, (rating, id) without
+        limit = page_size(request.args.get('limit'))
+        after = None
+        if request.args.get('cursor'):
+            after = parse_key(decode_cursor(request.args.get('cursor')))
+            if after is None:
+                return jsonify({'message': 'Invalid cursor'}), 400
+        
         # Find shops by category - include shops verified via new or legacy flag
-        shops_query = Shop.objects(is_active=True).filter(
-            Q(verification_status='verified') | Q(is_verified=True)
-        )
+        shops_query = verified_shops_query()
         if shop_category:
-            # For MongoEngine ListField, to check if a value exists in the list, use category=value
-            # This will match any shop where shop_category is in the category list
-            shops_query = shops_query.filter(category=shop_category)
-        
-        shops = shops_query.limit(50)  # Limit to 50 shops
-        
-        shops_list = []
-        for shop in shops:
-            # Get products count for this shop
-            products_count = Product.objects(shop=shop, is_available=True).count()
-            
-            # Validate shop coordinates
-            shop_lat = shop.location_lat
-            shop_lon = shop.location_lon
-            
-            # Check if coordinates are valid
-            if shop_lat is None or shop_lon is None:
-                print(f"WARNING: Shop '{shop.name}' (ID: {shop.id}) has missing coordinates (lat: {shop_lat}, lon: {shop_lon})")
-                continue  # Skip shops without valid coordinates
-            
-            # Validate coordinate ranges (India roughly: lat 6-37, lon 68-97)
-            if not (-90 <= shop_lat <= 90) or not (-180 <= shop_lon <= 180):
-                print(f"WARNING: Shop '{shop.name}' (ID: {shop.id}) has invalid coordinates (lat: {shop_lat}, lon: {shop_lon})")
-                continue  # Skip shops with invalid coordinates
-            
-            shop_data = {
-                'id': str(shop.id),
-                'name': shop.name,
-                'description': shop.description,
-                'category': shop.category,
-                'address': shop.address,
-                'location_lat': shop_lat,
-                'location_lon': shop_lon,
-                'image_url': url_for('static', filename=shop.image_path, _external=True) if shop.image_path else None,
-                'rating': shop.rating,
-                'is_verified': shop.is_verified,
-                'total_orders': shop.total_orders,
-                'products_count': products_count
-            }
-            
-            # Calculate distance if user location provided and shop coordinates are valid
-            if user_lat and user_lon and shop_lat is not None and shop_lon is not None:
-                try:
-                    distance = calculate_distance(
-                        float(user_lat), float(user_lon),
-                        float(shop_lat), float(shop_lon)
-                    )
-                    shop_data['distance'] = round(distance, 2)
-                    print(f"Shop '{shop.name}': coords ({shop_lat}, {shop_lon}), distance: {shop_data['distance']} km from user ({user_lat}, {user_lon})")
-                except (ValueError, TypeError) as e:
-                    print(f"Error calculating distance for shop '{shop.name}': {e}")
-                    shop_data['distance'] = None
-            else:
-                shop_data['distance'] = None
-            
-            shops_list.append(shop_data)
+            # category is a list field, so this matches any shop whose list contains shop_category
+            shops_query['category'] = shop_category
         
-        # Sort by distance if location provided
         if user_lat and user_lon:
-            shops_list.sort(key=lambda x: x.get('distance', float('inf')))
+            # Nearest first, straight from the 2dsphere index
+            docs, next_key = geo_near_page(Shop._get_collection(), user_lat, user_lon, limit,
+                                           query=shops_query, after=after)
+            shops = [(shop, round(distance, 2)) for shop, distance in geo_near_documents(Shop, docs)]
         else:
-            shops_list.sort(key=lambda x: x.get('rating', 0), reverse=True)
+            # Highest rated first
+            query = Shop.objects(__raw__=shops_query)
+            if after:
+                query = query.filter(Q(rating__lt=after[0]) | Q(rating=after[0], id__gt=after[1][-1]))
+            page = list(query.order_by('-rating', 'id').limit(limit + 1))
+            next_key = (page[limit - 1].rating, [page[limit - 1].id]) if len(page) > limit else None
+            shops = [(shop, None) for shop in page[:limit]]
+        
+        # Available product counts for all shops in one $group aggregation
+        products_counts = count_available_products([shop.id for shop, _ in shops])
+        
+        shops_list = [{
+            'id': str(shop.id),
+            'name': shop.name,
+            'description': shop.description,
+            'category': shop.category,
+            'address': shop.address,
+            'location_lat': shop.location_lat,
+            'location_lon': shop.location_lon,
+            'image_url': url_for('static', filename=shop.image_path, _external=True) if shop.image_path else None,
+            'rating': shop.rating,
+            'is_verified': shop.is_verified,
+            'total_orders': shop.total_orders,
+            'products_count': products_counts.get(shop.id, 0),
+            'distance': distance
+        } for shop, distance in shops]
         
         return jsonify({
             'shops': shops_list,
             'total_shops': len(shops_list),
-            'category': shop_category
+            'category': shop_category,
+            'next_cursor': key_cursor(next_key)
         })
     except Exception as e:
         print(f"Error browsing shops: {e}")
@@ -623,134 +581,82 @@ def search_products():
         if not query:
             return jsonify({'message': 'Search query required'}), 400
         
-        # Build a flexible search over name and description (multi-word AND matching)
-        words = [w for w in query.split() if len(w) > 1]
-
-        base_q = Q(is_available=True)
-        text_q = Q(name__icontains=query) | Q(description__icontains=query)
-        if words:
-            # Require all words to appear in either name or description
-            for w in words:
-                text_q = text_q | (Q(name__icontains=w) | Q(description__icontains=w))
-
-        products = Product.objects(base_q & text_q)
+        # Cursor pagination over shops: (distance, id) with a location, (best score, id) without
+        limit = page_size(request.args.get('limit'), default=20, maximum=100)
+        after = None
+        if request.args.get('cursor'):
+            after = parse_key(decode_cursor(request.args.get('cursor')))
+            if after is None:
+                return jsonify({'message': 'Invalid cursor'}), 400
+        
+        # Rank matching products with BM25 over the in-process inverted index, grouped
+        # by shop with each shop's best score (products are only listed for the page),
+        # or with the plain regex query until its first build has finished
+        if product_search.ensure_fresh():
+            matches = product_search.search_shops(query, category=category or None, per_shop=PRODUCTS_PER_SHOP)
+        else:
+            matches = ShopMatches.from_ranked(fallback_search(query, category=category or None), PRODUCTS_PER_SHOP)
+        best_scores = matches.best
         
-        if category:
-            products = products.filter(category=category)
+        # Only shops that are active and verified (new flag or legacy boolean)
+        shops_query = verified_shops_query()
+        shops_query['_id'] = {'$in': list(best_scores)}
+        if user_lat and user_lon:
+            docs, next_key = geo_near_page(Shop._get_collection(), user_lat, user_lon, limit,
+                                           query=shops_query, after=after)
+            shops = [(shop, round(distance, 2)) for shop, distance in geo_near_documents(Shop, docs)]
+        else:
+            eligible = [doc['_id'] for doc in Shop._get_collection().find(shops_query, {'_id': 1})]
+            order = sorted(((-best_scores[shop_id], str(shop_id)), shop_id) for shop_id in eligible)
+            if after:
+                order = [item for item in order if item[0] > (-after[0], str(after[1][-1]))]
+            next_key = None
+            if len(order) > limit:
+                last_id = order[limit - 1][1]
+                next_key = (best_scores[last_id], [last_id])
+            page_ids = [shop_id for _, shop_id in order[:limit]]
+            page_shops = {shop.id: shop for shop in Shop.objects(id__in=page_ids)}
+            shops = [(page_shops[shop_id], None) for shop_id in page_ids if shop_id in page_shops]
+        
+        # Fetch the page's products with one batched query
+        page_products = {shop.id: matches.products(shop.id) for shop, _ in shops}
+        product_ids = [product_id for entries in page_products.values() for product_id, _ in entries]
+        products = {p['_id']: p for p in Product.objects(id__in=product_ids, is_available=True).as_pymongo()}
         
-        # Group products by shop - only verified shops
-        shops_dict = {}
-        products_count = 0
-        skipped_products = 0
-        for product in products:
-            products_count += 1
-            try:
-                shop = product.shop
-                if not shop:
-                    skipped_products += 1
-                    print(f"Product '{product.name}' (ID: {product.id}) has no shop reference - skipped")
-                    continue
-            except Exception as e:
-                skipped_products += 1
-                print(f"Error accessing shop for product '{product.name}': {e}")
-                continue
-            
-            # Only include products from shops that are active and verified (new flag or legacy boolean)
-            is_shop_verified = (shop.verification_status == 'verified') or bool(shop.is_verified)
-            if not shop.is_active or not is_shop_verified:
-                skipped_products += 1
-                print(f"Product '{product.name}' from shop '{shop.name}' skipped - verification_status: {shop.verification_status}, active: {shop.is_active}")
-                continue
-                
-            # Log shop coordinates for debugging
-            print(f"DEBUG: Shop '{shop.name}' (ID: {shop.id}) - Address: '{shop.address}', Coordinates: ({shop.location_lat}, {shop.location_lon})")
-            
-            shop_id = str(shop.id)
-            if shop_id not in shops_dict:
-                shops_dict[shop_id] = {
-                    'shop': {
-                        'id': str(shop.id),
-                        'name': shop.name,
-                        'category': shop.category,  # include shop category for client-side filtering
-                        'address': shop.address,
-                        'location_lat': shop.location_lat,
-                        'location_lon': shop.location_lon,
-                        'image_url': url_for('static', filename=shop.image_path, _external=True) if shop.image_path else None,
-                        'rating': shop.rating,
-                        'is_verified': shop.is_verified
-                    },
-                    'products': []
-                }
-            
-            shops_dict[shop_id]['products'].append({
-                'id': str(product.id),
-                'name': product.name,
-                'description': product.description,
-                'category': product.category,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'image_url': url_for('static', filename=product.image_path, _external=True) if product.image_path else None
+        shops_list = []
+        for shop, distance in shops:
+            shops_list.append({
+                'shop': {
+                    'id': str(shop.id),
+                    'name': shop.name,
+                    'category': shop.category,  # include shop category for client-side filtering
+                    'address': shop.address,
+                    'location_lat': shop.location_lat,
+                    'location_lon': shop.location_lon,
+                    'image_url': url_for('static', filename=shop.image_path, _external=True) if shop.image_path else None,
+                    'rating': shop.rating,
+                    'is_verified': shop.is_verified
+                },
+                'products': [{
+                    'id': str(product_id),
+                    'name': products[product_id].get('name'),
+                    'description': products[product_id].get('description'),
+                    'category': products[product_id].get('category'),
+                    'price': products[product_id].get('price'),
+                    'stock_quantity': products[product_id].get('stock_quantity', 0),
+                    'image_url': url_for('static', filename=products[product_id]['image_path'], _external=True)
+                    if products[product_id].get('image_path') else None,
+                    'score': round(score, 4)
+                } for product_id, score in page_products[shop.id] if product_id in products],
+                'distance': distance
             })
         
-        print(f"Search query '{query}': Found {products_count} products, {skipped_products} skipped, {len(shops_dict)} shops")
-        
-        # Calculate distances if user location provided
-        shops_list = list(shops_dict.values())
-        if user_lat and user_lon:
-            print(f"Calculating distances from user location: ({user_lat}, {user_lon})")
-            valid_shops = []
-            for shop_data in shops_list:
-                shop = shop_data['shop']
-                shop_lat = shop.get('location_lat')
-                shop_lon = shop.get('location_lon')
-                
-                # Validate shop coordinates
-                if shop_lat is None or shop_lon is None:
-                    print(f"WARNING: Shop '{shop.get('name', 'Unknown')}' has missing coordinates (lat: {shop_lat}, lon: {shop_lon}) - skipping")
-                    shop_data['distance'] = None
-                    valid_shops.append(shop_data)
-                    continue
-                
-                # Validate coordinate ranges (India roughly: lat 6-37, lon 68-97)
-                try:
-                    shop_lat = float(shop_lat)
-                    shop_lon = float(shop_lon)
-                    
-                    if not (-90 <= shop_lat <= 90) or not (-180 <= shop_lon <= 180):
-                        print(f"WARNING: Shop '{shop.get('name', 'Unknown')}' has invalid coordinates (lat: {shop_lat}, lon: {shop_lon}) - skipping distance calculation")
-                        shop_data['distance'] = None
-                        valid_shops.append(shop_data)
-                        continue
-                    
-                    # Calculate distance
-                    distance = calculate_distance(
-                        float(user_lat), float(user_lon),
-                        shop_lat, shop_lon
-                    )
-                    shop_data['distance'] = round(distance, 2)
-                    print(f"Shop '{shop.get('name', 'Unknown')}': coordinates ({shop_lat}, {shop_lon}), distance: {shop_data['distance']} km from user ({user_lat}, {user_lon})")
-                    
-                    # Update shop dict with validated coordinates
-                    shop['location_lat'] = shop_lat
-                    shop['location_lon'] = shop_lon
-                    
-                except (ValueError, TypeError) as e:
-                    print(f"Error processing coordinates for shop '{shop.get('name', 'Unknown')}': {e}")
-                    shop_data['distance'] = None
-                
-                valid_shops.append(shop_data)
-            
-            shops_list = valid_shops
-            
-            # Sort by distance (shops with None distance go to the end)
-            shops_list.sort(key=lambda x: (x.get('distance') is None, x.get('distance', float('inf'))))
-        else:
-            for shop_data in shops_list:
-                shop_data['distance'] = None
+        print(f"Search query '{query}': Ranked {matches.count} products across {len(best_scores)} shops, returning {len(shops_list)}")
         
         return jsonify({
             'shops': shops_list,
-            'total_shops': len(shops_list)
+            'total_shops': len(shops_list),
+            'next_cursor': key_cursor(next_key)
         })
     except Exception as e:
         print(f"Error searching products: {e}")
@@ -765,7 +671,7 @@ def add_to_cart():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -822,17 +728,18 @@ def add_to_cart():
             proximity_warning = None
             if existing_shops and new_shop.location_lat and new_shop.location_lon:
                 # Check if new shop is within 1km of any existing shop in cart
+                existing_coords = [
+                    (existing_shop.location_lat, existing_shop.location_lon)
+                    for existing_shop in Shop.objects(id__in=[ObjectId(i) for i in existing_shops]).only('location_lat', 'location_lon')
+                    if existing_shop.location_lat and existing_shop.location_lon
+                ]
                 within_radius = False
-                for existing_shop_id in existing_shops:
-                    existing_shop = Shop.objects(id=ObjectId(existing_shop_id)).first()
-                    if existing_shop and existing_shop.location_lat and existing_shop.location_lon:
-                        distance = calculate_distance(
-                            existing_shop.location_lat, existing_shop.location_lon,
-                            new_shop.location_lat, new_shop.location_lon
-                        )
-                        if distance <= 1.0:
-                            within_radius = True
-                            break
+                if existing_coords:
+                    distances = distances_from(
+                        new_shop.location_lat, new_shop.location_lon,
+                        [c[0] for c in existing_coords], [c[1] for c in existing_coords]
+                    )
+                    within_radius = bool((distances <= 1.0).any())
                 
                 if not within_radius:
                     proximity_warning = {
@@ -883,7 +790,7 @@ def get_cart():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -974,7 +881,7 @@ def remove_from_cart(product_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1003,7 +910,7 @@ def update_cart_item(product_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1047,7 +954,7 @@ def create_order():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1068,6 +975,9 @@ def create_order():
             if shop_id:
                 shop_ids = [shop_id]
         
+        if not delivery_address and delivery_lat is not None and delivery_lon is not None:
+            delivery_address = reverse_geocode(delivery_lat, delivery_lon)
+        
         if not all([shop_ids, delivery_address, delivery_lat, delivery_lon, contact_phone]):
             return jsonify({'message': 'Missing required fields'}), 400
         
@@ -1206,6 +1116,7 @@ def create_order():
                     if product.stock_quantity <= 0:
                         product.is_available = False
                     product.save()
+                    index_product(product)
             
             created_orders.append({
                 'order_id': str(order.id),
@@ -1242,7 +1153,7 @@ def get_order_summary(order_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1321,7 +1232,7 @@ def get_orders():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1368,7 +1279,7 @@ def get_order_detail(order_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1414,7 +1325,7 @@ def get_shop_orders():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1448,7 +1359,7 @@ def update_order_status(order_id):
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         if not user:
             return jsonify({'message': 'User not found'}), 404
         
@@ -1483,16 +1394,10 @@ def update_order_status(order_id):
 
 # Delivery Partner Assignment
 @shop_bp.post('/api/orders/<order_id>/assign-delivery')
-@jwt_required()
+@require_role('admin')
 def assign_delivery_partner(order_id):
     """Assign delivery partner to order"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
-        if not user or user.role != 'admin':
-            return jsonify({'message': 'Admin only'}), 403
-        
         order = Order.objects(id=ObjectId(order_id)).first()
         if not order:
             return jsonify({'message': 'Order not found'}), 404
@@ -1507,17 +1412,14 @@ def assign_delivery_partner(order_id):
         
         # Find nearest partner
         nearest_partner = None
-        min_distance = float('inf')
-        
-        for partner in delivery_partners:
-            if partner.current_location_lat and partner.current_location_lon:
-                distance = calculate_distance(
-                    partner.current_location_lat, partner.current_location_lon,
-                    order.delivery_lat, order.delivery_lon
-                )
-                if distance < min_distance:
-                    min_distance = distance
-                    nearest_partner = partner
+        located_partners = [p for p in delivery_partners if p.current_location_lat and p.current_location_lon]
+        if located_partners:
+            distances = distances_from(
+                order.delivery_lat, order.delivery_lon,
+                [p.current_location_lat for p in located_partners],
+                [p.current_location_lon for p in located_partners]
+            )
+            nearest_partner = located_partners[int(distances.argmin())]
         
         if not nearest_partner:
             return jsonify({'message': 'No delivery partner found'}), 404
@@ -1,9 +1,12 @@
 from flask import Blueprint, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-from models import User, Provider, Shop
+from models import Provider, Shop
 from bson import ObjectId
 from datetime import datetime
+from services.reverse_geocoder import reverse_geocode
+from services.current_user import load_user, load_provider, current_user
+from services.auth_tokens import require_role
 import os
 import uuid
 
@@ -36,12 +39,7 @@ def save_verification_file(file, prefix):
 def _get_user_from_identity(expected_role=None):
     ident = get_jwt_identity()
     user_id = str(ident.get('id', ident)) if isinstance(ident, dict) else str(ident)
-    user = None
-
-    try:
-        user = User.objects(id=ObjectId(user_id)).first()
-    except Exception:
-        user = User.objects(id=user_id).first()
+    user = load_user(user_id)
 
     if not user:
         return None, user_id, jsonify({'message': 'User not found'}), 404
@@ -53,7 +51,7 @@ def _get_user_from_identity(expected_role=None):
 
 
 def _ensure_provider_profile(user):
-    provider = Provider.objects(user=user).first()
+    provider = load_provider(user)
     if not provider:
         provider = Provider(user=user)
         provider.verification_status = 'not_started'
@@ -179,7 +177,8 @@ def submit_provider_verification():
         if request.form.get('gps_lat') and request.form.get('gps_lon'):
             provider.verification_gps_lat = float(request.form.get('gps_lat'))
             provider.verification_gps_lon = float(request.form.get('gps_lon'))
-            provider.verification_address = request.form.get('verification_address', '')
+            provider.verification_address = request.form.get('verification_address') or \
+                reverse_geocode(provider.verification_gps_lat, provider.verification_gps_lon) or ''
             uploaded_field = 'location'
             uploaded_url = None
         
@@ -224,7 +223,7 @@ def get_shopkeeper_verification_status():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user or user.role != 'shopkeeper':
             return jsonify({'message': 'Not a shopkeeper'}), 403
@@ -267,7 +266,7 @@ def submit_shopkeeper_verification():
     try:
         ident = get_jwt_identity()
         user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
+        user = load_user(user_id)
         
         if not user or user.role != 'shopkeeper':
             return jsonify({'message': 'Not a shopkeeper'}), 403
@@ -312,7 +311,8 @@ def submit_shopkeeper_verification():
         if request.form.get('gps_lat') and request.form.get('gps_lon'):
             shop.verification_gps_lat = float(request.form.get('gps_lat'))
             shop.verification_gps_lon = float(request.form.get('gps_lon'))
-            shop.verification_address = request.form.get('verification_address', '')
+            shop.verification_address = request.form.get('verification_address') or \
+                reverse_geocode(shop.verification_gps_lat, shop.verification_gps_lon) or ''
         
         # Submit verification
         if request.form.get('action') == 'submit':
@@ -352,17 +352,10 @@ def submit_shopkeeper_verification():
 
 # Admin Verification Routes
 @verification_bp.get('/api/admin/verifications/providers')
-@jwt_required()
+@require_role('admin')
 def get_provider_verifications():
     """Get all provider verification requests for admin"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         providers = Provider.objects().order_by('-verification_submitted_at')
         verifications = []
         
@@ -401,16 +394,11 @@ def get_provider_verifications():
 
 
 @verification_bp.post('/api/admin/verifications/providers/<provider_id>/approve')
-@jwt_required()
+@require_role('admin')
 def approve_provider_verification(provider_id):
     """Approve provider verification"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        admin_user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not admin_user or admin_user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
+        admin_user = current_user()
         
         provider = Provider.objects(id=ObjectId(provider_id)).first()
         if not provider:
@@ -429,17 +417,10 @@ def approve_provider_verification(provider_id):
 
 
 @verification_bp.post('/api/admin/verifications/providers/<provider_id>/reject')
-@jwt_required()
+@require_role('admin')
 def reject_provider_verification(provider_id):
     """Reject provider verification"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        admin_user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not admin_user or admin_user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         provider = Provider.objects(id=ObjectId(provider_id)).first()
         if not provider:
             return jsonify({'message': 'Provider not found'}), 404
@@ -460,17 +441,10 @@ def reject_provider_verification(provider_id):
 
 
 @verification_bp.get('/api/admin/verifications/shopkeepers')
-@jwt_required()
+@require_role('admin')
 def get_shopkeeper_verifications():
     """Get all shopkeeper verification requests for admin"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not user or user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         shops = Shop.objects().order_by('-verification_submitted_at')
         verifications = []
         
@@ -508,16 +482,11 @@ def get_shopkeeper_verifications():
 
 
 @verification_bp.post('/api/admin/verifications/shopkeepers/<shop_id>/approve')
-@jwt_required()
+@require_role('admin')
 def approve_shopkeeper_verification(shop_id):
     """Approve shopkeeper verification"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        admin_user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not admin_user or admin_user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
+        admin_user = current_user()
         
         shop = Shop.objects(id=ObjectId(shop_id)).first()
         if not shop:
@@ -537,17 +506,10 @@ def approve_shopkeeper_verification(shop_id):
 
 
 @verification_bp.post('/api/admin/verifications/shopkeepers/<shop_id>/reject')
-@jwt_required()
+@require_role('admin')
 def reject_shopkeeper_verification(shop_id):
     """Reject shopkeeper verification"""
     try:
-        ident = get_jwt_identity()
-        user_id = str(ident['id']) if isinstance(ident, dict) else str(ident)
-        admin_user = User.objects(id=ObjectId(user_id)).first()
-        
-        if not admin_user or admin_user.role != 'admin':
-            return jsonify({'message': 'Unauthorized'}), 403
-        
         shop = Shop.objects(id=ObjectId(shop_id)).first()
         if not shop:
             return jsonify({'message': 'Shop not found'}), 404
@@ -0,0 +1,107 @@
+"""Access tokens with role claims, claim-based role checks and token versioning."""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from bson import ObjectId
+from flask import jsonify
+from flask_jwt_extended import create_access_token, get_jwt, jwt_required
+from mongoengine import signals
+
+from models import User
+from services.current_user import current_user
+
+TOKEN_VERSION_TTL = 60
+TOKEN_VERSION_CACHE_SIZE = 20000
+
+
+def issue_access_token(user):
+    """Access token whose claims are enough to authorize role-gated routes without a user lookup."""
+    return create_access_token(identity=str(user.id), additional_claims={
+        'role': user.role,
+        'name': user.name,
+        'email': user.email,
+        'ver': user.token_version or 0
+    })
+
+
+class TokenVersionCache:
+    """Current ``token_version`` of users, cached for ``ttl`` seconds in a bounded LRU.
+
+    Saving a user through mongoengine drops its entry, so a role change made in
+    this process revokes old tokens immediately; other workers follow within ``ttl``.
+    """
+
+    def __init__(self, ttl=TOKEN_VERSION_TTL, max_size=TOKEN_VERSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._versions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Version for a user id, or None if the user does not exist."""
+        now = time.time()
+        with self._lock:
+            cached = self._versions.get(user_id)
+            if cached and cached[0] > now:
+                self._versions.move_to_end(user_id)
+                return cached[1]
+        if not ObjectId.is_valid(user_id):
+            return None
+        doc = User.objects(id=ObjectId(user_id)).only('token_version').as_pymongo().first()
+        version = (doc.get('token_version') or 0) if doc else None
+        with self._lock:
+            self._versions[user_id] = (now + self.ttl, version)
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_size:
+                self._versions.popitem(last=False)
+        return version
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+token_versions = TokenVersionCache()
+
+
+def token_revoked(jwt_header, jwt_payload):
+    """Blocklist check: a token is revoked once its user is deleted or its version is bumped.
+
+    Tokens issued before versioning carry no ``ver`` claim and count as version 0.
+    """
+    user_id = jwt_payload.get('sub')
+    if isinstance(user_id, dict):
+        user_id = user_id.get('id')
+    version = token_versions.get(str(user_id))
+    return version is None or jwt_payload.get('ver', 0) != version
+
+
+def require_role(*roles):
+    """Require a valid JWT whose ``role`` claim is one of ``roles``.
+
+    Authorizes from the verified claims; only tokens without a role claim (issued
+    by older login paths) fall back to loading the user.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            role = get_jwt().get('role')
+            if role is None:
+                user = current_user()
+                role = user.role if user else None
+            if role not in roles:
+                return jsonify({'error': 'Unauthorized'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _forget_version(sender, document, **kwargs):
+    token_versions.invalidate(str(document.id))
+
+
+signals.post_save.connect(_forget_version, sender=User)
+signals.post_delete.connect(_forget_version, sender=User)
@@ -0,0 +1,146 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+
+from mongoengine.queryset.visitor import Q
+from pymongo import UpdateOne
+
+from models import Booking, Service
+
+EPOCH = datetime(1970, 1, 1)
+# A save stamped just before a sync may commit just after it; overlapping the next
+# window by a few seconds (and tolerating clock skew between workers) avoids missing it
+SYNC_OVERLAP_MS = 5000
+
+# Fields read by the booking serializer; list views load nothing else
+LIST_FIELDS = (
+    'id', 'user', 'provider', 'service', 'payment', 'status', 'scheduled_time', 'price',
+    'location_lat', 'location_lon', 'notes', 'rating', 'review', 'completion_notes',
+    'completion_images', 'completed_at', 'created_at', 'updated_at', 'service_name',
+    'provider_id', 'provider_name', 'has_payment', 'payment_status', 'booking_type'
+)
+
+
+def to_ms(value):
+    return int((value - EPOCH) / timedelta(milliseconds=1))
+
+
+def from_ms(ms):
+    return EPOCH + timedelta(milliseconds=int(ms))
+
+
+def sync_token():
+    """Token to pass as ``since`` for changes made after this call."""
+    return to_ms(datetime.utcnow()) - SYNC_OVERLAP_MS
+
+
+def history_key(booking):
+    """Sort key of a booking in history order: (created_at in epoch milliseconds, _id)."""
+    return to_ms(booking.created_at or EPOCH), booking.id
+
+
+def history_page(queryset, limit, after=None):
+    """One page of bookings, newest first, ordered by (created_at, _id) descending.
+
+    ``after`` is the (epoch ms, [id]) key returned with the previous page; BSON dates
+    have millisecond precision, so the key compares exactly. Returns the bookings
+    and the key of the next page, or None after the last one.
+    """
+    return merged_history_page([queryset], limit, after)
+
+
+def merged_history_page(querysets, limit, after=None):
+    """history_page over several disjoint querysets.
+
+    Each one is read in key order with its own indexed query (at most ``limit + 1``
+    rows) and the sorted streams are merged, so one cursor pages through all of them.
+    A ``limit`` of None returns the whole history in one response.
+    """
+    streams = []
+    for queryset in querysets:
+        queryset = queryset.only(*LIST_FIELDS)
+        if after:
+            created_at, last_id = from_ms(after[0]), after[1][-1]
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id))
+        queryset = queryset.order_by('-created_at', '-id')
+        if limit is not None:
+            queryset = queryset.limit(limit + 1)
+        streams.append(list(queryset))
+    merged = heapq.merge(*streams, key=history_key, reverse=True)
+    if limit is None:
+        return list(merged), None
+    bookings = list(islice(merged, limit + 1))
+    if len(bookings) <= limit:
+        return bookings, None
+    bookings = bookings[:limit]
+    last_ms, last_id = history_key(bookings[-1])
+    return bookings, (last_ms, [last_id])
+
+
+def changed_since(queryset, since_ms, limit):
+    """Bookings saved at or after ``since_ms``, oldest change first.
+
+    Returns the bookings and the sync token (epoch ms) to pass as the next
+    ``since``. The bound is inclusive, so a booking saved in the same millisecond
+    as the token is sent again rather than missed; clients upsert by id. A ``limit``
+    of None returns every change at once.
+    """
+    synced_at = max(sync_token(), int(since_ms))
+    queryset = queryset.only(*LIST_FIELDS).filter(updated_at__gte=from_ms(since_ms)).order_by('updated_at', 'id')
+    if limit is None:
+        return list(queryset), synced_at
+    bookings = list(queryset.limit(limit + 1))
+    if len(bookings) <= limit:
+        return bookings, synced_at
+    bookings = bookings[:limit]
+    return bookings, to_ms(bookings[-1].updated_at)
+
+
+def open_bookings_query(skills):
+    """Unassigned, pending bookings for any of ``skills``.
+
+    Served by the (provider, status, service_name, created_at, _id) index: one range
+    per skill, merged by the server in history order without a sort stage.
+    """
+    return Booking.objects(provider=None, status='Pending', service_name__in=list(skills))
+
+
+def skill_bookings_query(skills):
+    """Every booking for any of ``skills``, for delta sync of the open stream.
+
+    Unlike open_bookings_query it keeps bookings that were since assigned or
+    cancelled, so a provider's dashboard learns that they are no longer open.
+    """
+    return Booking.objects(service_name__in=list(skills))
+
+
+def split_open_changes(bookings, provider_id):
+    """Split skill_bookings_query changes into (still open bookings, ids no longer open).
+
+    Bookings now assigned to ``provider_id`` are in neither list; they are
+    reported by the provider's own stream.
+    """
+    still_open, closed_ids = [], []
+    for booking in bookings:
+        assigned_to = getattr(booking._data.get('provider'), 'id', booking._data.get('provider'))
+        if assigned_to is None and booking.status == 'Pending':
+            still_open.append(booking)
+        elif assigned_to != provider_id:
+            closed_ids.append(str(booking.id))
+    return still_open, closed_ids
+
+
+def backfill_booking_service_names():
+    """Copy the service name onto bookings saved without one, so skill matching can stay in the query."""
+    collection = Booking._get_collection()
+    missing = list(collection.find({'$or': [{'service_name': {'$exists': False}}, {'service_name': None}],
+                                    'service': {'$ne': None}}, {'service': 1}))
+    if not missing:
+        return 0
+    names = {doc['_id']: doc.get('name') for doc in
+             Service._get_collection().find({'_id': {'$in': list({doc['service'] for doc in missing})}}, {'name': 1})}
+    operations = [UpdateOne({'_id': doc['_id']}, {'$set': {'service_name': names[doc['service']]}})
+                  for doc in missing if names.get(doc['service'])]
+    if not operations:
+        return 0
+    return collection.bulk_write(operations, ordered=False).modified_count
@@ -0,0 +1,77 @@
+"""Booking serialization with batched reference lookups."""
+from models import Provider, User, Service, Payment
+
+
+def _ref_id(value):
+    """Id of a reference as stored on a document (DBRef, ObjectId or an already loaded Document)."""
+    return getattr(value, 'id', value)
+
+
+def _names_by_id(model, ids, field='name'):
+    if not ids:
+        return {}
+    docs = model.objects(id__in=list(ids)).only(field).as_pymongo()
+    return {doc['_id']: doc.get(field) for doc in docs}
+
+
+def serialize_bookings(bookings):
+    """Serialize a page of bookings with at most one query per referenced collection.
+
+    References are read from the raw ``_data`` so nothing is lazily dereferenced;
+    provider, service and payment documents are only fetched for bookings whose
+    denormalized ``provider_name``, ``service_name`` or ``payment_status`` is empty.
+    """
+    bookings = list(bookings)
+    provider_ids, service_ids, payment_ids = set(), set(), set()
+    for b in bookings:
+        data = b._data
+        if not b.provider_name and data.get('provider'):
+            provider_ids.add(_ref_id(data['provider']))
+        if not b.service_name and data.get('service'):
+            service_ids.add(_ref_id(data['service']))
+        if not b.payment_status and data.get('payment'):
+            payment_ids.add(_ref_id(data['payment']))
+
+    provider_users = {}
+    if provider_ids:
+        for doc in Provider.objects(id__in=list(provider_ids)).only('user').as_pymongo():
+            provider_users[doc['_id']] = doc.get('user')
+    user_names = _names_by_id(User, {uid for uid in provider_users.values() if uid})
+    service_names = _names_by_id(Service, service_ids)
+    payment_statuses = _names_by_id(Payment, payment_ids, 'status')
+
+    result = []
+    for b in bookings:
+        data = b._data
+        user_id = _ref_id(data.get('user'))
+        provider_id = _ref_id(data.get('provider'))
+        service_id = _ref_id(data.get('service'))
+        payment_id = _ref_id(data.get('payment'))
+        result.append({
+            'id': str(b.id),
+            'user_id': str(user_id) if user_id else None,
+            'provider_id': str(provider_id) if provider_id else b.provider_id,
+            'provider_name': b.provider_name or user_names.get(provider_users.get(provider_id)),
+            'service_id': str(service_id) if service_id else None,
+            'service_name': b.service_name or service_names.get(service_id) or 'Unknown Service',
+            'status': b.status,
+            'scheduled_time': b.scheduled_time.isoformat() if b.scheduled_time else None,
+            'price': b.price,
+            'location_lat': b.location_lat,
+            'location_lon': b.location_lon,
+            'notes': b.notes,
+            'rating': b.rating,
+            'review': b.review,
+            'completion_notes': b.completion_notes,
+            'completion_images': b.completion_images or [],
+            'completed_at': b.completed_at.isoformat() if b.completed_at else None,
+            'created_at': b.created_at.isoformat() if b.created_at else None,
+            'has_payment': b.has_payment or payment_id is not None,
+            'payment_status': b.payment_status or payment_statuses.get(payment_id) or 'Pending',
+            'booking_type': b.booking_type or 'hourly',
+        })
+    return result
+
+
+def serialize_booking(b):
+    return serialize_bookings([b])[0]
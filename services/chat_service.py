@@ -0,0 +1,232 @@
+import atexit
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from extensions import socketio
+from models import Booking, ChatMessage, Provider, User
+
+PARTICIPANTS_TTL = 300
+EPOCH = datetime(1970, 1, 1)
+
+
+class ParticipantCache:
+    """TTL cache of the customer and provider (ids and names) of a booking.
+
+    Resolving names used to dereference ``booking.provider.user`` on every message;
+    this loads them once per booking with projected queries. Bookings without a
+    provider yet are not cached, so the provider shows up as soon as one accepts.
+    """
+
+    def __init__(self, ttl=PARTICIPANTS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, booking_id):
+        booking_id = str(booking_id)
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(booking_id)
+            if cached and cached[0] > now:
+                return cached[1]
+
+        booking = Booking.objects(id=booking_id).only('user', 'provider', 'provider_name').as_pymongo().first()
+        if not booking:
+            return None
+        provider_user_id = None
+        if booking.get('provider'):
+            provider = Provider.objects(id=booking['provider']).only('user').as_pymongo().first()
+            provider_user_id = provider.get('user') if provider else None
+        user_ids = [uid for uid in (booking['user'], provider_user_id) if uid]
+        names = {row['_id']: row.get('name') for row in User.objects(id__in=user_ids).only('name').as_pymongo()}
+
+        participants = {
+            'customer_id': str(booking['user']),
+            'customer_name': names.get(booking['user']),
+            'provider_id': str(booking['provider']) if booking.get('provider') else None,
+            'provider_user_id': str(provider_user_id) if provider_user_id else None,
+            'provider_name': names.get(provider_user_id) or booking.get('provider_name'),
+        }
+        if participants['provider_user_id']:
+            with self._lock:
+                self._entries[booking_id] = (now + self.ttl, participants)
+        return participants
+
+
+class ChatPersister:
+    """Write-behind buffer for chat messages.
+
+    Messages get their id and timestamp when posted and are delivered right away;
+    the buffer is written with one ``insert_many`` every ``flush_interval`` seconds.
+    Unwritten messages are still visible to history reads through ``pending``.
+    """
+
+    def __init__(self, flush_interval=0.5, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started = False
+
+    def submit(self, doc):
+        with self._lock:
+            self._buffer.append(doc)
+        self.start()
+
+    def pending(self, booking_id):
+        """Buffered, not-yet-written messages of a booking."""
+        booking_id = ObjectId(booking_id)
+        with self._lock:
+            return [doc for doc in self._buffer if doc['booking_id'] == booking_id]
+
+    def flush(self):
+        """Write every buffered message. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                docs = list(self._buffer)
+            if not docs:
+                return 0
+            written = 0
+            retry = []
+            collection = ChatMessage._get_collection()
+            for start in range(0, len(docs), self.batch_size):
+                batch = docs[start:start + self.batch_size]
+                try:
+                    collection.insert_many([dict(doc) for doc in batch], ordered=False)
+                    written += len(batch)
+                except BulkWriteError as e:
+                    # Duplicate ids were written by an earlier, partly failed flush
+                    failed = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000}
+                    retry.extend(doc for i, doc in enumerate(batch) if i in failed)
+                    written += len(batch) - len(failed)
+                    print(f"Error flushing chat messages: {len(failed)} failed")
+                except Exception as e:
+                    print(f"Error flushing chat messages: {e}")
+                    retry.extend(docs[start:])
+                    break
+            with self._lock:
+                # Keep what failed plus anything posted during the flush
+                self._buffer = retry + self._buffer[len(docs):]
+            return written
+
+    def start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in chat flush loop: {e}")
+
+
+participant_cache = ParticipantCache()
+chat_persister = ChatPersister()
+
+# Write whatever is still buffered when the process exits
+atexit.register(chat_persister.flush)
+
+
+def message_key(doc):
+    """Sort key of a message: (created_at in epoch milliseconds, _id)."""
+    return int((doc['created_at'] - EPOCH) / timedelta(milliseconds=1)), doc['_id']
+
+
+def message_payload(doc):
+    return {
+        'id': str(doc['_id']),
+        'booking_id': str(doc['booking_id']),
+        'sender_id': str(doc['sender_id']),
+        'sender_type': doc['sender_type'],
+        'sender_name': doc.get('sender_name'),
+        'type': doc.get('message_type', 'text'),
+        'content': doc.get('content', ''),
+        'status': doc.get('status', 'sent'),
+        'timestamp': doc['created_at'].isoformat()
+    }
+
+
+def post_message(booking_id, sender_id, content, message_type='text'):
+    """Queue a message for persistence and deliver it to the booking's participants.
+
+    The sender type is derived from the booking, not trusted from the client.
+    Returns the message payload, or None if the booking does not exist or the
+    sender is not its customer or provider.
+    """
+    participants = participant_cache.get(booking_id)
+    if not participants:
+        return None
+    sender_id = str(sender_id)
+    if sender_id == participants['customer_id']:
+        sender_type, sender_name = 'user', participants['customer_name']
+    elif sender_id == participants['provider_user_id']:
+        sender_type, sender_name = 'provider', participants['provider_name']
+    else:
+        return None
+
+    now = datetime.utcnow()
+    doc = {
+        '_id': ObjectId(),
+        'booking_id': ObjectId(booking_id),
+        'sender_id': ObjectId(sender_id),
+        'sender_type': sender_type,
+        'sender_name': sender_name,
+        'message_type': message_type or 'text',
+        'content': content,
+        'status': 'sent',
+        # Stored with millisecond precision, so keep the same value in the buffer
+        'created_at': now.replace(microsecond=now.microsecond // 1000 * 1000)
+    }
+    chat_persister.submit(doc)
+
+    payload = message_payload(doc)
+    rooms = [f"booking_{doc['booking_id']}"]
+    if sender_type == 'user' and participants['provider_user_id']:
+        rooms.append(f"provider_{participants['provider_user_id']}")
+    socketio.emit('new_message', payload, to=rooms)
+    return payload
+
+
+def message_history(booking_id, limit, before=None):
+    """One page of a booking's messages, newest page first, oldest-first within the page.
+
+    ``before`` is the (epoch ms, [id]) key returned with the previous page. Returns
+    the message payloads and the key of the next (older) page, or None at the start
+    of the conversation.
+    """
+    booking_id = ObjectId(booking_id)
+    # Snapshot the buffer before querying so a concurrent flush cannot hide a message
+    pending = chat_persister.pending(booking_id)
+    query = {'booking_id': booking_id}
+    before_key = None
+    if before:
+        before_key = (int(before[0]), before[1][-1])
+        before_at = EPOCH + timedelta(milliseconds=before_key[0])
+        query['$or'] = [{'created_at': {'$lt': before_at}},
+                        {'created_at': before_at, '_id': {'$lt': before_key[1]}}]
+
+    docs = list(ChatMessage._get_collection().find(query)
+                .sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+    seen = {doc['_id'] for doc in docs}
+    docs.extend(doc for doc in pending
+                if doc['_id'] not in seen and (before_key is None or message_key(doc) < before_key))
+    docs.sort(key=message_key, reverse=True)
+
+    page = docs[:limit]
+    next_key = None
+    if len(docs) > limit:
+        last_ms, last_id = message_key(page[-1])
+        next_key = (last_ms, [last_id])
+    return [message_payload(doc) for doc in reversed(page)], next_key
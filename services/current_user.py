@@ -0,0 +1,130 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from flask import g, has_request_context
+from flask_jwt_extended import get_jwt_identity
+from mongoengine import signals
+
+from models import User, Provider
+
+IDENTITY_CACHE_TTL = 10
+IDENTITY_CACHE_SIZE = 5000
+
+
+class RawDocumentCache:
+    """Short-TTL, size-bounded LRU of raw MongoDB documents.
+
+    Stores the raw SON rather than Document instances, so every request builds its
+    own Document and no mutable object is shared between threads. Entries are
+    dropped when the document is saved or deleted through mongoengine; writes that
+    bypass it (bulk updates) are picked up within ``ttl`` seconds.
+    """
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL, max_size=IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] > now:
+                self._entries.move_to_end(key)
+                return cached[1]
+        son = loader()
+        if son is not None:
+            with self._lock:
+                self._entries[key] = (now + self.ttl, son)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return son
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+user_cache = RawDocumentCache()
+provider_cache = RawDocumentCache()
+
+
+def identity_user_id(ident):
+    """User id (string) from a JWT identity payload, user document or id."""
+    if ident is None:
+        return None
+    if isinstance(ident, dict):
+        ident = ident.get('id') or ident.get('user_id')
+    ident = getattr(ident, 'id', ident)
+    return str(ident) if ident else None
+
+
+def _request_memo(name):
+    if not has_request_context():
+        return None
+    memo = g.get(name)
+    if memo is None:
+        memo = {}
+        setattr(g, name, memo)
+    return memo
+
+
+def load_user(ident):
+    """User for a JWT identity or id, memoized for the request and briefly cached per process."""
+    user_id = identity_user_id(ident)
+    if not user_id or not ObjectId.is_valid(user_id):
+        return None
+    memo = _request_memo('_loaded_users')
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+    son = user_cache.get(user_id, lambda: User.objects(id=ObjectId(user_id)).as_pymongo().first())
+    user = User._from_son(copy.deepcopy(son)) if son else None
+    if memo is not None:
+        memo[user_id] = user
+    return user
+
+
+def load_provider(ident):
+    """Provider profile of a user (document, JWT identity or id), cached like load_user."""
+    user_id = identity_user_id(ident)
+    if not user_id or not ObjectId.is_valid(user_id):
+        return None
+    memo = _request_memo('_loaded_providers')
+    if memo is not None and user_id in memo:
+        return memo[user_id]
+    son = provider_cache.get(user_id, lambda: Provider.objects(user=ObjectId(user_id)).as_pymongo().first())
+    provider = Provider._from_son(copy.deepcopy(son)) if son else None
+    if memo is not None:
+        memo[user_id] = provider
+    return provider
+
+
+def current_user():
+    """The authenticated user of this request, or None."""
+    return load_user(get_jwt_identity())
+
+
+def current_provider():
+    """The authenticated user's provider profile, or None."""
+    return load_provider(get_jwt_identity())
+
+
+def _forget_user(sender, document, **kwargs):
+    user_cache.invalidate(str(document.id))
+
+
+def _forget_provider(sender, document, **kwargs):
+    user_ref = document._data.get('user')
+    if user_ref is not None:
+        provider_cache.invalidate(str(getattr(user_ref, 'id', user_ref)))
+
+
+signals.post_save.connect(_forget_user, sender=User)
+signals.post_delete.connect(_forget_user, sender=User)
+signals.post_save.connect(_forget_provider, sender=Provider)
+signals.post_delete.connect(_forget_provider, sender=Provider)
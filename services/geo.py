@@ -0,0 +1,110 @@
+"""Shared great-circle distance helpers (kilometers), scalar and vectorized."""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance between two coordinates in kilometers."""
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * math.asin(min(1.0, math.sqrt(a)))
+
+
+def as_coords(values):
+    """Convert a sequence of coordinates to a contiguous float64 array."""
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
+def distances_from(lat, lon, lats, lons):
+    """Distances in km from one point to each of N points."""
+    lat1 = math.radians(lat)
+    lat2 = np.radians(as_coords(lats))
+    dlat = lat2 - lat1
+    dlon = np.radians(as_coords(lons)) - math.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def pairwise_distances(lats1, lons1, lats2=None, lons2=None):
+    """N x M matrix of distances in km; compares the first set with itself if no second set is given."""
+    lat1 = np.radians(as_coords(lats1))[:, None]
+    lon1 = np.radians(as_coords(lons1))[:, None]
+    if lats2 is None:
+        lat2, lon2 = lat1.T, lon1.T
+    else:
+        lat2 = np.radians(as_coords(lats2))[None, :]
+        lon2 = np.radians(as_coords(lons2))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def path_length_km(lats, lons):
+    """Total length in km of the polyline through the given points."""
+    lats, lons = as_coords(lats), as_coords(lons)
+    if len(lats) < 2:
+        return 0.0
+    lat1, lat2 = np.radians(lats[:-1]), np.radians(lats[1:])
+    dlon = np.radians(lons[1:] - lons[:-1])
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return float(np.sum(EARTH_RADIUS_KM * 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))))
+
+
+def single_linkage_clusters(lats, lons, radius_km):
+    """Group points that are chained together by hops of at most ``radius_km``.
+
+    Points are bucketed into grid cells at least ``radius_km`` wide, so each point
+    is only compared with the points in its own and the 8 neighbouring cells, and
+    components are merged with a union-find that keeps running coordinate sums.
+    Returns ``(labels, centroids)``: the component root of each point and a
+    ``{root: (lat, lon)}`` centroid per component.
+    """
+    lats, lons = as_coords(lats), as_coords(lons)
+    n = len(lats)
+    parent = list(range(n))
+    size = [1] * n
+    sums = [[float(lats[i]), float(lons[i])] for i in range(n)]
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri == rj:
+            return
+        if size[ri] < size[rj]:
+            ri, rj = rj, ri
+        parent[rj] = ri
+        size[ri] += size[rj]
+        sums[ri][0] += sums[rj][0]
+        sums[ri][1] += sums[rj][1]
+
+    if n:
+        km_per_deg = EARTH_RADIUS_KM * math.pi / 180
+        lat_step = radius_km / km_per_deg
+        # Use the highest latitude in play so longitude cells are never narrower than the radius
+        max_lat = min(float(np.max(np.abs(lats))) + lat_step, 89.0)
+        lon_step = radius_km / (km_per_deg * math.cos(math.radians(max_lat)))
+        cells = {}
+        for i in range(n):
+            cells.setdefault((int(math.floor(lats[i] / lat_step)), int(math.floor(lons[i] / lon_step))), []).append(i)
+
+        for (ci, cj), members in cells.items():
+            neighbours = [j for di in (-1, 0, 1) for dj in (-1, 0, 1) for j in cells.get((ci + di, cj + dj), ())]
+            neighbour_lats, neighbour_lons = lats[neighbours], lons[neighbours]
+            for i in members:
+                distances = distances_from(lats[i], lons[i], neighbour_lats, neighbour_lons)
+                for j, dist in zip(neighbours, distances.tolist()):
+                    if j > i and dist <= radius_km:
+                        union(i, j)
+
+    labels = [find(i) for i in range(n)]
+    centroids = {root: (sums[root][0] / size[root], sums[root][1] / size[root]) for root in set(labels)}
+    return labels, centroids
@@ -0,0 +1,71 @@
+import math
+
+from flask_socketio import join_room, leave_room, rooms
+
+from extensions import socketio
+
+AREA_CELL_DEG = 0.05
+MAX_AREA_CELLS = 64
+AREA_ROOM_PREFIX = 'geo_'
+
+
+def track_room(user_id):
+    """Room of the clients following one provider (customers tracking a booking)."""
+    return f'track_{user_id}'
+
+
+def area_room(lat, lon):
+    """Room of the map viewers whose viewport covers the grid cell containing the point."""
+    return f'{AREA_ROOM_PREFIX}{int(math.floor(lat / AREA_CELL_DEG))}_{int(math.floor(lon / AREA_CELL_DEG))}'
+
+
+def area_rooms(south, west, north, east, max_cells=MAX_AREA_CELLS):
+    """Rooms of the cells covering a viewport.
+
+    Returns None if the bounds are invalid or cover more than ``max_cells`` cells,
+    so one client cannot subscribe to a whole country's worth of updates.
+    """
+    try:
+        south, west, north, east = float(south), float(west), float(north), float(east)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return None
+    i0, i1 = int(math.floor(south / AREA_CELL_DEG)), int(math.floor(north / AREA_CELL_DEG))
+    j0, j1 = int(math.floor(west / AREA_CELL_DEG)), int(math.floor(east / AREA_CELL_DEG))
+    if (i1 - i0 + 1) * (j1 - j0 + 1) > max_cells:
+        return None
+    return [f'{AREA_ROOM_PREFIX}{i}_{j}' for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+
+def subscribe_area(south, west, north, east):
+    """Move the calling client's area subscription to a new viewport.
+
+    Must be called from a socket event handler. Returns the number of cell rooms
+    joined, or None if the viewport was rejected (the old subscription is kept).
+    """
+    wanted = area_rooms(south, west, north, east)
+    if wanted is None:
+        return None
+    wanted_set = set(wanted)
+    for room in rooms():
+        if room.startswith(AREA_ROOM_PREFIX) and room not in wanted_set:
+            leave_room(room)
+    for room in wanted:
+        join_room(room)
+    return len(wanted)
+
+
+def unsubscribe_area():
+    """Leave every area room of the calling client."""
+    for room in rooms():
+        if room.startswith(AREA_ROOM_PREFIX):
+            leave_room(room)
+
+
+def broadcast_location(event, payload, user_id, lat, lon):
+    """Emit a provider position only to the clients tracking that provider or viewing its cell.
+
+    A client in both rooms receives the frame once.
+    """
+    socketio.emit(event, payload, to=[track_room(user_id), area_room(lat, lon)])
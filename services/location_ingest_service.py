@@ -0,0 +1,147 @@
+import atexit
+import threading
+import time
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from extensions import socketio
+from models import User
+from services.provider_index import provider_index, index_pinged_provider
+from services.provider_location_service import geo_point
+from services.tracking_store import tracking_store
+
+
+class LocationIngestor:
+    """Coalesce provider GPS pings into periodic bulk coordinate writes.
+
+    Each ping replaces the provider's pending position in memory and moves it in
+    the grid index right away, so reads see it immediately. Every
+    ``flush_interval`` seconds the latest position per provider is written with
+    one ``bulk_write`` of ``$set`` updates touching only the coordinate fields,
+    however many pings arrived in between.
+    """
+
+    def __init__(self, flush_interval=2.0, batch_size=500):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._started = False
+        self._stats = {
+            'pings_received': 0,
+            'pings_coalesced': 0,
+            'positions_written': 0,
+            'flushes': 0,
+            'flush_errors': 0,
+            'last_flush_at': None,
+            'last_flush_ms': 0.0,
+            'last_flush_max_lag_s': 0.0,
+        }
+
+    def ingest(self, user_id, lat, lon, address=None):
+        """Record a ping. Returns the accepted (lat, lon) or raises ValueError for bad coordinates."""
+        point = geo_point(lat, lon)
+        if not point:
+            raise ValueError('Invalid coordinates')
+        lon, lat = point['coordinates']
+        user_id = str(user_id)
+        fields = {'latitude': lat, 'longitude': lon, 'location': point}
+        if address is not None:
+            fields['address'] = address
+
+        with self._lock:
+            self._stats['pings_received'] += 1
+            previous = self._pending.get(user_id)
+            if previous:
+                self._stats['pings_coalesced'] += 1
+                # Keep a pending address if this ping does not carry one, and the first receive time for lag
+                fields = dict(previous['fields'], **fields)
+                received_at = previous['received_at']
+            else:
+                received_at = time.time()
+            self._pending[user_id] = {'fields': fields, 'received_at': received_at}
+
+        attrs = {'address': address} if address is not None else {}
+        if not provider_index.move(user_id, lat, lon, **attrs):
+            index_pinged_provider(user_id, lat, lon, address)
+        tracking_store.record(user_id, lat, lon)
+        self.start()
+        return lat, lon
+
+    def pending_position(self, user_id):
+        """The latest not-yet-written position of a provider, or None."""
+        with self._lock:
+            entry = self._pending.get(str(user_id))
+            return dict(entry['fields']) if entry else None
+
+    def flush(self):
+        """Write the latest pending position of every provider. Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            started = time.time()
+            items = list(pending.items())
+            written = 0
+            try:
+                collection = User._get_collection()
+                for start in range(0, len(items), self.batch_size):
+                    operations = [UpdateOne({'_id': ObjectId(user_id)}, {'$set': entry['fields']})
+                                  for user_id, entry in items[start:start + self.batch_size]]
+                    collection.bulk_write(operations, ordered=False)
+                    written += len(operations)
+            except Exception as e:
+                print(f"Error flushing provider locations: {e}")
+                with self._lock:
+                    self._stats['flush_errors'] += 1
+                    # Re-queue what was not written unless a newer ping has replaced it
+                    for user_id, entry in items[written:]:
+                        self._pending.setdefault(user_id, entry)
+
+            finished = time.time()
+            with self._lock:
+                self._stats['positions_written'] += written
+                self._stats['flushes'] += 1
+                self._stats['last_flush_at'] = finished
+                self._stats['last_flush_ms'] = (finished - started) * 1000
+                self._stats['last_flush_max_lag_s'] = max(
+                    (finished - entry['received_at'] for _, entry in items[:written]), default=0.0)
+            return written
+
+    def metrics(self):
+        """Queue depth, write lag and throughput counters."""
+        now = time.time()
+        with self._lock:
+            oldest = min((entry['received_at'] for entry in self._pending.values()), default=None)
+            metrics = dict(self._stats)
+            metrics['queue_depth'] = len(self._pending)
+        metrics['oldest_pending_age_s'] = round(now - oldest, 3) if oldest else 0.0
+        metrics['flush_interval_s'] = self.flush_interval
+        return metrics
+
+    def start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error in location flush loop: {e}")
+
+
+location_ingestor = LocationIngestor()
+
+# Write whatever is still pending when the process exits
+atexit.register(location_ingestor.flush)
@@ -0,0 +1,101 @@
+import base64
+import json
+
+from bson import ObjectId
+
+
+def encode_cursor(*values):
+    """Pack the sort key of the last item on a page into an opaque URL-safe cursor."""
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor produced by encode_cursor. Returns None for a missing or malformed cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def page_size(value, default=50, maximum=200):
+    """Parse a ``limit`` query argument, clamped to [1, maximum]."""
+    try:
+        return max(1, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_key(values):
+    """Validate a decoded (sort value, id, ...) cursor.
+
+    Returns ``(value, [ObjectId, ...])`` or None if the cursor is malformed.
+    """
+    if not values or len(values) < 2:
+        return None
+    try:
+        value = float(values[0])
+    except (TypeError, ValueError):
+        return None
+    if not all(isinstance(v, str) and ObjectId.is_valid(v) for v in values[1:]):
+        return None
+    return value, [ObjectId(v) for v in values[1:]]
+
+
+def key_cursor(key):
+    """Encode a (sort value, [ids]) key as a cursor, or None at the end of the results."""
+    return encode_cursor(key[0], *[str(i) for i in key[1]]) if key else None
+
+
+def geo_near_page(collection, lat, lon, limit, query=None, after=None, max_distance_km=None):
+    """One page of documents ordered by distance from the point, using $geoNear.
+
+    ``after`` is the key returned with the previous page: its last distance and the
+    ids already returned at exactly that distance. The next page starts at that
+    distance on the server and skips only those ids, so ties across a page
+    boundary are neither repeated nor lost and no page needs a sort stage.
+    Returns the documents (with ``distance_m``) and the key to continue from, or
+    None when there are no more pages.
+    """
+    geo_near = {
+        'near': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+        'distanceField': 'distance_m',
+        'spherical': True,
+        'query': query or {}
+    }
+    if max_distance_km is not None:
+        geo_near['maxDistance'] = float(max_distance_km) * 1000
+    pipeline = [{'$geoNear': geo_near}]
+    if after:
+        last_distance, seen_ids = after
+        geo_near['minDistance'] = last_distance
+        pipeline.append({'$match': {'$nor': [{'distance_m': last_distance, '_id': {'$in': seen_ids}}]}})
+    pipeline.append({'$limit': limit + 1})
+
+    docs = list(collection.aggregate(pipeline))
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last_distance = docs[-1]['distance_m']
+    seen_ids = [doc['_id'] for doc in docs if doc['distance_m'] == last_distance]
+    if after and after[0] == last_distance:
+        # The tie spans more than one page
+        seen_ids = after[1] + seen_ids
+    return docs, (last_distance, seen_ids)
+
+
+def geo_near_documents(document_class, docs):
+    """Hydrate geo_near_page results as (document, distance in km) pairs.
+
+    ``distance_m`` is not a field of the model and strict documents reject unknown
+    fields, so it is taken off each raw document before hydrating.
+    """
+    pairs = []
+    for doc in docs:
+        distance_m = doc.pop('distance_m')
+        pairs.append((document_class._from_son(doc), distance_m / 1000.0))
+    return pairs
@@ -0,0 +1,419 @@
+import math
+import re
+import threading
+import time
+from functools import lru_cache
+
+import numpy as np
+
+# Hindi (Devanagari and romanized) hardware terms mapped to the English term they are indexed under
+TERM_SYNONYMS = {
+    'नल': 'tap', 'nal': 'tap', 'tonti': 'tap', 'टोंटी': 'tap', 'faucet': 'tap',
+    'पंखा': 'fan', 'पंख': 'fan', 'pankha': 'fan', 'pankhe': 'fan',
+    'तार': 'wire', 'taar': 'wire', 'tar': 'wire', 'cable': 'wire',
+    'बिजली': 'electric', 'bijli': 'electric', 'electrical': 'electric',
+    'पाइप': 'pipe', 'paip': 'pipe', 'pipa': 'pipe',
+    'बल्ब': 'bulb', 'balb': 'bulb', 'lamp': 'bulb',
+    'कील': 'nail', 'kil': 'nail', 'keel': 'nail',
+    'पेंच': 'screw', 'pench': 'screw',
+    'रंग': 'paint', 'rang': 'paint', 'पेंट': 'paint',
+    'हथौड़ा': 'hammer', 'hathoda': 'hammer', 'hathauda': 'hammer',
+    'स्विच': 'switch', 'swich': 'switch',
+    'ताला': 'lock', 'tala': 'lock', 'चाबी': 'key', 'chabi': 'key',
+    'सीमेंट': 'cement', 'siment': 'cement',
+    'गीज़र': 'geyser', 'गीजर': 'geyser', 'geezer': 'geyser',
+    'टंकी': 'tank', 'tanki': 'tank',
+    'प्लग': 'plug', 'साबुन': 'soap', 'sabun': 'soap',
+}
+
+STOPWORDS = {'the', 'and', 'for', 'of', 'with', 'in', 'to', 'a', 'an',
+             'का', 'की', 'के', 'और', 'में', 'से', 'को', 'ka', 'ki', 'ke', 'aur', 'se', 'ko'}
+
+# Inflectional suffixes, longest first; a stem must keep at least 2 characters
+HINDI_SUFFIXES = sorted(['ियाँ', 'ियां', 'ाओं', 'ाएं', 'ाएँ', 'ों', 'ें', 'ीं', 'ाँ', 'ां', 'ी', 'े', 'ा', 'ि'],
+                        key=len, reverse=True)
+ENGLISH_SUFFIXES = [('ies', 'y'), ('ches', 'ch'), ('shes', 'sh'), ('sses', 'ss'), ('xes', 'x'),
+                    ('ings', ''), ('ing', ''), ('ers', ''), ('er', ''), ('ed', ''), ('s', '')]
+
+# Devanagari vowel signs are combining marks, which \w alone would split words on
+_TOKEN_RE = re.compile(r'[\w\u0900-\u097F]+', re.UNICODE)
+_DEVANAGARI_RE = re.compile(r'[ऀ-ॿ]')
+
+# BM25 parameters and per-field term weights
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+
+
+def stem(token):
+    """Light suffix-stripping stemmer for English and Hindi tokens."""
+    if _DEVANAGARI_RE.search(token):
+        for suffix in HINDI_SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 2:
+                return token[:-len(suffix)]
+        return token
+    if len(token) <= 3 or token.isdigit():
+        return token
+    for suffix, replacement in ENGLISH_SUFFIXES:
+        if suffix == 's' and token.endswith('ss'):
+            continue
+        if token.endswith(suffix) and len(token) - len(suffix) + len(replacement) >= 3:
+            return token[:-len(suffix)] + replacement
+    return token
+
+
+@lru_cache(maxsize=65536)
+def _normalize_token(token):
+    stemmed = stem(token)
+    synonym = TERM_SYNONYMS.get(token) or TERM_SYNONYMS.get(stemmed)
+    return stem(synonym) if synonym else stemmed
+
+
+def tokenize(text):
+    """Lowercase, split, map Hindi/romanized synonyms and stem."""
+    return [_normalize_token(token) for token in _TOKEN_RE.findall((text or '').lower())
+            if (len(token) >= 2 or token.isdigit()) and token not in STOPWORDS]
+
+
+def term_frequencies(doc):
+    """Field-weighted term frequencies and weighted length of a raw product document."""
+    frequencies = {}
+    length = 0.0
+    for field, weight in FIELD_WEIGHTS.items():
+        for term in tokenize(doc.get(field)):
+            frequencies[term] = frequencies.get(term, 0.0) + weight
+            length += weight
+    return frequencies, length
+
+
+class _Segment:
+    """Immutable, array-backed postings for a batch of products."""
+
+    def __init__(self, docs):
+        self.ids = []
+        self.shops = []
+        self.categories = []
+        lengths = []
+        available = []
+        shop_codes = []
+        codes_by_shop = {}
+        postings = {}
+        for doc in docs:
+            position = len(self.ids)
+            frequencies, length = term_frequencies(doc)
+            self.ids.append(doc['_id'])
+            self.shops.append(doc.get('shop'))
+            shop_codes.append(codes_by_shop.setdefault(doc['shop'], len(codes_by_shop)) if doc.get('shop') else -1)
+            self.categories.append(doc.get('category'))
+            lengths.append(length)
+            available.append(bool(doc.get('is_available', True)))
+            for term, tf in frequencies.items():
+                posting = postings.setdefault(term, ([], []))
+                posting[0].append(position)
+                posting[1].append(tf)
+        self.positions = {product_id: i for i, product_id in enumerate(self.ids)}
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.available = np.asarray(available, dtype=bool)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.postings = {term: (np.asarray(rows, dtype=np.int32), np.asarray(tfs, dtype=np.float64))
+                         for term, (rows, tfs) in postings.items()}
+        self.category_values = np.asarray(self.categories, dtype=object)
+        # Shops as small integers (-1 for none), so matches can be grouped by shop with numpy
+        self.shop_codes = np.asarray(shop_codes, dtype=np.int64)
+        self.shop_values = list(codes_by_shop)
+        self.total_length = float(self.lengths.sum())
+
+
+class ProductSearchIndex:
+    """In-process inverted index over product name, category and description with BM25 ranking.
+
+    Postings live in an array-backed base segment, so scoring a term is a few
+    vectorized operations regardless of how many products contain it. Writes go
+    to a small dict-backed delta (and tombstone the base copy) until the next
+    rebuild from MongoDB, which runs every ``rebuild_interval`` seconds.
+    """
+
+    def __init__(self, rebuild_interval=300, retry_interval=30):
+        self.rebuild_interval = rebuild_interval
+        self.retry_interval = retry_interval
+        self._base = _Segment([])
+        self._delta = {}
+        self._delta_length = 0.0
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()
+        self._last_built = 0.0
+        self._last_failed = 0.0
+        self._journal = None
+        self.ready = False
+
+    def load(self, docs):
+        """Replace the index contents with the given raw product documents."""
+        base = _Segment(docs)
+        with self._lock:
+            self._base = base
+            self._delta = {}
+            self._delta_length = 0.0
+
+    def upsert(self, doc):
+        """Index a raw product document (as stored in MongoDB)."""
+        frequencies, length = term_frequencies(doc)
+        entry = {
+            'shop': doc.get('shop'),
+            'category': doc.get('category'),
+            'available': bool(doc.get('is_available', True)),
+            'length': length,
+            'terms': frequencies,
+        }
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append(doc)
+            self._unlink(doc['_id'])
+            self._delta[doc['_id']] = entry
+            self._delta_length += length
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append({'_id': product_id, 'removed': True})
+            self._unlink(product_id)
+
+    def _unlink(self, product_id):
+        old = self._delta.pop(product_id, None)
+        if old:
+            self._delta_length -= old['length']
+        position = self._base.positions.get(product_id)
+        if position is not None and self._base.alive[position]:
+            self._base.alive[position] = False
+            self._base.total_length -= self._base.lengths[position]
+
+    def _score_locked(self, query):
+        """BM25 scores of the query terms, with the index lock held.
+
+        Returns (base scores as an array aligned with the base segment, {product_id:
+        score} for the delta), or None if nothing can match.
+        """
+        terms = set(tokenize(query))
+        base, delta = self._base, self._delta
+        n = int(base.alive.sum()) + len(delta)
+        if not n or not terms:
+            return None
+        avg_length = ((base.total_length + self._delta_length) / n) or 1.0
+        base_norm = K1 * (1 - B + B * base.lengths / avg_length)
+        base_scores = np.zeros(len(base.ids), dtype=np.float64)
+        delta_scores = {}
+
+        for term in terms:
+            rows, tfs = base.postings.get(term, (None, None))
+            delta_hits = [(product_id, entry['terms'][term], entry['length'])
+                          for product_id, entry in delta.items() if term in entry['terms']]
+            df = (int(base.alive[rows].sum()) if rows is not None else 0) + len(delta_hits)
+            if not df:
+                continue
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if rows is not None:
+                base_scores += np.bincount(rows, weights=idf * tfs * (K1 + 1) / (tfs + base_norm[rows]),
+                                           minlength=len(base.ids))
+            for product_id, tf, length in delta_hits:
+                norm = K1 * (1 - B + B * length / avg_length)
+                delta_scores[product_id] = delta_scores.get(product_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return base_scores, delta_scores
+
+    def _matching_rows(self, base_scores, category):
+        base = self._base
+        mask = (base_scores > 0) & base.alive & base.available
+        if category:
+            mask &= base.category_values == category
+        return np.flatnonzero(mask)
+
+    def _delta_matches(self, delta_scores, category):
+        for product_id, score in delta_scores.items():
+            entry = self._delta[product_id]
+            if entry['available'] and (not category or entry['category'] == category):
+                yield product_id, entry['shop'], score
+
+    def search(self, query, category=None, limit=200):
+        """Return [(product_id, shop_id, score)] for available products, best first."""
+        with self._lock:
+            scored = self._score_locked(query)
+            if scored is None:
+                return []
+            base_scores, delta_scores = scored
+            base = self._base
+            candidates = self._matching_rows(base_scores, category)
+            if limit and len(candidates) > limit:
+                top = np.argpartition(-base_scores[candidates], limit - 1)[:limit]
+                candidates = candidates[top]
+            results = [(base.ids[i], base.shops[i], float(base_scores[i])) for i in candidates.tolist()]
+            results.extend(self._delta_matches(delta_scores, category))
+
+        results.sort(key=lambda r: (-r[2], str(r[0])))
+        return results[:limit] if limit else results
+
+    def search_shops(self, query, category=None, per_shop=20):
+        """Matching available products grouped by shop, as ShopMatches.
+
+        Groups and orders the matches with numpy, so only one entry per shop (its
+        best score) becomes a Python object until a shop's products are asked for.
+        """
+        with self._lock:
+            scored = self._score_locked(query)
+            if scored is None:
+                return ShopMatches(per_shop)
+            base_scores, delta_scores = scored
+            base = self._base
+            rows = self._matching_rows(base_scores, category)
+            rows = rows[base.shop_codes[rows] >= 0]
+            extra = list(self._delta_matches(delta_scores, category))
+
+        scores = base_scores[rows]
+        codes = base.shop_codes[rows]
+        # Grouped by shop, best score first within each shop
+        order = np.lexsort((-scores, codes))
+        rows, scores, codes = rows[order], scores[order], codes[order]
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.empty(0, dtype=np.int64)
+        ends = np.r_[starts[1:], len(codes)].astype(np.int64)
+
+        matches = ShopMatches(per_shop, base.ids, rows, scores)
+        for code, start, end in zip(codes[starts].tolist(), starts.tolist(), ends.tolist()):
+            shop_id = base.shop_values[code]
+            matches.best[shop_id] = float(scores[start])
+            matches.spans[shop_id] = (start, min(end, start + per_shop))
+        for product_id, shop_id, score in extra:
+            if shop_id is not None:
+                matches.add(product_id, shop_id, score)
+        matches.count = len(rows) + len(extra)
+        return matches
+
+    def rebuild(self):
+        """Rebuild from MongoDB, replaying product writes made while the rebuild ran."""
+        from models import Product
+        started = time.time()
+        with self._lock:
+            self._journal = []
+        try:
+            projection = {'name': 1, 'description': 1, 'category': 1, 'shop': 1, 'is_available': 1}
+            base = _Segment(Product._get_collection().find({}, projection))
+            with self._lock:
+                journal = self._journal
+                self._journal = None
+                self._base = base
+                self._delta = {}
+                self._delta_length = 0.0
+                for doc in journal:
+                    if doc.get('removed'):
+                        self.remove(doc['_id'])
+                    else:
+                        self.upsert(doc)
+                self._last_built = started
+                self.ready = True
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def ensure_fresh(self):
+        """Start a rebuild if the snapshot is stale. Returns whether the index has been loaded.
+
+        Never makes a request wait: every rebuild runs as a background task while
+        callers keep serving the current snapshot (or fall back to fallback_search
+        before the first build). A failed build is retried after ``retry_interval``
+        seconds rather than the full interval.
+        """
+        now = time.time()
+        if now - self._last_built < self.rebuild_interval or now - self._last_failed < self.retry_interval:
+            return self.ready
+        if not self._rebuild_lock.acquire(blocking=False):
+            return self.ready
+        from extensions import socketio
+        try:
+            socketio.start_background_task(self._rebuild_locked)
+        except Exception:
+            self._rebuild_lock.release()
+            raise
+        return self.ready
+
+    def _rebuild_locked(self):
+        try:
+            if time.time() - self._last_built >= self.rebuild_interval:
+                self.rebuild()
+        except Exception as e:
+            print(f"Error rebuilding product search index: {e}")
+            self._last_failed = time.time()
+        finally:
+            self._rebuild_lock.release()
+
+
+class ShopMatches:
+    """Products matching a query, grouped by shop.
+
+    ``best`` maps each matching shop to its best product score; ``products(shop_id)``
+    lists that shop's top ``per_shop`` products as [(product_id, score)], best first.
+    """
+
+    def __init__(self, per_shop, ids=(), rows=None, scores=None):
+        self.per_shop = per_shop
+        self.best = {}
+        self.spans = {}
+        self.count = 0
+        self._ids = ids
+        self._rows = rows
+        self._scores = scores
+        self._extra = {}
+
+    @classmethod
+    def from_ranked(cls, ranked, per_shop=20):
+        """Group a [(product_id, shop_id, score)] list such as fallback_search returns."""
+        matches = cls(per_shop)
+        for product_id, shop_id, score in ranked:
+            if shop_id is not None:
+                matches.add(product_id, shop_id, score)
+        matches.count = len(ranked)
+        return matches
+
+    def add(self, product_id, shop_id, score):
+        self._extra.setdefault(shop_id, []).append((product_id, score))
+        if score > self.best.get(shop_id, 0.0):
+            self.best[shop_id] = score
+
+    def products(self, shop_id):
+        start, end = self.spans.get(shop_id, (0, 0))
+        items = []
+        if end > start:
+            items = [(self._ids[row], score) for row, score in
+                     zip(self._rows[start:end].tolist(), self._scores[start:end].tolist())]
+        extra = self._extra.get(shop_id)
+        if extra:
+            items = sorted(items + extra, key=lambda r: (-r[1], str(r[0])))
+        return items[:self.per_shop]
+
+
+def fallback_search(query, category=None):
+    """Mongo regex search used until the index is loaded: [(product_id, shop_id, score)], best first.
+
+    Matches the whole query or any of its words in name or description; the score
+    is the number of query words matched.
+    """
+    from models import Product
+    from mongoengine.queryset.visitor import Q
+    words = [w for w in query.split() if len(w) > 1]
+    text_q = Q(name__icontains=query) | Q(description__icontains=query)
+    for w in words:
+        text_q = text_q | Q(name__icontains=w) | Q(description__icontains=w)
+    products = Product.objects(Q(is_available=True) & text_q)
+    if category:
+        products = products.filter(category=category)
+
+    results = []
+    for doc in products.only('name', 'description', 'shop').as_pymongo():
+        text = f"{doc.get('name') or ''} {doc.get('description') or ''}".lower()
+        score = float(sum(1 for w in words if w in text)) or 1.0
+        results.append((doc['_id'], doc.get('shop'), score))
+    results.sort(key=lambda r: (-r[2], str(r[0])))
+    return results
+
+
+product_search = ProductSearchIndex()
+
+
+def index_product(product):
+    """Mirror a saved product into the search index."""
+    product_search.upsert(product.to_mongo().to_dict())
@@ -1,6 +1,10 @@
+import hashlib
 from datetime import datetime
-from bson import ObjectId
-from models import Provider, ProviderDepositTransaction, Booking
+from extensions import socketio
+from models import ProviderDepositTransaction, Booking
+from services.current_user import load_provider
+
+MINIMUM_DEPOSIT = 500.0
 
 
 class ProviderDepositError(Exception):
@@ -9,24 +13,7 @@ class ProviderDepositError(Exception):
 
 def resolve_provider(ident):
     """Fetch a provider document using a JWT identity payload."""
-    from models import User
-    if ident is None:
-        return None
-
-    if isinstance(ident, dict):
-        user_id = ident.get('id') or ident.get('user_id') or ident
-    else:
-        user_id = ident
-
-    try:
-        user = User.objects(id=ObjectId(str(user_id))).first()
-    except Exception:
-        user = User.objects(id=str(user_id)).first()
-    
-    if not user:
-        return None
-    
-    return Provider.objects(user=user).first()
+    return load_provider(ident)
 
 
 def record_deposit_transaction(provider, amount, transaction_type='credit', source='recharge', 
@@ -60,7 +47,7 @@ def record_deposit_transaction(provider, amount, transaction_type='credit', sour
     provider.deposit_balance = round(new_balance, 2)
     provider.save()
 
-    ProviderDepositTransaction(
+    transaction = ProviderDepositTransaction(
         provider=provider,
         amount=round(float(amount), 2),
         transaction_type=transaction_type,
@@ -74,9 +61,36 @@ def record_deposit_transaction(provider, amount, transaction_type='credit', sour
         created_at=datetime.utcnow()
     ).save()
 
+    # Push the new balance to the provider's open dashboards instead of having them poll
+    try:
+        socketio.emit('deposit_updated', {
+            'deposit_balance': provider.deposit_balance,
+            'minimum_required': MINIMUM_DEPOSIT,
+            'is_eligible': provider.deposit_balance >= MINIMUM_DEPOSIT,
+            'transaction': _transaction_row(transaction)
+        }, to=f"provider_{provider.id}")
+    except Exception as e:
+        print(f"Error emitting deposit update: {e}")
+
     return provider.deposit_balance
 
 
+def _transaction_row(tx):
+    return {
+        'id': str(tx.id),
+        'amount': tx.amount,
+        'transaction_type': tx.transaction_type,
+        'source': tx.source,
+        'description': tx.description,
+        'balance_after': tx.balance_after,
+        'booking_id': str(tx.booking.id) if tx.booking else None,
+        'commission_rate': tx.commission_rate,
+        'commission_amount': tx.commission_amount,
+        'created_at': tx.created_at.isoformat() if tx.created_at else None,
+        'external_reference': tx.external_reference
+    }
+
+
 def deduct_commission(provider, booking, commission_rate=10.0):
     """Deduct Hofix commission from provider's deposit when they receive cash payment."""
     if not provider:
@@ -123,7 +137,7 @@ def deduct_commission(provider, booking, commission_rate=10.0):
     }
 
 
-def check_minimum_balance(provider, minimum_balance=500.0):
+def check_minimum_balance(provider, minimum_balance=MINIMUM_DEPOSIT):
     """Check if provider has minimum required balance (default ₹500)."""
     if not provider:
         return False, 'Provider not found'
@@ -147,21 +161,20 @@ def get_deposit_summary(provider, limit=20):
     
     summary = {
         'deposit_balance': round(float(provider.deposit_balance or 0.0), 2),
-        'minimum_required': 500.0,
-        'is_eligible': float(provider.deposit_balance or 0.0) >= 500.0,
-        'transactions': [{
-            'id': str(tx.id),
-            'amount': tx.amount,
-            'transaction_type': tx.transaction_type,
-            'source': tx.source,
-            'description': tx.description,
-            'balance_after': tx.balance_after,
-            'booking_id': str(tx.booking.id) if tx.booking else None,
-            'commission_rate': tx.commission_rate,
-            'commission_amount': tx.commission_amount,
-            'created_at': tx.created_at.isoformat() if tx.created_at else None,
-            'external_reference': tx.external_reference
-        } for tx in transactions]
+        'minimum_required': MINIMUM_DEPOSIT,
+        'is_eligible': float(provider.deposit_balance or 0.0) >= MINIMUM_DEPOSIT,
+        'transactions': [_transaction_row(tx) for tx in transactions]
     }
     return summary
 
+
+def deposit_etag(provider):
+    """Version of a provider's deposit summary: its balance and latest transaction.
+
+    Costs one indexed, projected query, so unchanged summaries can be answered
+    with 304 Not Modified without loading the transaction list.
+    """
+    latest = ProviderDepositTransaction.objects(provider=provider).order_by('-created_at') \
+        .only('id').as_pymongo().first()
+    version = f"{provider.id}:{float(provider.deposit_balance or 0.0):.2f}:{latest['_id'] if latest else ''}"
+    return hashlib.sha1(version.encode('utf-8')).hexdigest()
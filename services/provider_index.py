@@ -0,0 +1,300 @@
+import math
+import threading
+import time
+
+from services.geo import distances_from
+from services.skill_index import skill_index
+
+KM_PER_DEGREE = 111.32
+
+
+class ProviderGridIndex:
+    """Memory-resident uniform-grid index of live provider positions.
+
+    Positions are bucketed into square cells of ``cell_deg`` degrees, so radius and
+    k-nearest queries only visit the cells around the query point. The index is fed
+    by the location/availability write paths and reconciled against MongoDB every
+    ``reconcile_interval`` seconds to pick up changes made elsewhere.
+    """
+
+    def __init__(self, cell_deg=0.05, reconcile_interval=300):
+        self.cell_deg = cell_deg
+        self.reconcile_interval = reconcile_interval
+        self._entries = {}
+        self._entry_cells = {}
+        self._cells = {}
+        self._lock = threading.RLock()
+        self._reconcile_lock = threading.Lock()
+        self._last_reconciled = 0.0
+        self.ready = False
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _place(self, user_id, entry):
+        old_cell = self._entry_cells.get(user_id)
+        new_cell = self._cell(entry['lat'], entry['lon'])
+        if old_cell == new_cell:
+            return
+        if old_cell is not None:
+            bucket = self._cells.get(old_cell)
+            if bucket:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._cells[old_cell]
+        self._cells.setdefault(new_cell, set()).add(user_id)
+        self._entry_cells[user_id] = new_cell
+
+    def upsert(self, user_id, lat, lon, **attrs):
+        """Insert or replace a provider position and its attributes."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.setdefault(user_id, {'user_id': user_id})
+            entry.update(attrs)
+            entry['lat'] = float(lat)
+            entry['lon'] = float(lon)
+            entry['updated_at'] = time.time()
+            self._place(user_id, entry)
+
+    def move(self, user_id, lat, lon, **attrs):
+        """Update the position of an indexed provider. Returns False if it is not indexed."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False
+            entry.update(attrs)
+            entry['lat'] = float(lat)
+            entry['lon'] = float(lon)
+            entry['updated_at'] = time.time()
+            self._place(user_id, entry)
+            return True
+
+    def update(self, user_id, **attrs):
+        """Update attributes of an indexed provider. Returns False if it is not indexed."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return False
+            entry.update(attrs)
+            entry['updated_at'] = time.time()
+            return True
+
+    def remove(self, user_id):
+        user_id = str(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+            cell = self._entry_cells.pop(user_id, None)
+            bucket = self._cells.get(cell)
+            if bucket:
+                bucket.discard(user_id)
+                if not bucket:
+                    del self._cells[cell]
+
+    def get(self, user_id):
+        """Return a copy of the indexed entry for a provider user, or None."""
+        self.ensure_fresh()
+        with self._lock:
+            entry = self._entries.get(str(user_id))
+            return dict(entry) if entry else None
+
+    def all(self, available_only=False):
+        self.ensure_fresh()
+        with self._lock:
+            return [dict(e) for e in self._entries.values()
+                    if not available_only or e.get('availability')]
+
+    def _ring(self, center, radius):
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for dj in range(-radius, radius + 1):
+            yield ci - radius, cj + dj
+            yield ci + radius, cj + dj
+        for di in range(-radius + 1, radius):
+            yield ci + di, cj - radius
+            yield ci + di, cj + radius
+
+    def _cell_span_km(self, lat):
+        """Smallest side of a cell near ``lat``, used as the per-ring distance bound."""
+        lon_km = self.cell_deg * KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat), 89.0))), 0.01)
+        return min(self.cell_deg * KM_PER_DEGREE, lon_km)
+
+    def within_radius(self, lat, lon, radius_km, available_only=False, limit=None, provider_ids=None):
+        """Providers within ``radius_km`` of the point, sorted by distance then rating.
+
+        ``provider_ids`` restricts the candidates to a set of provider profile IDs
+        before any distance is computed.
+        """
+        self.ensure_fresh()
+        lat, lon = float(lat), float(lon)
+        lat_cells = int(math.ceil(radius_km / (self.cell_deg * KM_PER_DEGREE)))
+        lon_cells = int(math.ceil(radius_km / (self._cell_span_km(lat) or 1e-6)))
+        ci, cj = self._cell(lat, lon)
+
+        with self._lock:
+            candidates = [self._entries[user_id]
+                          for i in range(ci - lat_cells, ci + lat_cells + 1)
+                          for j in range(cj - lon_cells, cj + lon_cells + 1)
+                          for user_id in self._cells.get((i, j), ())]
+            if available_only:
+                candidates = [e for e in candidates if e.get('availability')]
+            if provider_ids is not None:
+                candidates = [e for e in candidates if str(e.get('provider_id')) in provider_ids]
+            candidates = [dict(e) for e in candidates]
+
+        results = []
+        if candidates:
+            distances = distances_from(lat, lon, [e['lat'] for e in candidates], [e['lon'] for e in candidates])
+            for entry, dist in zip(candidates, distances.tolist()):
+                if dist <= radius_km:
+                    entry['distance_km'] = dist
+                    results.append(entry)
+
+        results.sort(key=lambda r: (r['distance_km'], -(r.get('rating') or 0)))
+        return results[:limit] if limit else results
+
+    def nearest(self, lat, lon, k, available_only=False, max_radius_km=None):
+        """The ``k`` nearest providers, found by expanding rings of cells."""
+        self.ensure_fresh()
+        lat, lon = float(lat), float(lon)
+        center = self._cell(lat, lon)
+        span_km = self._cell_span_km(lat)
+
+        found = []
+        with self._lock:
+            total = len(self._entries)
+            seen = 0
+            radius = 0
+            while seen < total:
+                ring = [self._entries[user_id]
+                        for cell in self._ring(center, radius)
+                        for user_id in self._cells.get(cell, ())]
+                seen += len(ring)
+                if available_only:
+                    ring = [e for e in ring if e.get('availability')]
+                if ring:
+                    distances = distances_from(lat, lon, [e['lat'] for e in ring], [e['lon'] for e in ring])
+                    for entry, dist in zip(ring, distances.tolist()):
+                        if max_radius_km is None or dist <= max_radius_km:
+                            result = dict(entry)
+                            result['distance_km'] = dist
+                            found.append(result)
+                # Anything in a farther ring is at least radius * span_km away
+                bound = radius * span_km
+                if max_radius_km is not None and bound > max_radius_km:
+                    break
+                if len(found) >= k:
+                    found.sort(key=lambda r: r['distance_km'])
+                    if found[k - 1]['distance_km'] <= bound:
+                        break
+                radius += 1
+
+        found.sort(key=lambda r: r['distance_km'])
+        return found[:k]
+
+    def reconcile(self):
+        """Rebuild the index from MongoDB, keeping positions written during the rebuild."""
+        from services.provider_location_service import iter_provider_positions
+        started = time.time()
+        rows = list(iter_provider_positions())
+        with self._lock:
+            fresh = {user_id: entry for user_id, entry in self._entries.items()
+                     if entry.get('updated_at', 0) > started}
+            self._entries = {}
+            self._entry_cells = {}
+            self._cells = {}
+            for row in rows:
+                if row['user_id'] in fresh:
+                    continue
+                lat, lon = row.pop('lat'), row.pop('lon')
+                self.upsert(row['user_id'], lat, lon, **row)
+                self._entries[row['user_id']]['updated_at'] = started
+            for user_id, entry in fresh.items():
+                self._entries[user_id] = entry
+                self._place(user_id, entry)
+            self._last_reconciled = started
+            self.ready = True
+
+    def ensure_fresh(self):
+        """Reconcile if the snapshot is stale. Returns whether the index has been loaded."""
+        if time.time() - self._last_reconciled < self.reconcile_interval:
+            return self.ready
+        # Only one caller rebuilds; concurrent readers keep using the current snapshot
+        if not self._reconcile_lock.acquire(blocking=False):
+            return self.ready
+        try:
+            self.reconcile()
+        except Exception as e:
+            print(f"Error reconciling provider index: {e}")
+            self._last_reconciled = time.time()
+        finally:
+            self._reconcile_lock.release()
+        return self.ready
+
+
+provider_index = ProviderGridIndex()
+
+
+def index_provider(user, provider=None):
+    """Mirror a provider user's position and profile into the in-process index."""
+    provider = provider or user.provider_profile
+    if provider:
+        skill_index.set_skills(provider.id, provider.skills)
+    if user.role != 'provider' or not provider or user.latitude is None or user.longitude is None:
+        provider_index.remove(user.id)
+        return
+    provider_index.upsert(
+        user.id, user.latitude, user.longitude,
+        provider_id=provider.id,
+        name=user.name,
+        phone=user.phone,
+        address=user.address,
+        rating=user.rating,
+        avatar=user.avatar_path,
+        skills=list(provider.skills or []),
+        availability=bool(provider.availability),
+        completed_jobs=provider.completed_jobs or 0
+    )
+
+
+def index_user_location(user):
+    """Move an indexed provider after a location write, indexing it on first sight."""
+    if user.role != 'provider' or user.latitude is None or user.longitude is None:
+        return
+    if not provider_index.move(user.id, user.latitude, user.longitude, address=user.address):
+        index_provider(user)
+
+
+def index_pinged_provider(user_id, lat, lon, address=None):
+    """Index a provider on its first ping, at the pinged position rather than its saved one.
+
+    Used when a ping finds no index entry (e.g. a provider without a saved location
+    coming online), so it is searchable at once instead of after the next reconcile.
+    """
+    from services.current_user import load_user
+    user = load_user(user_id)
+    if not user:
+        return
+    user.latitude, user.longitude = lat, lon
+    if address is not None:
+        user.address = address
+    index_user_location(user)
+
+
+def tracked_provider(user_id, providers_only=True):
+    """Name/rating/address of a user sending location pings, from the grid index when possible.
+
+    Falls back to one database read the first time it is seen; the ping itself
+    then indexes the provider at the pinged position.
+    """
+    entry = provider_index.get(user_id)
+    if entry:
+        return entry
+    from services.current_user import load_user
+    user = load_user(user_id)
+    if not user or (providers_only and user.role != 'provider'):
+        return None
+    return {'name': user.name, 'rating': user.rating, 'address': user.address}
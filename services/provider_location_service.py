@@ -0,0 +1,145 @@
+from pymongo import UpdateOne
+from models import User
+
+
+def geo_point(lat, lon):
+    """Return a GeoJSON point for the given coordinates, or None if they are unusable."""
+    if lat is None or lon is None:
+        return None
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        return None
+    return {'type': 'Point', 'coordinates': [lon, lat]}
+
+
+def backfill_locations(collection, lat_field, lon_field, batch_size=500):
+    """Populate the GeoJSON ``location`` of documents that only have latitude/longitude floats."""
+    cursor = collection.find(
+        {'location': {'$exists': False}, lat_field: {'$ne': None}, lon_field: {'$ne': None}},
+        {lat_field: 1, lon_field: 1}
+    ).batch_size(batch_size)
+
+    updated = 0
+    operations = []
+    for doc in cursor:
+        point = geo_point(doc.get(lat_field), doc.get(lon_field))
+        if not point:
+            continue
+        operations.append(UpdateOne({'_id': doc['_id']}, {'$set': {'location': point}}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+def backfill_user_locations(batch_size=500):
+    """Populate the GeoJSON location of users that only have latitude/longitude floats."""
+    return backfill_locations(User._get_collection(), 'latitude', 'longitude', batch_size)
+
+
+def find_nearby_providers(lat, lon, radius_km, limit=None, query=None):
+    """Run a single $geoNear aggregation returning providers sorted by distance.
+
+    The radius filter, distance computation and sort all happen on the server, so
+    the cost tracks the number of nearby providers rather than the total count.
+    """
+    geo_query = {'role': 'provider', 'provider_profile': {'$ne': None}}
+    if query:
+        geo_query.update(query)
+
+    pipeline = [
+        {'$geoNear': {
+            'near': {'type': 'Point', 'coordinates': [float(lon), float(lat)]},
+            'distanceField': 'distance_m',
+            'maxDistance': float(radius_km) * 1000,
+            'spherical': True,
+            'query': geo_query
+        }},
+        {'$lookup': {
+            'from': 'providers',
+            'localField': 'provider_profile',
+            'foreignField': '_id',
+            'as': 'profile'
+        }},
+        {'$unwind': '$profile'},
+        {'$sort': {'distance_m': 1, 'rating': -1}},
+    ]
+    if limit:
+        pipeline.append({'$limit': int(limit)})
+    pipeline.append({'$project': {
+        'name': 1,
+        'rating': 1,
+        'avatar_path': 1,
+        'latitude': 1,
+        'longitude': 1,
+        'distance_m': 1,
+        'profile._id': 1,
+        'profile.skills': 1,
+        'profile.availability': 1,
+        'profile.completed_jobs': 1
+    }})
+
+    results = []
+    for doc in User._get_collection().aggregate(pipeline):
+        result = _provider_row(doc)
+        result['distance_km'] = doc.get('distance_m', 0) / 1000.0
+        results.append(result)
+    return results
+
+
+def iter_provider_positions():
+    """Yield every provider that has a location, joined with its provider profile."""
+    pipeline = [
+        {'$match': {
+            'role': 'provider',
+            'provider_profile': {'$ne': None},
+            'latitude': {'$ne': None},
+            'longitude': {'$ne': None}
+        }},
+        {'$lookup': {
+            'from': 'providers',
+            'localField': 'provider_profile',
+            'foreignField': '_id',
+            'as': 'profile'
+        }},
+        {'$unwind': '$profile'},
+        {'$project': {
+            'name': 1,
+            'phone': 1,
+            'address': 1,
+            'rating': 1,
+            'avatar_path': 1,
+            'latitude': 1,
+            'longitude': 1,
+            'profile._id': 1,
+            'profile.skills': 1,
+            'profile.availability': 1,
+            'profile.completed_jobs': 1
+        }}
+    ]
+    for doc in User._get_collection().aggregate(pipeline):
+        yield _provider_row(doc)
+
+
+def _provider_row(doc):
+    profile = doc.get('profile') or {}
+    return {
+        'user_id': str(doc['_id']),
+        'provider_id': profile.get('_id'),
+        'name': doc.get('name'),
+        'phone': doc.get('phone'),
+        'address': doc.get('address'),
+        'rating': doc.get('rating'),
+        'avatar': doc.get('avatar_path'),
+        'lat': doc.get('latitude'),
+        'lon': doc.get('longitude'),
+        'skills': profile.get('skills') or [],
+        'availability': profile.get('availability', True),
+        'completed_jobs': profile.get('completed_jobs', 0)
+    }
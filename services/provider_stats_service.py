@@ -0,0 +1,45 @@
+from pymongo import UpdateOne
+from models import Booking, Provider
+
+
+def count_jobs_by_provider(provider_ids):
+    """Return {provider_id: booking count} for the given providers in one $group aggregation."""
+    provider_ids = [pid for pid in provider_ids if pid is not None]
+    if not provider_ids:
+        return {}
+    pipeline = [
+        {'$match': {'provider': {'$in': provider_ids}}},
+        {'$group': {'_id': '$provider', 'count': {'$sum': 1}}}
+    ]
+    return {row['_id']: row['count'] for row in Booking._get_collection().aggregate(pipeline)}
+
+
+def record_job_completed(provider, old_status):
+    """Bump the provider's denormalized completed_jobs counter on a transition to Completed."""
+    if not provider or old_status == 'Completed':
+        return
+    Provider.objects(id=provider.id).update_one(inc__completed_jobs=1)
+    try:
+        from services.provider_index import provider_index
+        provider.reload('completed_jobs')
+        provider_index.update(provider.user.id, completed_jobs=provider.completed_jobs)
+    except Exception as e:
+        print(f"Error refreshing completed jobs in provider index: {e}")
+
+
+def backfill_completed_jobs():
+    """Initialize completed_jobs for providers created before the counter existed."""
+    collection = Provider._get_collection()
+    missing = [doc['_id'] for doc in collection.find({'completed_jobs': {'$exists': False}}, {'_id': 1})]
+    if not missing:
+        return 0
+    pipeline = [
+        {'$match': {'provider': {'$in': missing}, 'status': 'Completed'}},
+        {'$group': {'_id': '$provider', 'count': {'$sum': 1}}}
+    ]
+    counts = {row['_id']: row['count'] for row in Booking._get_collection().aggregate(pipeline)}
+    # Only touch documents still missing the field so concurrent increments are not overwritten
+    operations = [UpdateOne({'_id': provider_id, 'completed_jobs': {'$exists': False}},
+                            {'$set': {'completed_jobs': counts.get(provider_id, 0)}})
+                  for provider_id in missing]
+    return collection.bulk_write(operations, ordered=False).modified_count
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+from extensions import socketio
+from models import Provider, ProviderNotification
+from services.geo import distances_from
+from services.provider_index import provider_index
+from services.provider_location_service import find_nearby_providers
+
+NOTIFY_RADIUS_KM = 15
+INSERT_BATCH_SIZE = 1000
+EMIT_BATCH_SIZE = 200
+
+
+def dispatch_new_request(service_request):
+    """Notify providers about a new service request from a background task.
+
+    Only a plain snapshot of the request crosses into the task, so the HTTP
+    response does not wait on (or scale with) the number of recipients.
+    """
+    job = {
+        'request_id': service_request.id,
+        'service_category': service_request.service_category,
+        'title': service_request.title,
+        'description': service_request.description,
+        'urgency': service_request.urgency,
+        'location': service_request.location_address,
+        'lat': service_request.location_lat,
+        'lon': service_request.location_lon,
+    }
+    socketio.start_background_task(fan_out, job)
+
+
+def fan_out(job):
+    """Select recipients, write their notifications in bulk and emit in batches."""
+    try:
+        recipients = select_recipients(job['lat'], job['lon'])
+        if not recipients:
+            print(f"No available providers to notify about request {job['request_id']}")
+            return 0
+        write_notifications(job, recipients)
+        emit_notifications(job, recipients)
+        print(f"Notified {len(recipients)} providers about new service request")
+        return len(recipients)
+    except Exception as e:
+        print(f"Error notifying providers: {e}")
+        return 0
+
+
+def select_recipients(lat, lon, radius_km=NOTIFY_RADIUS_KM):
+    """Available providers within ``radius_km``, or every available provider if none are nearby."""
+    # In-process grid index, or a $geoNear query until the index has been loaded
+    if provider_index.ensure_fresh():
+        recipients = provider_index.within_radius(lat, lon, radius_km, available_only=True)
+    else:
+        recipients = [p for p in find_nearby_providers(lat, lon, radius_km) if p['availability']]
+    if recipients:
+        return recipients
+
+    print("No nearby providers found, notifying all available providers")
+    return all_available_recipients(lat, lon)
+
+
+def all_available_recipients(lat, lon):
+    """Every available provider, with its distance when its position is known.
+
+    Providers without a location are not in the grid index, so they are read from
+    MongoDB and notified too, with a distance of None.
+    """
+    entries = provider_index.all()
+    recipients = [entry for entry in entries if entry.get('availability')]
+    if recipients:
+        distances = distances_from(lat, lon, [p['lat'] for p in recipients], [p['lon'] for p in recipients])
+        for entry, distance in zip(recipients, distances.tolist()):
+            entry['distance_km'] = distance
+    indexed = {entry['user_id'] for entry in entries}
+    for doc in Provider._get_collection().find({'availability': True}, {'user': 1}):
+        if doc.get('user') and str(doc['user']) not in indexed:
+            recipients.append({'user_id': str(doc['user']), 'provider_id': doc['_id'], 'distance_km': None})
+    return recipients
+
+
+def build_notifications(job, recipients):
+    title = f"New {job['service_category'].title()} Request"
+    message = f"New service request near you: {job['description'][:100]}..."
+    created_at = datetime.utcnow()
+    return [ProviderNotification(
+        provider=entry['provider_id'],
+        service_request=job['request_id'],
+        notification_type='new_request',
+        title=title,
+        message=message,
+        is_sent=True,
+        created_at=created_at
+    ) for entry in recipients]
+
+
+def write_notifications(job, recipients):
+    """Persist one notification per recipient with insert_many instead of a save() each."""
+    notifications = build_notifications(job, recipients)
+    for start in range(0, len(notifications), INSERT_BATCH_SIZE):
+        ProviderNotification.objects.insert(notifications[start:start + INSERT_BATCH_SIZE], load_bulk=False)
+
+
+def emit_notifications(job, recipients):
+    """Emit to provider rooms, one frame per distinct displayed distance.
+
+    Clients show the distance to 0.1 km, so recipients at the same rounded distance
+    share one emit addressed to all of their rooms (up to EMIT_BATCH_SIZE at a time),
+    yielding between batches so other work keeps flowing.
+    """
+    payload = {
+        'request_id': str(job['request_id']),
+        'service_category': job['service_category'],
+        'title': job['title'],
+        'description': job['description'],
+        'urgency': job['urgency'],
+        'location': job['location'],
+    }
+    groups = {}
+    for entry in recipients:
+        distance = entry.get('distance_km')
+        key = round(distance, 1) if distance is not None else None
+        group = groups.setdefault(key, {'distance': distance, 'rooms': []})
+        # Rooms are keyed by the provider's user id to match client-side room joining
+        group['rooms'].append(f"provider_{entry['user_id']}")
+    for group in groups.values():
+        rooms = group['rooms']
+        for start in range(0, len(rooms), EMIT_BATCH_SIZE):
+            try:
+                socketio.emit('new_service_request', dict(payload, distance=group['distance']),
+                              room=rooms[start:start + EMIT_BATCH_SIZE])
+            except Exception as e:
+                print(f"Error notifying {len(rooms[start:start + EMIT_BATCH_SIZE])} providers: {e}")
+            socketio.sleep(0)
@@ -0,0 +1,43 @@
+from models import ServiceRequest, ProviderQuote
+from services.pagination import geo_near_page, geo_near_documents
+from services.provider_location_service import backfill_locations
+
+FEED_STATUSES = ['open', 'quotes_received']
+FEED_RADIUS_KM = 50
+
+
+def backfill_request_locations(batch_size=500):
+    """Populate the GeoJSON location of service requests saved before it existed."""
+    return backfill_locations(ServiceRequest._get_collection(), 'location_lat', 'location_lon', batch_size)
+
+
+def open_requests_near(lat, lon, limit, after=None, radius_km=FEED_RADIUS_KM):
+    """One page of quotable requests within ``radius_km``, ordered by (distance, _id).
+
+    Returns a list of (ServiceRequest, distance_km) pairs and the key to continue
+    from, or None when there are no more pages.
+    """
+    docs, next_key = geo_near_page(ServiceRequest._get_collection(), lat, lon, limit,
+                                   query={'status': {'$in': FEED_STATUSES}}, after=after,
+                                   max_distance_km=radius_km)
+    return geo_near_documents(ServiceRequest, docs), next_key
+
+
+def open_requests_unlocated(limit, after=None):
+    """Page of quotable requests in _id order, for providers without a location."""
+    query = ServiceRequest.objects(status__in=FEED_STATUSES)
+    if after:
+        query = query.filter(id__gt=after[1][-1])
+    requests = list(query.order_by('id').limit(limit + 1))
+    page = [(req, 0.0) for req in requests[:limit]]
+    next_key = (0.0, [requests[limit - 1].id]) if len(requests) > limit else None
+    return page, next_key
+
+
+def quotes_by_request(provider, request_ids):
+    """Return {request_id: quote status} for the provider's quotes on a page, in one $in query."""
+    if not request_ids:
+        return {}
+    rows = ProviderQuote.objects(provider=provider, service_request__in=list(request_ids)) \
+        .only('service_request', 'status').as_pymongo()
+    return {row['service_request']: row.get('status') for row in rows}
@@ -0,0 +1,199 @@
+"""Offline reverse geocoding against a local gazetteer, indexed with a KD-tree.
+
+Run ``python -m services.reverse_geocoder`` (part of the build) to download the
+GeoNames gazetteer into ``data/``.
+"""
+import csv
+import io
+import math
+import os
+import sys
+import threading
+import urllib.request
+import zipfile
+from functools import lru_cache
+
+import numpy as np
+
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join('data', 'gazetteer.tsv'))
+ADMIN1_PATH = os.getenv('GAZETTEER_ADMIN1_PATH', os.path.join('data', 'admin1CodesASCII.txt'))
+GAZETTEER_URL = os.getenv('GAZETTEER_URL', 'https://download.geonames.org/export/dump/cities500.zip')
+ADMIN1_URL = os.getenv('GAZETTEER_ADMIN1_URL', 'https://download.geonames.org/export/dump/admin1CodesASCII.txt')
+CACHE_PRECISION = 3
+CACHE_SIZE = 65536
+NEAR_KM = 5.0
+EARTH_RADIUS_KM = 6371.0
+
+
+def _unit_vectors(lats, lons):
+    """Points on the unit sphere, so Euclidean nearest is great-circle nearest."""
+    lat, lon = np.radians(lats), np.radians(lons)
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+class KDTree:
+    """Static 3-d tree stored implicitly in one array.
+
+    Points are reordered so the median of every index range ``[lo, hi)`` sits at
+    ``(lo + hi) // 2`` and splits on axis ``depth % 3``; no node objects are built.
+    """
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        self.order = np.arange(len(points))
+        self._build(points, 0, len(points), 0)
+        self._points = points[self.order].tolist()
+
+    def _build(self, points, lo, hi, depth):
+        # Iterative to stay clear of the recursion limit on large gazetteers
+        stack = [(lo, hi, depth)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            mid = (lo + hi) // 2
+            segment = self.order[lo:hi]
+            part = np.argpartition(points[segment, depth % 3], mid - lo)
+            self.order[lo:hi] = segment[part]
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+    def nearest(self, point):
+        """(original index, squared chord distance) of the closest point."""
+        points = self._points
+        best = [-1, math.inf]
+
+        def search(lo, hi, depth):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            candidate = points[mid]
+            d = ((candidate[0] - point[0]) ** 2 + (candidate[1] - point[1]) ** 2 +
+                 (candidate[2] - point[2]) ** 2)
+            if d < best[1]:
+                best[0], best[1] = mid, d
+            diff = point[depth % 3] - candidate[depth % 3]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            search(near[0], near[1], depth + 1)
+            if diff * diff < best[1]:
+                search(far[0], far[1], depth + 1)
+
+        search(0, len(points), 0)
+        return int(self.order[best[0]]), best[1]
+
+
+class ReverseGeocoder:
+    """Nearest named place for a coordinate, from a GeoNames-format gazetteer.
+
+    Lookups are cached in a bounded LRU keyed by coordinates rounded to
+    ``CACHE_PRECISION`` decimals (~100 m), so repeated lookups for a moving
+    provider or the same delivery spot are dictionary hits.
+    """
+
+    def __init__(self, places=None):
+        self._tree = None
+        self._places = []
+        self._lock = threading.Lock()
+        self._lookup = lru_cache(maxsize=CACHE_SIZE)(self._resolve)
+        if places:
+            self.load(places)
+
+    @property
+    def ready(self):
+        return self._tree is not None
+
+    def load(self, places):
+        """Index an iterable of (name, region, lat, lon)."""
+        places = list(places)
+        if not places:
+            return
+        lats = np.array([p[2] for p in places], dtype=np.float64)
+        lons = np.array([p[3] for p in places], dtype=np.float64)
+        tree = KDTree(_unit_vectors(lats, lons))
+        with self._lock:
+            self._places, self._tree = places, tree
+            self._lookup.cache_clear()
+
+    def load_geonames(self, path, admin1_path=None):
+        """Load a GeoNames dump (e.g. cities500.txt or IN.txt), with admin1 names if available."""
+        regions = {}
+        if admin1_path and os.path.exists(admin1_path):
+            with open(admin1_path, encoding='utf-8') as f:
+                for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                    if len(row) >= 2:
+                        regions[row[0]] = row[1]
+        csv.field_size_limit(sys.maxsize)
+        places = []
+        with open(path, encoding='utf-8') as f:
+            for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+                # geonameid, name, asciiname, alternatenames, latitude, longitude, feature class, ...
+                if len(row) < 11 or row[6] not in ('P', 'A', 'L'):
+                    continue
+                try:
+                    lat, lon = float(row[4]), float(row[5])
+                except ValueError:
+                    continue
+                places.append((row[1], regions.get(f"{row[8]}.{row[10]}"), lat, lon))
+        self.load(places)
+        return len(places)
+
+    def reverse(self, lat, lon):
+        """Readable place for a coordinate, e.g. 'Karol Bagh, Delhi'.
+
+        Returns None when no gazetteer is loaded or the input is invalid, so callers
+        keep whatever address they had rather than storing raw coordinates.
+        """
+        if self._tree is None:
+            return None
+        try:
+            lat, lon = float(lat), float(lon)
+        except (TypeError, ValueError):
+            return None
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return None
+        return self._lookup(round(lat, CACHE_PRECISION), round(lon, CACHE_PRECISION))
+
+    def _resolve(self, lat, lon):
+        point = _unit_vectors(np.array([lat]), np.array([lon]))[0].tolist()
+        index, chord_sq = self._tree.nearest(point)
+        name, region, _, _ = self._places[index]
+        distance_km = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2))
+        label = f"{name}, {region}" if region else name
+        return label if distance_km <= NEAR_KM else f"Near {label}"
+
+
+reverse_geocoder = ReverseGeocoder()
+if os.path.exists(GAZETTEER_PATH):
+    try:
+        count = reverse_geocoder.load_geonames(GAZETTEER_PATH, ADMIN1_PATH)
+        print(f"Loaded {count} gazetteer places from {GAZETTEER_PATH}")
+    except Exception as e:
+        print(f"Error loading gazetteer, reverse geocoding disabled: {e}")
+
+
+def reverse_geocode(lat, lon):
+    return reverse_geocoder.reverse(lat, lon)
+
+
+def download_gazetteer(path=GAZETTEER_PATH, admin1_path=ADMIN1_PATH):
+    """Fetch the GeoNames dump (a .zip holding one .txt, or a plain .txt) and the admin1 names."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with urllib.request.urlopen(GAZETTEER_URL, timeout=120) as response:
+        payload = response.read()
+    if GAZETTEER_URL.endswith('.zip'):
+        with zipfile.ZipFile(io.BytesIO(payload)) as archive:
+            name = next(n for n in archive.namelist() if n.endswith('.txt'))
+            payload = archive.read(name)
+    with open(path, 'wb') as f:
+        f.write(payload)
+    with urllib.request.urlopen(ADMIN1_URL, timeout=120) as response, open(admin1_path, 'wb') as f:
+        f.write(response.read())
+
+
+if __name__ == '__main__':
+    # A failed download must not fail the build; lookups then return None
+    try:
+        download_gazetteer()
+        print(f"Downloaded gazetteer to {GAZETTEER_PATH}")
+    except Exception as e:
+        print(f"Error downloading gazetteer, reverse geocoding disabled: {e}")
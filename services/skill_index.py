@@ -0,0 +1,116 @@
+import re
+import threading
+import time
+from functools import lru_cache
+
+# Canonical skill IDs and the words that identify them in free-form skill names
+SKILL_SYNONYMS = {
+    'electrician': ['electrician', 'electrical', 'electric', 'wiring', 'power'],
+    'plumber': ['plumber', 'plumbing', 'water', 'pipe', 'drain'],
+    'carpenter': ['carpenter', 'carpentry', 'woodwork', 'wood', 'furniture', 'cabinet'],
+    'cleaner': ['cleaner', 'cleaning', 'housekeeping', 'maid'],
+    'painter': ['painter', 'painting', 'paint', 'wall', 'decor'],
+    'ac': ['ac', 'air conditioning', 'air conditioner', 'cooling', 'refrigerator', 'hvac'],
+}
+
+
+def _synonym_pattern(words):
+    # Short words must match whole words so "ac" does not match "accounting"
+    parts = [r'\b' + re.escape(w) + (r'\b' if len(w) <= 3 else '') for w in sorted(words, key=len, reverse=True)]
+    return re.compile('|'.join(parts))
+
+
+_SYNONYM_PATTERNS = {skill_id: _synonym_pattern(words) for skill_id, words in SKILL_SYNONYMS.items()}
+
+
+def compact_skill(name):
+    """Lowercase a skill name and drop everything but letters and digits."""
+    return re.sub(r'[^a-z0-9]', '', (name or '').lower())
+
+
+@lru_cache(maxsize=4096)
+def normalize_skill(name):
+    """Map a free-form skill or service name to its canonical skill IDs.
+
+    Names that match no synonym keep their compacted form as their ID, so custom
+    skills can still be searched for exactly.
+    """
+    text = (name or '').lower().strip()
+    ids = frozenset(skill_id for skill_id, pattern in _SYNONYM_PATTERNS.items() if pattern.search(text))
+    if ids:
+        return ids
+    compact = compact_skill(text)
+    return frozenset([compact]) if compact else frozenset()
+
+
+class SkillIndex:
+    """Inverted index from canonical skill ID to the IDs of providers offering it."""
+
+    def __init__(self, reload_interval=300):
+        self.reload_interval = reload_interval
+        self._providers_by_skill = {}
+        self._skills_by_provider = {}
+        self._lock = threading.RLock()
+        self._loaded_at = 0.0
+
+    def set_skills(self, provider_id, skills):
+        provider_id = str(provider_id)
+        skill_ids = frozenset().union(*(normalize_skill(s) for s in skills or []))
+        with self._lock:
+            self._unlink(provider_id)
+            self._skills_by_provider[provider_id] = skill_ids
+            for skill_id in skill_ids:
+                self._providers_by_skill.setdefault(skill_id, set()).add(provider_id)
+
+    def remove(self, provider_id):
+        with self._lock:
+            self._unlink(str(provider_id))
+
+    def _unlink(self, provider_id):
+        for skill_id in self._skills_by_provider.pop(provider_id, ()):
+            providers = self._providers_by_skill.get(skill_id)
+            if providers:
+                providers.discard(provider_id)
+                if not providers:
+                    del self._providers_by_skill[skill_id]
+
+    def providers_for(self, service_type):
+        """IDs of providers whose skills match the requested service type."""
+        self.ensure_fresh()
+        wanted = normalize_skill(service_type)
+        matched = set()
+        with self._lock:
+            if any(skill_id in SKILL_SYNONYMS for skill_id in wanted):
+                for skill_id in wanted:
+                    matched |= self._providers_by_skill.get(skill_id, set())
+                return matched
+            # Unknown names fall back to partial matching ("plumb" -> "plumber"); the
+            # vocabulary is the set of distinct skills, not providers, so the scan stays cheap
+            compact = compact_skill(service_type)
+            for skill_id, providers in self._providers_by_skill.items():
+                if compact and (compact in skill_id or (len(skill_id) > 3 and skill_id in compact)):
+                    matched |= providers
+        return matched
+
+    def load(self):
+        from models import Provider
+        started = time.time()
+        rows = list(Provider._get_collection().find({}, {'skills': 1}))
+        with self._lock:
+            self._providers_by_skill = {}
+            self._skills_by_provider = {}
+            for row in rows:
+                self.set_skills(row['_id'], row.get('skills'))
+            self._loaded_at = started
+
+    def ensure_fresh(self):
+        if time.time() - self._loaded_at < self.reload_interval:
+            return
+        try:
+            self.load()
+        except Exception as e:
+            print(f"Error loading skill index: {e}")
+            self._loaded_at = time.time()
+
+
+skill_index = SkillIndex()
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, request, session
+from flask_jwt_extended import decode_token
+
+from models import Booking, User
+from services.chat_service import participant_cache
+
+IDENTITY_TTL = 300
+MAX_CACHED_TOKENS = 10000
+# Bookings whose customer may follow the assigned provider's live position
+TRACKABLE_STATUSES = ('Accepted', 'In Progress')
+
+
+class SocketIdentityCache:
+    """Bounded LRU of decoded socket tokens.
+
+    Verifying a JWT and loading the user's provider profile happens once per
+    token per ``ttl`` seconds (never past the token's expiry), so a reconnect
+    storm costs dictionary lookups instead of signature checks and DB reads.
+    """
+
+    def __init__(self, ttl=IDENTITY_TTL, max_size=MAX_CACHED_TOKENS):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def authenticate(self, token):
+        """Identity dict (user_id, role, provider_id) for a token, or None if it is invalid."""
+        if not token:
+            return None
+        key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+        now = time.time()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached and cached[0] > now:
+                self._entries.move_to_end(key)
+                return cached[1]
+
+        try:
+            decoded = decode_token(token)
+        except Exception:
+            return None
+        sub = decoded.get('sub')
+        user_id = str(sub.get('id')) if isinstance(sub, dict) else str(sub)
+        user = User.objects(id=user_id).only('role', 'provider_profile', 'token_version').as_pymongo().first()
+        if not user or decoded.get('ver', 0) != (user.get('token_version') or 0):
+            return None
+        identity = {
+            'user_id': user_id,
+            'role': user.get('role'),
+            'provider_id': str(user['provider_profile']) if user.get('provider_profile') else None
+        }
+
+        expires = min(now + self.ttl, decoded.get('exp', now + self.ttl))
+        with self._lock:
+            self._entries[key] = (expires, identity)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return identity
+
+
+identity_cache = SocketIdentityCache()
+
+
+def handshake_token(auth=None):
+    """Token sent with the Socket.IO handshake: auth payload, ?token= or the JWT cookie."""
+    if isinstance(auth, dict) and auth.get('token'):
+        return auth['token']
+    return request.args.get('token') or \
+        request.cookies.get(current_app.config.get('JWT_ACCESS_COOKIE_NAME', 'access_token_cookie'))
+
+
+def authenticate_connection(auth=None):
+    """Authenticate a socket once at connect and keep the identity in its session."""
+    identity = identity_cache.authenticate(handshake_token(auth))
+    session['socket_identity'] = identity
+    return identity
+
+
+def socket_identity(data=None):
+    """Identity of the calling socket.
+
+    Clients that did not send a token with the handshake can still pass one in
+    an event payload; it is verified once and cached in the session.
+    """
+    identity = session.get('socket_identity')
+    if identity is None and isinstance(data, dict) and data.get('token'):
+        identity = identity_cache.authenticate(data['token'])
+        if identity:
+            session['socket_identity'] = identity
+    return identity
+
+
+def can_join(identity, room, booking_id=None):
+    """Whether a socket with this identity may join a room.
+
+    Track rooms also need the ``booking_id`` that entitles the socket to follow
+    the provider (see can_track).
+    """
+    if not room:
+        return False
+    if room.startswith('geo_'):
+        return True
+    if not identity:
+        return False
+    if identity.get('role') == 'admin':
+        return True
+    if room.startswith('track_'):
+        return can_track(identity, room[len('track_'):], booking_id)
+    if room == 'all_providers':
+        return bool(identity.get('provider_id'))
+    if room.startswith('provider_'):
+        return room[len('provider_'):] in (identity['user_id'], identity.get('provider_id'))
+    if room.startswith('user_'):
+        return room[len('user_'):] == identity['user_id']
+    if room.startswith('booking_'):
+        try:
+            participants = participant_cache.get(room[len('booking_'):])
+        except Exception:
+            return False
+        return bool(participants) and identity['user_id'] in (participants['customer_id'],
+                                                              participants['provider_user_id'])
+    return False
+
+
+def can_track(identity, provider_user_id, booking_id):
+    """Whether a socket may follow the live position of the provider with this user id.
+
+    Providers may follow themselves; anyone else must be the customer of
+    ``booking_id``, whose provider it must be and which must be accepted or in
+    progress. Participants are checked as for booking rooms; the status is read
+    fresh, so tracking stops being granted as soon as the booking ends.
+    """
+    if provider_user_id == identity['user_id']:
+        return True
+    if not booking_id:
+        return False
+    try:
+        participants = participant_cache.get(booking_id)
+        if not participants or identity['user_id'] != participants['customer_id'] \
+                or provider_user_id != participants['provider_user_id']:
+            return False
+        booking = Booking.objects(id=booking_id).only('status').as_pymongo().first()
+    except Exception:
+        return False
+    return bool(booking) and booking.get('status') in TRACKABLE_STATUSES
@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from datetime import datetime
+from itertools import islice
+
+TRACKING_TTL = 300
+SIMULATION_ENABLED = os.getenv('TRACKING_SIMULATION', '').lower() in ('1', 'true', 'yes')
+SIMULATION_STEP_S = 30
+SIMULATION_STEP_FRACTION = 0.1
+SIMULATION_MAX_STEPS = 200
+
+
+class TrackingStore:
+    """In-memory live positions of providers, fed by real location pings.
+
+    Entries older than ``ttl`` seconds are treated as gone, so a provider that
+    stopped sending pings falls back to its last saved location instead of
+    showing a stale "live" position.
+    """
+
+    def __init__(self, ttl=TRACKING_TTL):
+        self.ttl = ttl
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id, lat, lon, at=None):
+        at = time.time() if at is None else at
+        with self._lock:
+            self._positions[str(user_id)] = (lat, lon, at)
+            if len(self._positions) % 1000 == 0:
+                self._prune(at)
+
+    def get(self, user_id, now=None):
+        """Live {'lat', 'lon', 'updated_at'} of a provider, or None if it has not pinged within the TTL."""
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._positions.get(str(user_id))
+        if not entry or now - entry[2] > self.ttl:
+            return None
+        lat, lon, at = entry
+        return {'lat': lat, 'lon': lon, 'updated_at': datetime.utcfromtimestamp(at)}
+
+    def _prune(self, now):
+        stale = [key for key, entry in self._positions.items() if now - entry[2] > self.ttl]
+        for key in stale:
+            del self._positions[key]
+
+
+tracking_store = TrackingStore()
+
+
+def simulated_route(start_lat, start_lon, end_lat, end_lon, step_fraction=SIMULATION_STEP_FRACTION):
+    """Yield demo positions, each closing ``step_fraction`` of the remaining distance to the end point."""
+    lat, lon = start_lat, start_lon
+    while True:
+        yield lat, lon
+        lat += (end_lat - lat) * step_fraction
+        lon += (end_lon - lon) * step_fraction
+
+
+def simulated_position(start_lat, start_lon, end_lat, end_lon, started_at, now=None):
+    """Where the demo simulation puts a provider at ``now``: one step per SIMULATION_STEP_S since ``started_at``.
+
+    Derived from the inputs alone, so serving it writes nothing.
+    """
+    now = now or datetime.utcnow()
+    steps = int(max((now - started_at).total_seconds(), 0) // SIMULATION_STEP_S) if started_at else 0
+    steps = min(steps, SIMULATION_MAX_STEPS)
+    return next(islice(simulated_route(start_lat, start_lon, end_lat, end_lon), steps, None))
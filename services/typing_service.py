@@ -0,0 +1,133 @@
+import threading
+import time
+
+from extensions import socketio
+
+TYPING_TTL = 6.0
+MIN_EMIT_INTERVAL = 1.0
+SWEEP_INTERVAL = 1.0
+
+
+class TypingTracker:
+    """Per-(booking, sender) typing state that only emits on state transitions.
+
+    Repeated ``typing_start`` events from a sender that is already typing just
+    extend its expiry. A sender shows as typing at most once per
+    ``min_interval`` seconds; a start that arrives sooner is announced by the
+    sweeper once the interval has passed, unless a stop cancels it first. A
+    typing state that is not refreshed within ``ttl`` seconds expires with a
+    stop, so a client that disconnects mid-sentence cannot leave it stuck.
+    """
+
+    def __init__(self, ttl=TYPING_TTL, min_interval=MIN_EMIT_INTERVAL, sweep_interval=SWEEP_INTERVAL, emit=None):
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self.sweep_interval = sweep_interval
+        self._emit = emit or socketio.emit
+        self._states = {}
+        self._lock = threading.Lock()
+        self._started = False
+        self.frames_in = 0
+        self.frames_out = 0
+
+    def start_typing(self, booking_id, sender, sender_type=None, sender_name=None, now=None):
+        now = time.time() if now is None else now
+        key = (str(booking_id), sender)
+        with self._lock:
+            self.frames_in += 1
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = {'typing': False, 'announced': False, 'last_emit': float('-inf')}
+            state['expires'] = now + self.ttl
+            state['sender_type'] = sender_type or state.get('sender_type')
+            state['sender_name'] = sender_name or state.get('sender_name')
+            if state['typing']:
+                return
+            state['typing'] = True
+            announce = now - state['last_emit'] >= self.min_interval
+            if announce:
+                self._mark_emitted(state, True, now)
+        if announce:
+            self._send(key, state, True)
+        self.start()
+
+    def stop_typing(self, booking_id, sender, now=None):
+        now = time.time() if now is None else now
+        key = (str(booking_id), sender)
+        with self._lock:
+            self.frames_in += 1
+            state = self._states.get(key)
+            if not state or not state['typing']:
+                return
+            state['typing'] = False
+            # A start that was never shown needs no stop
+            announce = state['announced']
+            if announce:
+                self._mark_emitted(state, False, now)
+        if announce:
+            self._send(key, state, False)
+
+    def drop_sender(self, sender, now=None):
+        """Stop every typing state of a sender, e.g. when its socket disconnects."""
+        with self._lock:
+            bookings = [booking_id for booking_id, s in self._states if s == sender]
+        for booking_id in bookings:
+            self.stop_typing(booking_id, sender, now=now)
+        with self._lock:
+            for booking_id in bookings:
+                self._states.pop((booking_id, sender), None)
+
+    def sweep(self, now=None):
+        """Announce deferred starts, expire stale typing and forget idle senders."""
+        now = time.time() if now is None else now
+        transitions = []
+        with self._lock:
+            for key, state in list(self._states.items()):
+                if state['typing'] and state['expires'] <= now:
+                    state['typing'] = False
+                    if state['announced']:
+                        self._mark_emitted(state, False, now)
+                        transitions.append((key, state, False))
+                elif state['typing'] and not state['announced'] and now - state['last_emit'] >= self.min_interval:
+                    self._mark_emitted(state, True, now)
+                    transitions.append((key, state, True))
+                elif not state['typing'] and now - state['last_emit'] >= self.min_interval:
+                    del self._states[key]
+        for key, state, typing in transitions:
+            self._send(key, state, typing)
+        return len(transitions)
+
+    def _mark_emitted(self, state, typing, now):
+        state['announced'] = typing
+        state['last_emit'] = now
+        self.frames_out += 1
+
+    def _send(self, key, state, typing):
+        booking_id = key[0]
+        payload = {'booking_id': booking_id, 'sender_type': state.get('sender_type')}
+        if typing:
+            payload['sender_name'] = state.get('sender_name')
+        try:
+            self._emit('user_typing' if typing else 'user_stopped_typing', payload, room=f"booking_{booking_id}")
+        except Exception as e:
+            print(f"Error emitting typing state: {e}")
+
+    def start(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        socketio.start_background_task(self._run)
+
+    def _run(self):
+        while True:
+            socketio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error in typing sweep loop: {e}")
+
+
+typing_tracker = TypingTracker()
@@ -1,6 +1,6 @@
 from datetime import datetime
-from bson import ObjectId
-from models import User, WalletTransaction, ReferralRequest
+from models import WalletTransaction, ReferralRequest
+from services.current_user import load_user
 
 
 class WalletError(Exception):
@@ -9,18 +9,7 @@ class WalletError(Exception):
 
 def resolve_user(ident):
     """Fetch a user document using a JWT identity payload."""
-    if ident is None:
-        return None
-
-    if isinstance(ident, dict):
-        user_id = ident.get('id') or ident.get('user_id') or ident
-    else:
-        user_id = ident
-
-    try:
-        return User.objects(id=ObjectId(str(user_id))).first()
-    except Exception:
-        return User.objects(id=str(user_id)).first()
+    return load_user(ident)
 
 
 def record_transaction(user, amount, transaction_type='credit', source='topup', description='', external_reference=None):
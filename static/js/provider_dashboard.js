@@ -2,6 +2,10 @@
   const token = localStorage.getItem('token') || '';
   if (!token) return;
 
+  // Bookings known to the dashboard; after the first load only changes are fetched (?since=)
+  const bookingsById = new Map();
+  let bookingsSyncToken = null;
+
   // Join provider room to receive booking notifications
   let socket = null;
   try {
@@ -10,17 +14,21 @@
     const userId = claims?.id || claims?.user_id || claims?.sub || '';
     const role = claims?.role || '';
     if (role === 'provider' && window.io){
-      socket = io();
+      socket = io({ auth: { token: localStorage.getItem('token') } });
       
-      // Join provider-specific room using token
-      socket.emit('join_provider_room', { token: token });
+      // Join provider-specific room using token; a reconnect starts without rooms, so rejoin on every connect
+      let connectedBefore = false;
+      socket.on('connect', () => {
+        socket.emit('join_provider_room', { token: token });
+        // Events emitted while disconnected are lost, so resync the deposit (usually a 304)
+        if (connectedBefore) loadProviderDeposit();
+        connectedBefore = true;
+      });
       console.log(`=== PROVIDER JOINING SOCKET ROOM ===`);
       console.log(`Provider ID: ${userId}`);
       console.log(`Room: provider_${userId}`);
       console.log(`Socket connected: ${socket.connected}`);
-      
-      // Also join using provider_id format (for compatibility)
-      socket.emit('join_provider_room', { provider_id: userId });
+
       
       // Listen for specific booking assignments
       socket.on('booking_created', (b) => {
@@ -543,10 +551,9 @@
         }
       } catch(e) {}
 
-    const r = await fetch('/bookings/provider', { headers: { 'Authorization': `Bearer ${token}` }});
-    if (!r.ok) return;
+    const rows = await fetchProviderBookings();
+    if (!rows) return;
       
-    const rows = await r.json();
     const pend = rows.filter(r => r.status === 'Pending');
     renderIncoming(pend);
       updateProviderStats(rows);
@@ -903,15 +910,26 @@
     });
   }
 
+  async function fetchProviderBookings() {
+    const url = bookingsSyncToken ? `/bookings/provider?since=${bookingsSyncToken}` : '/bookings/provider';
+    const response = await fetch(url, {
+      headers: { 'Authorization': `Bearer ${token}` }
+    });
+    if (!response.ok) return null;
+    
+    const rows = await response.json();
+    // Open requests taken by another provider or cancelled arrive as {id, removed: true}
+    rows.forEach(b => b.removed ? bookingsById.delete(b.id) : bookingsById.set(b.id, b));
+    bookingsSyncToken = response.headers.get('X-Sync-Token') || bookingsSyncToken;
+    return Array.from(bookingsById.values())
+      .sort((a, b) => (b.created_at || '').localeCompare(a.created_at || ''));
+  }
+
   // Load provider bookings
   async function loadProviderBookings() {
     try {
-      const response = await fetch('/bookings/provider', {
-        headers: { 'Authorization': `Bearer ${token}` }
-      });
-      
-      if (response.ok) {
-        const bookings = await response.json();
+      const bookings = await fetchProviderBookings();
+      if (bookings) {
         updateProviderStats(bookings);
         renderJobHistory(bookings);
       }
@@ -1453,13 +1471,21 @@
     });
   }
 
-  // Load deposit on page load
+  // Load deposit on page load; later changes are pushed over the socket
   loadProviderDeposit();
 
-  // Refresh deposit every 30 seconds
-  setInterval(() => {
-    loadProviderDeposit();
-  }, 30000);
+  if (socket) {
+    socket.on('deposit_updated', (data) => {
+      const transactions = (depositSummary && depositSummary.transactions) || [];
+      depositSummary = {
+        deposit_balance: data.deposit_balance,
+        minimum_required: data.minimum_required,
+        is_eligible: data.is_eligible,
+        transactions: data.transaction ? [data.transaction].concat(transactions).slice(0, 20) : transactions
+      };
+      updateDepositUI(depositSummary);
+    });
+  }
 })();
 
 
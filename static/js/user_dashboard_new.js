@@ -715,7 +715,7 @@
     // Initialize WebSocket connection
     function initializeWebSocket() {
         try {
-            socket = io();
+            socket = io({ auth: { token: localStorage.getItem('token') } });
             
             socket.on('connect', function() {
                 console.log('Connected to WebSocket server');
@@ -0,0 +1,31 @@
+import pytest
+
+
+class FakeGeoCollection:
+    """Answers the $geoNear pipelines built by geo_near_page from precomputed distances."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        geo_near = pipeline[0]['$geoNear']
+        rows = sorted(self.docs, key=lambda doc: (doc['distance_m'], doc['_id']))
+        rows = [dict(doc) for doc in rows
+                if doc['distance_m'] >= geo_near.get('minDistance', 0)
+                and doc['distance_m'] <= geo_near.get('maxDistance', float('inf'))]
+        for stage in pipeline[1:]:
+            if '$match' in stage:
+                for clause in stage['$match']['$nor']:
+                    rows = [doc for doc in rows if not (doc['distance_m'] == clause['distance_m']
+                                                        and doc['_id'] in clause['_id']['$in'])]
+            elif '$limit' in stage:
+                rows = rows[:stage['$limit']]
+        return iter(rows)
+
+
+@pytest.fixture
+def geo_collection():
+    """Factory for a fake collection serving $geoNear pages over the given raw documents."""
+    return FakeGeoCollection
@@ -0,0 +1,93 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Booking, Provider, User, Service, Payment  # noqa: E402
+from services.booking_serializer import serialize_bookings  # noqa: E402
+
+
+class FakeQuerySet:
+    """Stands in for Model.objects: records each query and answers it from a dict of raw documents."""
+
+    def __init__(self, name, docs, calls):
+        self.name = name
+        self.docs = docs
+        self.calls = calls
+        self._ids = []
+
+    def __call__(self, id__in=(), **kwargs):
+        self.calls.append(self.name)
+        self._ids = list(id__in)
+        return self
+
+    def only(self, *fields):
+        return self
+
+    def as_pymongo(self):
+        return [self.docs[i] for i in self._ids if i in self.docs]
+
+
+@pytest.fixture
+def world():
+    calls = []
+    provider_id, provider_user_id = ObjectId(), ObjectId()
+    service_id, payment_id = ObjectId(), ObjectId()
+    fakes = {
+        Provider: FakeQuerySet('provider', {provider_id: {'_id': provider_id, 'user': provider_user_id}}, calls),
+        User: FakeQuerySet('user', {provider_user_id: {'_id': provider_user_id, 'name': 'Ravi'}}, calls),
+        Service: FakeQuerySet('service', {service_id: {'_id': service_id, 'name': 'Plumbing'}}, calls),
+        Payment: FakeQuerySet('payment', {payment_id: {'_id': payment_id, 'status': 'Success'}}, calls),
+    }
+    # Reading Model.objects opens a connection, so swap the raw class attribute
+    managers = {model: model.__dict__['objects'] for model in fakes}
+    for model, fake in fakes.items():
+        setattr(model, 'objects', fake)
+
+    def make_bookings(count):
+        # No denormalized names, so every reference has to be resolved
+        return [Booking._from_son({
+            '_id': ObjectId(),
+            'user': ObjectId(),
+            'provider': provider_id,
+            'service': service_id,
+            'payment': payment_id,
+            'payment_status': '',
+            'created_at': datetime(2026, 1, 1),
+        }) for _ in range(count)]
+
+    yield calls, make_bookings
+
+    for model, manager in managers.items():
+        setattr(model, 'objects', manager)
+
+
+@pytest.mark.parametrize('count', [1, 100])
+def test_one_query_per_collection_regardless_of_page_size(world, count):
+    calls, make_bookings = world
+    payloads = serialize_bookings(make_bookings(count))
+
+    assert sorted(calls) == ['payment', 'provider', 'service', 'user']
+    assert len(payloads) == count
+    assert {p['provider_name'] for p in payloads} == {'Ravi'}
+    assert {p['service_name'] for p in payloads} == {'Plumbing'}
+    assert {p['payment_status'] for p in payloads} == {'Success'}
+
+
+def test_denormalized_fields_skip_lookups(world):
+    calls, make_bookings = world
+    bookings = make_bookings(10)
+    for booking in bookings:
+        booking.provider_name = 'Asha'
+        booking.service_name = 'Electrician'
+        booking.payment_status = 'Pending'
+
+    payloads = serialize_bookings(bookings)
+
+    assert calls == []
+    assert payloads[0]['provider_name'] == 'Asha'
+    assert payloads[0]['has_payment'] is True
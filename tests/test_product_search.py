@@ -0,0 +1,83 @@
+import os
+import random
+import sys
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extensions  # noqa: E402
+from services.product_search import ProductSearchIndex, ShopMatches  # noqa: E402
+
+ITEMS = ['pipe', 'wire', 'tap', 'fan', 'bulb', 'hammer', 'screw', 'paint']
+MATERIALS = ['pvc', 'copper', 'brass', 'steel', 'plastic']
+
+
+def catalog(n, shops, seed=3):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield {'_id': ObjectId(), 'shop': rng.choice(shops),
+               'name': f"{rng.choice(MATERIALS)} {rng.choice(ITEMS)} {rng.randint(1, 9)} inch",
+               'description': ' '.join(rng.choice(ITEMS + MATERIALS) for _ in range(6)),
+               'category': rng.choice(['pipes', 'tools']), 'is_available': rng.random() < 0.9}
+
+
+def grouped(ranked, per_shop):
+    shops = {}
+    for product_id, shop_id, score in ranked:
+        shops.setdefault(shop_id, []).append((product_id, score))
+    return {shop_id: items[:per_shop] for shop_id, items in shops.items()}
+
+
+def test_search_shops_matches_full_ranking_grouped_by_shop():
+    shops = [ObjectId() for _ in range(40)]
+    docs = list(catalog(2000, shops))
+    index = ProductSearchIndex()
+    index.load(docs)
+    # Writes since the last rebuild live in the delta and must be merged in
+    index.upsert(dict(docs[0], name='brass pipe deluxe'))
+    index.upsert({'_id': ObjectId(), 'shop': shops[1], 'name': 'pvc pipe elbow', 'is_available': True})
+    index.remove(docs[1]['_id'])
+
+    for query, category in [('pvc pipe', None), ('brass', 'pipes'), ('copper wire', None)]:
+        expected = grouped(index.search(query, category=category, limit=None), per_shop=5)
+        matches = index.search_shops(query, category=category, per_shop=5)
+
+        assert set(matches.best) == set(expected)
+        for shop_id, items in expected.items():
+            assert matches.best[shop_id] == items[0][1]
+            assert [round(score, 9) for _, score in matches.products(shop_id)] == \
+                   [round(score, 9) for _, score in items]
+
+
+def test_search_shops_without_matches():
+    index = ProductSearchIndex()
+    index.load(catalog(50, [ObjectId()]))
+
+    matches = index.search_shops('geyser')
+
+    assert matches.best == {} and matches.count == 0
+
+
+def test_from_ranked_groups_fallback_results():
+    shop = ObjectId()
+    first, second = ObjectId(), ObjectId()
+
+    matches = ShopMatches.from_ranked([(first, shop, 2.0), (second, shop, 1.0), (ObjectId(), None, 1.0)], per_shop=1)
+
+    assert matches.best == {shop: 2.0}
+    assert matches.products(shop) == [(first, 2.0)]
+
+
+def test_stale_rebuilds_run_in_the_background(monkeypatch):
+    started = []
+    monkeypatch.setattr(extensions.socketio, 'start_background_task', lambda fn: started.append(fn))
+    index = ProductSearchIndex(rebuild_interval=300)
+    index.load(catalog(10, [ObjectId()]))
+    index.ready = True
+    monkeypatch.setattr(index, 'rebuild', lambda: pytest.fail('rebuilt on the request thread'))
+
+    assert index.ensure_fresh() is True
+    assert index.ensure_fresh() is True
+    assert started == [index._rebuild_locked]
@@ -0,0 +1,86 @@
+import os
+import sys
+import time
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Provider  # noqa: E402
+from services import request_dispatch_service as dispatch  # noqa: E402
+from services.provider_index import ProviderGridIndex  # noqa: E402
+
+CENTER = (28.6139, 77.2090)
+
+
+class FakeProviders:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection=None):
+        return iter(doc for doc in self.docs if doc.get('availability') == query['availability'])
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    frames = []
+    monkeypatch.setattr(dispatch.socketio, 'emit', lambda event, data, room: frames.append((data, room)))
+    monkeypatch.setattr(dispatch.socketio, 'sleep', lambda seconds: None)
+    return frames
+
+
+@pytest.fixture
+def index(monkeypatch):
+    index = ProviderGridIndex()
+    # Loaded snapshot, so nothing reconciles against MongoDB
+    index.ready = True
+    index._last_reconciled = time.time() + 3600
+    monkeypatch.setattr(dispatch, 'provider_index', index)
+    return index
+
+
+def add_provider(index, lat, lon, available=True):
+    user_id, provider_id = ObjectId(), ObjectId()
+    index.upsert(user_id, lat, lon, provider_id=provider_id, name='Provider', availability=available)
+    return {'_id': provider_id, 'user': user_id, 'availability': available}
+
+
+def test_fallback_notifies_available_providers_without_a_location(index, monkeypatch):
+    far = add_provider(index, 19.07, 72.87)
+    busy = add_provider(index, 19.08, 72.88, available=False)
+    unlocated = {'_id': ObjectId(), 'user': ObjectId(), 'availability': True}
+    monkeypatch.setattr(Provider, '_get_collection', classmethod(
+        lambda cls: FakeProviders([far, busy, unlocated, dict(busy, availability=True)])))
+
+    recipients = dispatch.select_recipients(*CENTER)
+
+    by_user = {entry['user_id']: entry for entry in recipients}
+    assert set(by_user) == {str(far['user']), str(unlocated['user'])}
+    assert by_user[str(far['user'])]['distance_km'] > 1000
+    assert by_user[str(unlocated['user'])]['distance_km'] is None
+    assert by_user[str(unlocated['user'])]['provider_id'] == unlocated['_id']
+
+
+def test_nearby_providers_skip_the_fallback(index, monkeypatch):
+    near = add_provider(index, CENTER[0] + 0.01, CENTER[1])
+    monkeypatch.setattr(Provider, '_get_collection', classmethod(lambda cls: pytest.fail('fallback queried')))
+
+    recipients = dispatch.select_recipients(*CENTER)
+
+    assert [entry['user_id'] for entry in recipients] == [str(near['user'])]
+
+
+def test_emits_one_frame_per_displayed_distance(emitted, monkeypatch):
+    monkeypatch.setattr(dispatch, 'EMIT_BATCH_SIZE', 2)
+    job = {'request_id': ObjectId(), 'service_category': 'plumber', 'title': 'Leak', 'description': 'Tap leaks',
+           'urgency': 'normal', 'location': 'Connaught Place'}
+    recipients = [{'user_id': 'a', 'distance_km': 1.21}, {'user_id': 'b', 'distance_km': 1.24},
+                  {'user_id': 'c', 'distance_km': 1.19}, {'user_id': 'd', 'distance_km': 3.0},
+                  {'user_id': 'e', 'distance_km': None}]
+
+    dispatch.emit_notifications(job, recipients)
+
+    assert [(data['distance'], room) for data, room in emitted] == [
+        (1.21, ['provider_a', 'provider_b']), (1.21, ['provider_c']), (3.0, ['provider_d']), (None, ['provider_e'])]
+    assert all(data['request_id'] == str(job['request_id']) for data, _ in emitted)
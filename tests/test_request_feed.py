@@ -0,0 +1,57 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ServiceRequest  # noqa: E402
+from services.request_feed_service import open_requests_near  # noqa: E402
+
+
+def raw_request(distance_m):
+    """A stored service request as $geoNear returns it, distanceField included."""
+    return {
+        '_id': ObjectId(),
+        'user': ObjectId(),
+        'service_category': 'plumber',
+        'title': 'Leaking tap',
+        'description': 'Kitchen tap drips all night',
+        'location_lat': 28.61,
+        'location_lon': 77.21,
+        'location_address': 'Connaught Place',
+        'location': {'type': 'Point', 'coordinates': [77.21, 28.61]},
+        'status': 'open',
+        'created_at': datetime(2026, 1, 1),
+        'distance_m': distance_m,
+    }
+
+
+@pytest.fixture
+def collection(monkeypatch, geo_collection):
+    fake = geo_collection([raw_request(d) for d in (1200.0, 300.0, 300.0, 4500.0)])
+    monkeypatch.setattr(ServiceRequest, '_get_collection', classmethod(lambda cls: fake))
+    return fake
+
+
+def test_feed_hydrates_geo_near_results(collection):
+    page, next_key = open_requests_near(28.61, 77.21, limit=10)
+
+    assert [type(req) for req, _ in page] == [ServiceRequest] * 4
+    assert [distance for _, distance in page] == [0.3, 0.3, 1.2, 4.5]
+    assert page[0][0].title == 'Leaking tap'
+    assert next_key is None
+    assert collection.pipelines[0][0]['$geoNear']['query'] == {'status': {'$in': ['open', 'quotes_received']}}
+
+
+def test_feed_pages_through_ties(collection):
+    first, next_key = open_requests_near(28.61, 77.21, limit=1)
+    second, next_key = open_requests_near(28.61, 77.21, limit=2, after=next_key)
+    rest, last_key = open_requests_near(28.61, 77.21, limit=2, after=next_key)
+
+    ids = [req.id for req, _ in first + second + rest]
+    assert len(ids) == len(set(ids)) == 4
+    assert [distance for _, distance in first + second + rest] == [0.3, 0.3, 1.2, 4.5]
+    assert last_key is None
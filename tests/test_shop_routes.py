@@ -0,0 +1,100 @@
+import os
+import sys
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Shop, Product  # noqa: E402
+from routes import shop as shop_routes  # noqa: E402
+from services.product_search import ProductSearchIndex  # noqa: E402
+
+
+class FakeProducts:
+    """Product collection and manager: the $group count and the batched page lookup."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self._ids = []
+
+    def aggregate(self, pipeline):
+        shop_ids = pipeline[0]['$match']['shop']['$in']
+        counts = {}
+        for doc in self.docs:
+            if doc['shop'] in shop_ids:
+                counts[doc['shop']] = counts.get(doc['shop'], 0) + 1
+        return iter({'_id': shop_id, 'count': count} for shop_id, count in counts.items())
+
+    def __call__(self, id__in=(), **kwargs):
+        self._ids = list(id__in)
+        return self
+
+    def as_pymongo(self):
+        return [doc for doc in self.docs if doc['_id'] in self._ids]
+
+
+def raw_shop(name, distance_m):
+    """A stored shop as $geoNear returns it, distanceField included."""
+    return {
+        '_id': ObjectId(),
+        'owner': ObjectId(),
+        'name': name,
+        'category': ['plumbing'],
+        'address': 'Karol Bagh',
+        'location_lat': 28.65,
+        'location_lon': 77.19,
+        'location': {'type': 'Point', 'coordinates': [77.19, 28.65]},
+        'contact_phone': '9999999999',
+        'is_active': True,
+        'verification_status': 'verified',
+        'created_at': datetime(2026, 1, 1),
+        'distance_m': distance_m,
+    }
+
+
+@pytest.fixture
+def client(monkeypatch, geo_collection):
+    near, far = raw_shop('Sharma Hardware', 800.0), raw_shop('Gupta Sanitary', 2300.0)
+    products = FakeProducts([
+        {'_id': ObjectId(), 'shop': near['_id'], 'name': 'PVC Pipe 1 inch', 'price': 120.0, 'is_available': True},
+        {'_id': ObjectId(), 'shop': far['_id'], 'name': 'Brass Pipe Tap', 'price': 450.0, 'is_available': True},
+    ])
+    monkeypatch.setattr(Shop, '_get_collection', classmethod(lambda cls: geo_collection([near, far])))
+    monkeypatch.setattr(Product, '_get_collection', classmethod(lambda cls: products))
+    # Reading Product.objects opens a connection, so swap the raw class attribute
+    manager = Product.__dict__['objects']
+    Product.objects = products
+
+    index = ProductSearchIndex()
+    index.load(products.docs)
+    monkeypatch.setattr(index, 'ensure_fresh', lambda: True)
+    monkeypatch.setattr(shop_routes, 'product_search', index)
+
+    app = Flask(__name__)
+    app.register_blueprint(shop_routes.shop_bp)
+    yield app.test_client()
+
+    Product.objects = manager
+
+
+def test_browse_by_location_returns_nearest_shops(client):
+    response = client.get('/api/shop/browse?lat=28.64&lon=77.2&shop_category=plumbing')
+
+    assert response.status_code == 200
+    shops = response.get_json()['shops']
+    assert [shop['name'] for shop in shops] == ['Sharma Hardware', 'Gupta Sanitary']
+    assert [shop['distance'] for shop in shops] == [0.8, 2.3]
+    assert [shop['products_count'] for shop in shops] == [1, 1]
+
+
+def test_search_by_location_returns_nearest_matching_shops(client):
+    response = client.get('/api/shop/search?q=pipe&lat=28.64&lon=77.2')
+
+    assert response.status_code == 200
+    results = response.get_json()['shops']
+    assert [r['shop']['name'] for r in results] == ['Sharma Hardware', 'Gupta Sanitary']
+    assert [r['distance'] for r in results] == [0.8, 2.3]
+    assert [[p['name'] for p in r['products']] for r in results] == [['PVC Pipe 1 inch'], ['Brass Pipe Tap']]
@@ -0,0 +1,78 @@
+import os
+import sys
+
+import pytest
+from bson import ObjectId
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Booking  # noqa: E402
+from services import socket_auth  # noqa: E402
+from services.socket_auth import can_join  # noqa: E402
+
+CUSTOMER, PROVIDER_USER, STRANGER = str(ObjectId()), str(ObjectId()), str(ObjectId())
+BOOKING = str(ObjectId())
+
+
+class FakeBookings:
+    """Booking.objects(id=...).only('status').as_pymongo().first()"""
+
+    def __init__(self, status):
+        self.status = status
+
+    def __call__(self, **kwargs):
+        return self
+
+    def only(self, *fields):
+        return self
+
+    def as_pymongo(self):
+        return self
+
+    def first(self):
+        return {'_id': ObjectId(BOOKING), 'status': self.status} if self.status else None
+
+
+@pytest.fixture
+def booking(monkeypatch):
+    participants = {BOOKING: {'customer_id': CUSTOMER, 'provider_user_id': PROVIDER_USER}}
+    monkeypatch.setattr(socket_auth.participant_cache, 'get', lambda booking_id: participants.get(str(booking_id)))
+    manager = Booking.__dict__['objects']
+
+    def set_status(status):
+        # Reading Booking.objects opens a connection, so swap the raw class attribute
+        Booking.objects = FakeBookings(status)
+
+    set_status('Accepted')
+    yield set_status
+    Booking.objects = manager
+
+
+def identity(user_id, role='user'):
+    return {'user_id': user_id, 'role': role, 'provider_id': None}
+
+
+@pytest.mark.parametrize('status', ['Accepted', 'In Progress'])
+def test_customer_tracks_the_provider_of_an_active_booking(booking, status):
+    booking(status)
+    assert can_join(identity(CUSTOMER), f'track_{PROVIDER_USER}', booking_id=BOOKING)
+
+
+@pytest.mark.parametrize('status', ['Pending', 'Completed', 'Cancelled', None])
+def test_tracking_ends_with_the_booking(booking, status):
+    booking(status)
+    assert not can_join(identity(CUSTOMER), f'track_{PROVIDER_USER}', booking_id=BOOKING)
+
+
+def test_other_users_and_providers_cannot_be_tracked(booking):
+    assert not can_join(identity(STRANGER), f'track_{PROVIDER_USER}')
+    assert not can_join(identity(STRANGER), f'track_{PROVIDER_USER}', booking_id=BOOKING)
+    assert not can_join(identity(CUSTOMER), f'track_{PROVIDER_USER}')
+    assert not can_join(identity(CUSTOMER), f'track_{STRANGER}', booking_id=BOOKING)
+    assert not can_join(identity(CUSTOMER), f'track_{PROVIDER_USER}', booking_id=str(ObjectId()))
+    assert not can_join(None, f'track_{PROVIDER_USER}', booking_id=BOOKING)
+
+
+def test_provider_and_admin_may_join_track_rooms(booking):
+    assert can_join(identity(PROVIDER_USER, role='provider'), f'track_{PROVIDER_USER}')
+    assert can_join(identity(STRANGER, role='admin'), f'track_{PROVIDER_USER}')